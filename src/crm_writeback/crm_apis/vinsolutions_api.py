@@ -3,6 +3,8 @@ from src.config import settings
 
 class VinSolutionsWritebackAPI:
     """Simulated API calls to write data back to VinSolutions."""
+    MAX_BATCH_SIZE = 100 # Leads per bulk update call
+
     def __init__(self):
         self.config = settings.get("vinsolutions")
         if not self.config:
@@ -13,8 +15,8 @@ class VinSolutionsWritebackAPI:
              self.api_url = self.config.get("api_url")
              self.api_key = self.config.get("api_key")
 
-    def update_lead_score(self, lead_id: str, score: float):
-        """Simulates updating a lead field in VinSolutions."""
+    def update_lead_score(self, lead_id: str, score: float, timeout: float = 5):
+        """Simulates updating a lead field in VinSolutions (sets the field, so repeating it is harmless)."""
         if not self.api_url or not self.api_key:
             print(f"Skipping VinSolutions writeback for lead {lead_id}: API not configured.")
             return
@@ -29,9 +31,11 @@ class VinSolutionsWritebackAPI:
         #     "value": f"{score:.4f}" # Format score as needed
         # }
         # try:
-        #     response = requests.put(endpoint, json=payload, headers=headers, timeout=5)
+        #     response = requests.put(endpoint, json=payload, headers=headers, timeout=timeout)
         #     response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
         #     print(f"Successfully simulated updating VinSolutions lead {lead_id}.")
+        # except requests.exceptions.Timeout as e:
+        #     raise TimeoutError(f"VinSolutions writeback for lead {lead_id} timed out") from e
         # except requests.exceptions.RequestException as e:
         #     print(f"Error simulating VinSolutions writeback for lead {lead_id}: {e}")
         # ------------------------------------------
@@ -42,14 +46,46 @@ class VinSolutionsWritebackAPI:
              print(f"Successfully simulated VinSolutions writeback for lead {lead_id}.")
         else:
              print(f"Simulated failure for VinSolutions writeback for lead {lead_id}.")
+             raise RuntimeError(f"VinSolutions writeback failed for lead {lead_id}") # Let the outbox retry
+
+    def update_lead_scores(self, scores, timeout: float = 10):
+        """Simulates one bulk update call for a list of (lead_id, score) pairs. Raises on failure."""
+        if not self.api_url or not self.api_key:
+            print(f"Skipping VinSolutions bulk writeback for {len(scores)} leads: API not configured.")
+            return
+
+        print(f"Simulating bulk writeback of {len(scores)} scores to VinSolutions")
+
+        # --- Real API Call Example (Conceptual) ---
+        # endpoint = f"{self.api_url}/leads/bulk"
+        # payload = [{"lead_id": lead_id, "custom_field_name": "Predicted_Likelihood", "value": f"{score:.4f}"}
+        #            for lead_id, score in scores]
+        # try:
+        #     response = requests.patch(endpoint, json=payload, headers=headers, timeout=timeout)
+        # except requests.exceptions.Timeout as e:
+        #     raise TimeoutError("VinSolutions bulk writeback timed out") from e
+        # response.raise_for_status()
+        # ------------------------------------------
 
 # Placeholder for other CRM writeback APIs
 class CdkWritebackAPI:
-     def update_lead_score(self, lead_id: str, score: float):
+     MAX_BATCH_SIZE = 50
+
+     def update_lead_score(self, lead_id: str, score: float, timeout: float = 5):
           print(f"Simulating writeback to CDK lead {lead_id} with score {score:.4f}")
           # Implement real CDK API logic here
 
+     def update_lead_scores(self, scores, timeout: float = 10):
+          print(f"Simulating bulk writeback of {len(scores)} scores to CDK")
+          # Implement real CDK bulk API logic here
+
 class ReynoldsWritebackAPI:
-     def update_lead_score(self, lead_id: str, score: float):
+     MAX_BATCH_SIZE = 25
+
+     def update_lead_score(self, lead_id: str, score: float, timeout: float = 5):
           print(f"Simulating writeback to Reynolds lead {lead_id} with score {score:.4f}")
           # Implement real Reynolds API logic here
+
+     def update_lead_scores(self, scores, timeout: float = 10):
+          print(f"Simulating bulk writeback of {len(scores)} scores to Reynolds")
+          # Implement real Reynolds bulk API logic here
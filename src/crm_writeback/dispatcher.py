@@ -0,0 +1,257 @@
+import asyncio
+import collections
+import datetime
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from src.config import settings
+from src.crm_writeback.writeback_manager import CRM_WRITEBACK_APIS, send_scores_to_crm
+from src.crm_writeback import outbox_worker
+
+# Per-CRM writeback lanes.
+# Every CRM source gets its own lane: a fixed number of claim/send loops (its concurrency
+# limit), its own thread pools, a per-call timeout and a circuit breaker. A lane only claims
+# outbox rows of its own CRM, so a slow or failing CRM (e.g. Reynolds timing out) ties up
+# only its own lane; the other CRMs keep their latency and throughput. While a breaker is
+# open its lane stops claiming and sheds any claimed rows back to the outbox retry queue.
+# The timeout is handed to the send function, which passes what is left of it to each HTTP
+# call, so a timed-out call has ended by the time its rows go back for retry and hung calls
+# never pile up in the send pool. Delivery is at-least-once: a call that timed out may still
+# have reached the CRM, and its rows are sent again. That is safe because every update sets
+# the lead's score field to an absolute value, so a repeated update leaves the same result.
+
+LANE_SETTINGS = settings.get("crm_writeback", {}).get("lanes", {})
+DEFAULT_LANE = {
+    'concurrency': 4, # Concurrent bulk calls to this CRM
+    'timeout_seconds': 10.0, # Per bulk call
+    'batch_size': 50, # Outbox rows claimed per loop iteration
+    'error_rate': 0.5, # Breaker opens at this failure share ...
+    'min_calls': 10, # ... over at least this many calls ...
+    'window_seconds': 30.0, # ... within this window
+    'open_seconds': 30.0, # Time open before a half-open probe
+}
+
+
+def lane_config(crm_source: str) -> Dict[str, Any]:
+    """Defaults, overridden by crm_writeback.lanes.default and then crm_writeback.lanes.<crm_source>."""
+    config = dict(DEFAULT_LANE)
+    config.update(LANE_SETTINGS.get('default', {}))
+    config.update(LANE_SETTINGS.get(crm_source, {}))
+    return config
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a CRM whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker: closed -> open when the failure share over the recent window
+    reaches `error_rate` (with at least `min_calls` calls); open -> half-open after
+    `open_seconds`, when a single probe call is let through; its outcome closes or re-opens.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, error_rate: float = 0.5, min_calls: int = 10, window_seconds: float = 30.0,
+                 open_seconds: float = 30.0, clock=time.monotonic):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._calls = collections.deque() # (timestamp, ok)
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (in half-open state, only one probe at a time)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through (0 unless open)."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (self.clock() - self.opened_at))
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = self.clock()
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = self.CLOSED
+                    self._calls.clear()
+                else:
+                    self.state, self.opened_at = self.OPEN, now
+                return
+            self._calls.append((now, ok))
+            self._trim(now)
+            failures = sum(1 for _, call_ok in self._calls if not call_ok)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.error_rate:
+                self.state, self.opened_at = self.OPEN, now
+                print(f"Circuit opened after {failures}/{len(self._calls)} failed calls.")
+
+
+class CrmLane:
+    """Bounded, isolated writeback pipeline for one CRM source."""
+    def __init__(self, crm_source: str, session_factory, send=send_scores_to_crm,
+                 config: Optional[Dict[str, Any]] = None):
+        self.crm_source = crm_source
+        self.session_factory = session_factory
+        self.send_fn = send
+        self.config = config or lane_config(crm_source)
+        self.concurrency = self.config['concurrency']
+        self.timeout = self.config['timeout_seconds']
+        self.breaker = CircuitBreaker(self.config['error_rate'], self.config['min_calls'],
+                                      self.config['window_seconds'], self.config['open_seconds'])
+        # Separate pools: a hung CRM call never holds up this lane's DB work (or any other lane)
+        self._send_pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix=f"writeback-{crm_source}")
+        self._db_pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix=f"outbox-{crm_source}")
+        self._semaphore = None
+        self.counts = {'sent': 0, 'suppressed': 0, 'retried': 0, 'failed': 0, 'shed': 0, 'timeouts': 0}
+        self.in_flight = 0
+        self.latencies_ms = collections.deque(maxlen=1000)
+
+    async def send(self, scores):
+        """One bulk send, bounded by the lane's concurrency limit and timeout, through the breaker."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.crm_source}")
+        async with self._semaphore:
+            self.in_flight += 1
+            start = time.perf_counter()
+            try:
+                send = functools.partial(self.send_fn, self.crm_source, scores, timeout=self.timeout)
+                await asyncio.get_running_loop().run_in_executor(self._send_pool, send) # The call itself times out
+            except TimeoutError:
+                self.counts['timeouts'] += 1
+                self.breaker.record(False)
+                raise
+            except Exception:
+                self.breaker.record(False)
+                raise
+            finally:
+                self.in_flight -= 1
+                self.latencies_ms.append((time.perf_counter() - start) * 1000)
+            self.breaker.record(True)
+
+    def _claim(self):
+        db = self.session_factory()
+        try:
+            token, rows = outbox_worker.claim_batch(db, self.config['batch_size'], crm_source=self.crm_source)
+            group = outbox_worker.plan_batch(db, token, rows, self.counts).get(self.crm_source, []) if rows else []
+            return db, token, rows, group
+        except Exception:
+            db.rollback()
+            db.close()
+            raise
+
+    async def process_once(self) -> int:
+        """Claims one batch of this CRM's due rows, sends it and records the outcome. Returns the rows claimed."""
+        loop = asyncio.get_running_loop()
+        db, token, rows, group = await loop.run_in_executor(self._db_pool, self._claim)
+        try:
+            if group:
+                try:
+                    await self.send([(crm_lead_id, score) for _, _, _, crm_lead_id, score, _ in group])
+                except CircuitOpenError:
+                    retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=max(self.breaker.retry_after(), 1.0))
+                    await loop.run_in_executor(self._db_pool, outbox_worker.record_shed, db, token, group, retry_at, self.counts)
+                except Exception as e:
+                    await loop.run_in_executor(self._db_pool, outbox_worker.record_failed, db, token, group, e, self.counts)
+                else:
+                    await loop.run_in_executor(self._db_pool, outbox_worker.record_sent, db, token, self.crm_source, group, self.counts)
+        finally:
+            await loop.run_in_executor(self._db_pool, db.close)
+        return len(rows)
+
+    async def _loop(self, stop_event: threading.Event, poll_interval: float):
+        while not stop_event.is_set():
+            if self.breaker.state == CircuitBreaker.OPEN and self.breaker.retry_after() > 0:
+                await asyncio.sleep(min(self.breaker.retry_after(), poll_interval)) # Leave rows in the retry queue
+                continue
+            try:
+                claimed = await self.process_once()
+            except Exception as e:
+                print(f"Writeback lane {self.crm_source} error: {e}") # Claimed rows are retried once their lease expires
+                claimed = 0
+            if not claimed:
+                await asyncio.sleep(poll_interval)
+
+    async def run(self, stop_event: threading.Event, poll_interval: float = outbox_worker.POLL_INTERVAL_SECONDS):
+        await asyncio.gather(*[self._loop(stop_event, poll_interval) for _ in range(self.concurrency)])
+
+    def shutdown(self):
+        self._send_pool.shutdown(wait=False)
+        self._db_pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+        return {
+            'breaker': self.breaker.state,
+            'in_flight': self.in_flight,
+            'concurrency': self.concurrency,
+            'p50_ms': latencies[len(latencies) // 2] if latencies else None,
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else None,
+            **self.counts,
+        }
+
+
+class WritebackDispatcher:
+    """Runs one CrmLane per CRM source until stopped."""
+    def __init__(self, session_factory=None, crm_sources=None, send=send_scores_to_crm, configs=None):
+        if session_factory is None:
+            from src.storage.database import SessionLocal
+            session_factory = SessionLocal
+        configs = configs or {}
+        self.lanes = {crm_source: CrmLane(crm_source, session_factory, send, configs.get(crm_source))
+                      for crm_source in (crm_sources or CRM_WRITEBACK_APIS)}
+
+    async def run(self, stop_event: threading.Event, poll_interval: float = outbox_worker.POLL_INTERVAL_SECONDS):
+        try:
+            await asyncio.gather(*[lane.run(stop_event, poll_interval) for lane in self.lanes.values()])
+        finally:
+            for lane in self.lanes.values():
+                lane.shutdown()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {crm_source: lane.stats() for crm_source, lane in self.lanes.items()}
+
+
+# Dispatcher of this process (set by run_dispatcher) for /health
+dispatcher: Optional[WritebackDispatcher] = None
+
+
+def run_dispatcher(stop_event: Optional[threading.Event] = None):
+    """Blocking entry point: runs all lanes in a fresh event loop (thread or process)."""
+    global dispatcher
+    stop_event = stop_event or threading.Event()
+    dispatcher = WritebackDispatcher()
+    print(f"Writeback dispatcher started with lanes: {', '.join(dispatcher.lanes)}.")
+    try:
+        asyncio.run(dispatcher.run(stop_event))
+    except KeyboardInterrupt:
+        pass # Ctrl-C reaches every worker process; claimed rows keep their lease and are retried
+
+
+def dispatcher_stats() -> Optional[Dict[str, Dict[str, Any]]]:
+    return dispatcher.stats() if dispatcher is not None else None
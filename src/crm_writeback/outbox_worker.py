@@ -0,0 +1,208 @@
+import collections
+import datetime
+import multiprocessing
+import random
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.storage.models import Lead, WritebackOutbox, WritebackStatus
+from src.crm_writeback.writeback_manager import ScoreDeltaFilter
+
+# Writeback workers for the transactional outbox (WritebackOutbox).
+# A worker claims a batch of due rows under a lease token, sends the scores to each CRM in
+# bulk calls and marks the rows done, or schedules a retry with exponential backoff. Claims use
+# SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL; on SQLite (single writer) a single
+# UPDATE ... WHERE id IN (subquery) claims atomically. Leases expire, so rows held by a
+# crashed worker are picked up again. Any number of workers/processes can run side by side.
+# Workers run as per-CRM lanes (src/crm_writeback/dispatcher.py).
+
+OUTBOX_SETTINGS = settings.get("crm_writeback", {}).get("outbox", {})
+BATCH_SIZE = OUTBOX_SETTINGS.get("batch_size", 50)
+LEASE_SECONDS = OUTBOX_SETTINGS.get("lease_seconds", 60)
+MAX_ATTEMPTS = OUTBOX_SETTINGS.get("max_attempts", 8)
+BACKOFF_BASE_SECONDS = OUTBOX_SETTINGS.get("backoff_base_seconds", 5)
+BACKOFF_MAX_SECONDS = OUTBOX_SETTINGS.get("backoff_max_seconds", 3600)
+POLL_INTERVAL_SECONDS = OUTBOX_SETTINGS.get("poll_interval_seconds", 1.0)
+INPROCESS_WORKERS = OUTBOX_SETTINGS.get("inprocess_workers", 1) # Dispatcher threads started by the API (0: external workers only)
+
+# Last-written-score cache for this process (sent/suppressed counters included)
+_delta_filter = ScoreDeltaFilter()
+
+
+def enqueue_writebacks(db: Session, items: Iterable[Tuple[str, str, float, Optional[int]]]):
+    """
+    Adds (crm_source, crm_lead_id, score, lead_id) rows to the outbox (no commit), so they
+    are committed in the caller's transaction together with the score update.
+    """
+    now = datetime.datetime.utcnow()
+    rows = [{'crm_source': crm_source, 'crm_lead_id': crm_lead_id, 'score': float(score), 'lead_id': lead_id,
+             'status': WritebackStatus.PENDING, 'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+            for crm_source, crm_lead_id, score, lead_id in items]
+    if rows:
+        db.bulk_insert_mappings(WritebackOutbox, rows)
+
+
+def backoff_seconds(attempts: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_MAX_SECONDS) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2^(attempts-1)))."""
+    return random.uniform(0, min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def _claimable(now: datetime.datetime):
+    """Due pending rows, plus in-progress rows whose lease has expired."""
+    return or_(
+        and_(WritebackOutbox.status == WritebackStatus.PENDING, WritebackOutbox.next_attempt_at <= now),
+        and_(WritebackOutbox.status == WritebackStatus.IN_PROGRESS, WritebackOutbox.leased_until < now),
+    )
+
+
+def claim_batch(db: Session, batch_size: int = BATCH_SIZE, lease_seconds: float = LEASE_SECONDS,
+                crm_source: Optional[str] = None) -> Tuple[str, List[WritebackOutbox]]:
+    """Leases up to `batch_size` due rows (optionally of one CRM) to a new lease token and commits the claim."""
+    now = datetime.datetime.utcnow()
+    token = uuid.uuid4().hex
+    due = select(WritebackOutbox.id).where(_claimable(now))
+    if crm_source is not None:
+        due = due.where(WritebackOutbox.crm_source == crm_source)
+    due = due.order_by(WritebackOutbox.id).limit(batch_size)
+    if db.get_bind().dialect.name == 'postgresql':
+        ids = [row[0] for row in db.execute(due.with_for_update(skip_locked=True))]
+        condition = WritebackOutbox.id.in_(ids)
+    else:
+        # Single-statement claim: the subquery and update run under one write lock
+        ids = None
+        condition = and_(WritebackOutbox.id.in_(due.scalar_subquery()), _claimable(now))
+    if ids == []:
+        db.commit()
+        return token, []
+    db.execute(update(WritebackOutbox).where(condition).values(
+        status=WritebackStatus.IN_PROGRESS, lease_token=token,
+        leased_until=now + datetime.timedelta(seconds=lease_seconds),
+    ).execution_options(synchronize_session=False))
+    db.commit()
+    rows = db.query(WritebackOutbox).filter(WritebackOutbox.lease_token == token).order_by(WritebackOutbox.id).all()
+    return token, rows
+
+
+def _complete(db: Session, row_id: int, token: str, **values):
+    """Updates a row only if we still hold its lease (an expired lease may have been re-claimed)."""
+    db.execute(update(WritebackOutbox)
+               .where(WritebackOutbox.id == row_id, WritebackOutbox.lease_token == token)
+               .values(lease_token=None, leased_until=None, **values)
+               .execution_options(synchronize_session=False))
+
+
+def _retry_or_fail(db: Session, token: str, item, error: Exception, max_attempts: int, counts: Dict[str, int]):
+    row_id, _, crm_source, crm_lead_id, _, attempts = item
+    attempts += 1
+    if attempts >= max_attempts:
+        _complete(db, row_id, token, status=WritebackStatus.FAILED, attempts=attempts, last_error=str(error)[:500])
+        counts['failed'] += 1
+        print(f"Writeback to {crm_source} lead {crm_lead_id} failed after {attempts} attempts: {error}")
+    else:
+        _complete(db, row_id, token, status=WritebackStatus.PENDING, attempts=attempts, last_error=str(error)[:500],
+                  next_attempt_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff_seconds(attempts)))
+        counts['retried'] += 1
+
+
+def plan_batch(db: Session, token: str, rows: List[WritebackOutbox], counts: Dict[str, int],
+               delta_filter: Optional[ScoreDeltaFilter] = None) -> Dict[str, list]:
+    """
+    Marks suppressed rows (superseded by a newer score for the same lead, or a change vs. the
+    last written score too small to matter, see ScoreDeltaFilter) and returns the rest per CRM.
+    """
+    delta_filter = delta_filter or _delta_filter
+    # Plain values: committing after each step would otherwise expire and reload every ORM object
+    items = sorted((row.id, row.lead_id, row.crm_source, row.crm_lead_id, row.score, row.attempts) for row in rows)
+    latest = {}
+    for item in items: # Ascending id: the newest row for a lead wins
+        latest[(item[2], item[3])] = item
+    suppressed = [item for item in items if latest[(item[2], item[3])] is not item]
+
+    # The DB holds the last written score (shared by all workers); the filter caches it
+    lead_keys = {item[1]: key for key, item in latest.items() if item[1] is not None}
+    if lead_keys:
+        written = db.query(Lead.id, Lead.crm_written_score).filter(Lead.id.in_(list(lead_keys))).all()
+        delta_filter.prime({lead_keys[lead_id]: score for lead_id, score in written})
+
+    by_crm = collections.defaultdict(list)
+    for key, item in latest.items():
+        if delta_filter.should_write(key, item[4]):
+            by_crm[item[2]].append(item)
+        else:
+            suppressed.append(item)
+    for item in suppressed:
+        _complete(db, item[0], token, status=WritebackStatus.SUPPRESSED, attempts=item[5])
+    counts['suppressed'] += len(suppressed)
+    delta_filter.suppressed += len(suppressed)
+    db.commit()
+    return by_crm
+
+
+def record_sent(db: Session, token: str, crm_source: str, group: list, counts: Dict[str, int],
+                delta_filter: Optional[ScoreDeltaFilter] = None):
+    delta_filter = delta_filter or _delta_filter
+    now = datetime.datetime.utcnow()
+    for row_id, lead_id, _, crm_lead_id, score, attempts in group:
+        _complete(db, row_id, token, status=WritebackStatus.DONE, attempts=attempts + 1, sent_at=now, last_error=None)
+        delta_filter.record_written((crm_source, crm_lead_id), score)
+    db.bulk_update_mappings(Lead, [{'id': lead_id, 'crm_written_score': score}
+                                   for _, lead_id, _, _, score, _ in group if lead_id is not None])
+    counts['sent'] += len(group)
+    delta_filter.sent += len(group)
+    db.commit() # Record each CRM's outcome right away so a crash never re-sends completed rows
+
+
+def record_failed(db: Session, token: str, group: list, error: Exception, counts: Dict[str, int],
+                  max_attempts: int = MAX_ATTEMPTS):
+    for item in group:
+        _retry_or_fail(db, token, item, error, max_attempts, counts)
+    db.commit()
+
+
+def record_shed(db: Session, token: str, group: list, retry_at: datetime.datetime, counts: Dict[str, int]):
+    """Returns rows to the retry queue without using up an attempt (the CRM was not called)."""
+    for row_id, _, _, _, _, attempts in group:
+        _complete(db, row_id, token, status=WritebackStatus.PENDING, attempts=attempts, next_attempt_at=retry_at)
+    counts['shed'] = counts.get('shed', 0) + len(group)
+    db.commit()
+
+
+def start_worker_thread(stop_event: threading.Event) -> threading.Thread:
+    """In-process writeback (used by the API so writebacks flow without a separate service)."""
+    from src.crm_writeback.dispatcher import run_dispatcher
+    thread = threading.Thread(target=run_dispatcher, args=(stop_event,), name="writeback-dispatcher", daemon=True)
+    thread.start()
+    return thread
+
+
+def run_workers(processes: int = 1):
+    """`writeback_worker --processes N`: runs N dispatcher processes (per-CRM lanes each) until interrupted."""
+    from src.crm_writeback.dispatcher import run_dispatcher
+    context = multiprocessing.get_context('spawn') # Fresh interpreter: no DB connections shared across processes
+    workers = [context.Process(target=run_dispatcher, name=f"writeback-worker-{i}") for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print("Stopping writeback workers...")
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def outbox_stats(db: Session) -> Dict[str, int]:
+    """Row counts per status (pending/in_progress/done/failed)."""
+    counts = dict(db.query(WritebackOutbox.status, func.count(WritebackOutbox.id)).group_by(WritebackOutbox.status).all())
+    return {status.value: counts.get(status, 0) for status in WritebackStatus}
+
+
+def delta_filter_stats() -> Dict[str, int]:
+    """Sent vs suppressed writes (and cache size) for this process's workers."""
+    return _delta_filter.stats()
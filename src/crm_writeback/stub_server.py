@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# Local fault-injecting CRM stub for exercising the writeback lanes.
+# POST /<crm_source>/leads/bulk accepts a JSON list of {"lead_id", "score"} and answers 200,
+# after an optional per-CRM delay and with an optional per-CRM error rate (HTTP 503).
+#
+#   python -m src.crm_writeback.stub_server --port 9100 --latency-ms Reynolds=5000 --error-rate CDK=0.3
+#   python -m src.crm_writeback.stub_server --demo # Slow Reynolds vs. healthy VinSolutions/CDK
+
+
+class CrmStubHandler(BaseHTTPRequestHandler):
+    faults = {} # crm_source -> {'latency_ms': float, 'error_rate': float}
+    received = {} # crm_source -> leads received
+
+    def do_POST(self):
+        crm_source = self.path.strip('/').split('/')[0]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        fault = self.faults.get(crm_source, {})
+        if fault.get('latency_ms'):
+            time.sleep(fault['latency_ms'] / 1000.0)
+        if random.random() < fault.get('error_rate', 0.0):
+            self.send_response(503)
+            self.end_headers()
+            return
+        leads = json.loads(body or b'[]')
+        self.received[crm_source] = self.received.get(crm_source, 0) + len(leads)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'updated': len(leads)}).encode())
+
+    def log_message(self, format, *args):
+        pass # Keep the demo output readable
+
+
+def start_stub_server(port: int = 9100, faults=None) -> ThreadingHTTPServer:
+    """Starts the stub in a daemon thread; returns the server (call .shutdown() to stop)."""
+    CrmStubHandler.faults = faults or {}
+    CrmStubHandler.received = {}
+    server = ThreadingHTTPServer(('127.0.0.1', port), CrmStubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="crm-stub", daemon=True).start()
+    return server
+
+
+def http_sender(base_url: str, timeout: float = 30.0):
+    """A send(crm_source, scores, timeout=None) function that posts bulk updates to the stub."""
+    def send(crm_source, scores, timeout=timeout):
+        try:
+            response = requests.post(f"{base_url}/{crm_source}/leads/bulk", timeout=timeout,
+                                     json=[{'lead_id': lead_id, 'score': score} for lead_id, score in scores])
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError(f"{crm_source} stub call timed out after {timeout}s") from e
+        response.raise_for_status()
+    return send
+
+
+def run_demo(port: int = 9100, leads_per_crm: int = 2000, duration: float = 15.0, slow_crm: str = 'Reynolds'):
+    """Enqueues writebacks for three CRMs, makes one CRM hang, and shows the others are unaffected."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from src.storage.models import Base
+    from src.crm_writeback.outbox_worker import enqueue_writebacks
+    from src.crm_writeback.dispatcher import WritebackDispatcher, lane_config
+
+    crm_sources = ['VinSolutions', 'CDK', 'Reynolds']
+    server = start_stub_server(port, faults={slow_crm: {'latency_ms': 5000}})
+    db_path = os.path.join(tempfile.mkdtemp(), 'writeback_demo.db')
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    enqueue_writebacks(db, [(crm_source, f"{crm_source}-{i}", random.random(), None)
+                            for crm_source in crm_sources for i in range(leads_per_crm)])
+    db.commit()
+    db.close()
+
+    configs = {crm_source: dict(lane_config(crm_source), timeout_seconds=1.0, open_seconds=5.0, min_calls=4,
+                                batch_size=25) for crm_source in crm_sources}
+    dispatcher = WritebackDispatcher(session_factory, crm_sources, send=http_sender(f"http://127.0.0.1:{port}"),
+                                     configs=configs)
+    stop_event = threading.Event()
+    import asyncio
+    runner = threading.Thread(target=lambda: asyncio.run(dispatcher.run(stop_event, poll_interval=0.2)), daemon=True)
+    start = time.perf_counter()
+    runner.start()
+    print(f"Writing back {leads_per_crm} scores per CRM; {slow_crm} responds after 5s (lane timeout 1s).")
+    while time.perf_counter() - start < duration:
+        time.sleep(1.0)
+        elapsed = time.perf_counter() - start
+        line = " | ".join(f"{crm}: sent={s['sent']} p50={s['p50_ms'] and round(s['p50_ms'])}ms breaker={s['breaker']} "
+                          f"timeouts={s['timeouts']} shed={s['shed']}" for crm, s in dispatcher.stats().items())
+        print(f"[{elapsed:5.1f}s] {line}")
+        if all(dispatcher.stats()[crm]['sent'] >= leads_per_crm for crm in crm_sources if crm != slow_crm):
+            break
+    stop_event.set()
+    runner.join(10)
+    server.shutdown()
+    print(f"Received by the stub: {CrmStubHandler.received}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fault-injecting CRM stub server")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", action="append", default=[], help="CRM=milliseconds added to every call")
+    parser.add_argument("--error-rate", action="append", default=[], help="CRM=share of calls answered with 503")
+    parser.add_argument("--demo", action="store_true", help="Run the slow-CRM isolation demo and exit")
+    parser.add_argument("--leads", type=int, default=2000, help="--demo: writebacks per CRM")
+    args = parser.parse_args()
+
+    if args.demo:
+        run_demo(args.port, args.leads)
+    else:
+        faults = {}
+        for spec, key in [(s, 'latency_ms') for s in args.latency_ms] + [(s, 'error_rate') for s in args.error_rate]:
+            crm_source, value = spec.split('=')
+            faults.setdefault(crm_source, {})[key] = float(value)
+        server = start_stub_server(args.port, faults)
+        print(f"CRM stub listening on http://127.0.0.1:{args.port} with faults {faults}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
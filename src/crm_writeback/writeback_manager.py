@@ -1,6 +1,13 @@
+import bisect
+import collections
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.config import settings
+from src.monitoring.metrics import timed
 from .crm_apis.vinsolutions_api import VinSolutionsWritebackAPI
-from .crm_apis.cdk_api import CdkWritebackAPI # Import placeholders
-from .crm_apis.reynolds_api import ReynoldsWritebackAPI
+from .crm_apis.vinsolutions_api import CdkWritebackAPI, ReynoldsWritebackAPI # Placeholders live alongside VinSolutions for now
 
 # Map CRM source strings to their respective writeback API classes
 CRM_WRITEBACK_APIS = {
@@ -10,18 +17,123 @@ CRM_WRITEBACK_APIS = {
     # Add other CRMs here
 }
 
+WRITEBACK_SETTINGS = settings.get("crm_writeback", {})
+# Per-CRM override of the API class's MAX_BATCH_SIZE, e.g. {'Reynolds': 10}
+MAX_BATCH_SIZES = WRITEBACK_SETTINGS.get("max_batch_size", {})
+# Delta suppression: skip a write unless the score moved by at least `threshold`
+# or crossed one of the `bands` boundaries (what salespeople actually see in the CRM)
+DELTA_SETTINGS = WRITEBACK_SETTINGS.get("delta", {})
+DELTA_THRESHOLD = DELTA_SETTINGS.get("threshold", 0.02)
+SCORE_BANDS = DELTA_SETTINGS.get("bands", [0.25, 0.5, 0.75])
+LAST_WRITTEN_CACHE_SIZE = DELTA_SETTINGS.get("cache_size", 100_000)
+
+# One API client per CRM source, reused across writebacks (clients hold config and connections)
+_api_instances = {}
+
+def get_writeback_api(crm_source: str):
+    """Returns the cached writeback API instance for a CRM source (None if not configured)."""
+    if crm_source not in _api_instances:
+        api_class = CRM_WRITEBACK_APIS.get(crm_source)
+        _api_instances[crm_source] = api_class() if api_class else None
+    return _api_instances[crm_source]
+
 def writeback_score_to_crm(crm_source: str, crm_lead_id: str, score: float):
     """
     Routes the writeback call to the correct CRM API based on source.
+    Best effort: errors are logged, not retried. Durable writebacks go through the outbox.
     """
-    api_class = CRM_WRITEBACK_APIS.get(crm_source)
-
-    if api_class:
-        try:
-            api_instance = api_class()
+    try:
+        api_instance = get_writeback_api(crm_source)
+        if api_instance is None:
+            print(f"Warning: No writeback API configured for CRM source: {crm_source}")
+            return
+        with timed('writeback.crm_call'):
             api_instance.update_lead_score(crm_lead_id, score)
-        except Exception as e:
-            print(f"Error initializing or calling writeback API for {crm_source}: {e}")
-            # Log the error but don't necessarily re-raise
-    else:
-        print(f"Warning: No writeback API configured for CRM source: {crm_source}")
+    except Exception as e:
+        print(f"Error initializing or calling writeback API for {crm_source}: {e}")
+        # Log the error but don't necessarily re-raise
+
+
+def max_batch_size(crm_source: str) -> int:
+    """Largest number of leads one bulk update call to this CRM may carry."""
+    if crm_source in MAX_BATCH_SIZES:
+        return MAX_BATCH_SIZES[crm_source]
+    return getattr(CRM_WRITEBACK_APIS.get(crm_source), 'MAX_BATCH_SIZE', 1)
+
+def send_scores_to_crm(crm_source: str, scores: Sequence[Tuple[str, float]], timeout: Optional[float] = None):
+    """
+    Sends (crm_lead_id, score) pairs to one CRM as bulk calls of at most max_batch_size leads
+    (one call per lead for APIs without a bulk endpoint). Raises on the first failed call.
+    `timeout` bounds the whole send: each call gets the time left, and TimeoutError is raised
+    once it runs out.
+    """
+    api_instance = get_writeback_api(crm_source)
+    if api_instance is None:
+        raise ValueError(f"No writeback API configured for CRM source: {crm_source}")
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def call(method, *args):
+        if deadline is None:
+            return method(*args) # The client's own default timeout
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f"{crm_source} writeback timed out after {timeout}s")
+        return method(*args, timeout=left)
+
+    scores = list(scores)
+    if not hasattr(api_instance, 'update_lead_scores'):
+        for crm_lead_id, score in scores:
+            with timed('writeback.crm_call'):
+                call(api_instance.update_lead_score, crm_lead_id, score)
+        return
+    step = max(1, max_batch_size(crm_source))
+    for start in range(0, len(scores), step):
+        with timed('writeback.crm_call'):
+            call(api_instance.update_lead_scores, scores[start:start + step])
+
+
+class ScoreDeltaFilter:
+    """
+    Last-written-score cache keyed by (crm_source, crm_lead_id), used to suppress CRM writes
+    that would not visibly change the lead. LRU-bounded; callers prime it from the DB
+    (Lead.crm_written_score), which stays the source of truth across processes.
+    """
+    def __init__(self, threshold: Optional[float] = DELTA_THRESHOLD, bands: List[float] = SCORE_BANDS,
+                 max_entries: int = LAST_WRITTEN_CACHE_SIZE):
+        self.threshold = threshold
+        self.bands = sorted(bands or [])
+        self.max_entries = max_entries
+        self._last_written = collections.OrderedDict()
+        self._lock = threading.Lock() # Shared by the in-process worker threads
+        self.sent = 0
+        self.suppressed = 0
+
+    def band(self, score: float) -> int:
+        return bisect.bisect_right(self.bands, score)
+
+    def prime(self, last_written: Dict[Tuple[str, str], float]):
+        """Loads known last-written scores (None: never written, so the next write always goes out)."""
+        for key, score in last_written.items():
+            if score is None:
+                with self._lock:
+                    self._last_written.pop(key, None)
+            else:
+                self.record_written(key, score)
+
+    def should_write(self, key: Tuple[str, str], score: float) -> bool:
+        previous = self._last_written.get(key)
+        if previous is None:
+            return True
+        if self.threshold is not None and abs(score - previous) >= self.threshold:
+            return True
+        return self.band(score) != self.band(previous)
+
+    def record_written(self, key: Tuple[str, str], score: float):
+        with self._lock:
+            self._last_written[key] = score
+            self._last_written.move_to_end(key)
+            while len(self._last_written) > self.max_entries:
+                self._last_written.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {'sent': self.sent, 'suppressed': self.suppressed, 'cached': len(self._last_written)}
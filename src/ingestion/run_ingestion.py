@@ -7,6 +7,9 @@ from src.storage.database import SessionLocal # Use SessionLocal for script exec
 from src.storage.models import CRMData, Lead, Vehicle, LeadStatus # Import models
 from src.ingestion.vinsolutions_connector import VinSolutionsConnector # Explicitly import for demo
 from src.ingestion.base import CRM_CONNECTORS # Import the map
+from src.prediction.rescoring import emit_lead_changes # Change feed for the rescoring consumer
+from src.monitoring.metrics import timed, timed_stage
+from src.monitoring.profiling import profiled
 
 # In a real orchestration system (like Airflow), this logic would be part of a DAG task.
 # This script provides a manual way to trigger ingestion for the demo.
@@ -21,11 +24,21 @@ def get_connector_instance(crm_source: str):
     return connector_class()
 
 
+def _naive_utc(value):
+    """Timestamps as stored (naive UTC), so re-sent unchanged leads do not look updated."""
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@timed_stage('ingest.lead')
 def process_and_save_lead(db: Session, standardized_lead_data: dict):
     """
     Processes a single standardized lead and saves/updates it in the database.
     This is where raw ingested data is mapped to your internal Lead/Vehicle models.
     This logic needs refinement for handling updates to existing leads.
+    Returns (lead_id, reason) when the lead was created or changed (a LeadChangeEvent is
+    committed with it), otherwise None.
     """
     crm_lead_id = standardized_lead_data['crm_lead_id']
     crm_source = standardized_lead_data['crm_source']
@@ -108,21 +121,23 @@ def process_and_save_lead(db: Session, standardized_lead_data: dict):
              if not vehicle_record:
                   print(f"  Warning: Could not find or create vehicle record for ID {vehicle_interest_id}. Skipping lead.")
                   db.rollback() # Rollback changes for this lead
-                  return # Skip processing this lead further
+                  return None # Skip processing this lead further
 
         else:
              print(f"  Warning: Standardized data missing 'vehicle_interest_id'. Skipping lead.")
              db.rollback()
-             return
+             return None
 
 
         # --- Handle Lead record ---
         # Find the Lead record associated with this CRMData entry or create a new one
         # We linked Lead.crm_data_fk uniquely to CRMData.id
         existing_lead = db.query(Lead).filter(Lead.crm_data_fk == crm_data_record.id).first()
+        change = None
 
         if existing_lead:
             print(f"  Lead record exists for CRMData {crm_data_record.id}, updating...")
+            previous = (existing_lead.current_status, _naive_utc(existing_lead.updated_at), existing_lead.initial_message)
             # Update lead status and other fields from standardized data
             existing_lead.current_status = LeadStatus(standardized_details.get('current_status_crm', 'NEW').lower()) # Map CRM status str to Enum
             existing_lead.updated_at = standardized_details.get('updated_at', datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc))
@@ -148,6 +163,11 @@ def process_and_save_lead(db: Session, standardized_lead_data: dict):
             # Leads still NEW, CONTACTED etc. might have is_converted as None for training
             # This needs careful handling in the training data loading query.
 
+            if existing_lead.current_status != previous[0]:
+                change = (existing_lead.id, 'status')
+            elif (_naive_utc(existing_lead.updated_at), existing_lead.initial_message) != previous[1:]:
+                change = (existing_lead.id, 'updated')
+
 
         else:
             print(f"  Creating new Lead record for CRMData {crm_data_record.id}...")
@@ -163,11 +183,16 @@ def process_and_save_lead(db: Session, standardized_lead_data: dict):
                 # predicted_likelihood will be set by the prediction service
             )
             db.add(lead_record)
-            # db.flush() # Not strictly necessary here as we don't need the Lead ID immediately below
-
-        # Commit changes for this lead
-        db.commit()
+            db.flush() # Lead ID for the change event
+            change = (lead_record.id, 'created')
+
+        # Commit changes for this lead (with its change event, so the feed never misses a change)
+        with timed('ingest.db_write'):
+            if change:
+                emit_lead_changes(db, [change])
+            db.commit()
         print(f"  Successfully processed lead {crm_source}/{crm_lead_id}.")
+        return change
 
     except IntegrityError as e:
         db.rollback()
@@ -175,6 +200,7 @@ def process_and_save_lead(db: Session, standardized_lead_data: dict):
     except Exception as e:
         db.rollback() # Rollback changes on any error
         print(f"  Error processing lead {crm_source}/{crm_lead_id}: {e}")
+    return None
 
 
 def run_connector_ingestion(crm_source: str = 'VinSolutions'):
@@ -202,14 +228,21 @@ def run_connector_ingestion(crm_source: str = 'VinSolutions'):
 
 
         # --- Fetch New Leads ---
-        new_leads_data = connector.fetch_new_leads(last_fetch_time)
+        with timed('ingest.fetch'):
+            new_leads_data = connector.fetch_new_leads(last_fetch_time)
         print(f"Fetched {len(new_leads_data)} potential new/updated leads from {crm_source}.")
 
         # --- Process and Save Leads ---
-        for lead_data in new_leads_data:
-            # Fetch additional details if needed and not available in the initial fetch
-            # For this demo, the initial fetch is enough to process
-            process_and_save_lead(db, lead_data)
+        changed = []
+        with timed('ingest.batch'), profiled(f"ingest_batch.{crm_source}"):
+            for lead_data in new_leads_data:
+                # Fetch additional details if needed and not available in the initial fetch
+                # For this demo, the initial fetch is enough to process
+                change = process_and_save_lead(db, lead_data)
+                if change:
+                    changed.append(change)
+        print(f"{len(changed)} lead(s) created or changed in this batch; queued for rescoring "
+              f"({sum(1 for _, reason in changed if reason == 'status')} status changes).")
 
     except Exception as e:
         print(f"An error occurred during {crm_source} ingestion: {e}")
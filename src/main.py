@@ -3,13 +3,61 @@ import subprocess # To run uvicorn
 import sys
 import os
 
-def run_train():
-    """Runs the model training script."""
+def run_train(search: bool = False, trials: int = 32, strategy: str = "random", incremental: bool = False,
+              segments: bool = False):
+    """Runs the model training script (optionally a hyperparameter search, incremental update or per-segment models)."""
     from src.training.trainer import train_model_script
     print("Starting model training...")
-    train_model_script()
+    if segments:
+        train_model_script(segments=True)
+    elif search:
+        train_model_script(search=True, n_trials=trials, strategy=strategy)
+    elif incremental:
+        train_model_script(incremental=True)
+    else:
+        train_model_script()
     print("Model training finished.")
 
+def run_backtest(folds: int = 5):
+    """Runs the rolling-origin backtest on historical data."""
+    from src.training.backtest import backtest_model
+    from src.storage.database import SessionLocal
+    db = SessionLocal()
+    try:
+        backtest_model(db, n_folds=folds)
+    finally:
+        db.close()
+
+def run_writeback_worker(processes: int = 1):
+    """Runs CRM writeback outbox workers (safe to run several, on one or more hosts)."""
+    from src.crm_writeback.outbox_worker import run_workers
+    print(f"Starting {processes} writeback worker process(es)...")
+    run_workers(processes)
+
+def run_score(open_leads: bool = False, processes: int = None, chunk_size: int = None, writeback: bool = False):
+    """Rescores leads stored in the database (currently: all open leads)."""
+    if not open_leads:
+        print("Nothing to score: pass --open-leads.")
+        return
+    from src.prediction.bulk_scoring import score_open_leads, PROCESSES, CHUNK_SIZE
+    from src.storage.database import SessionLocal
+    db = SessionLocal()
+    try:
+        score_open_leads(db, processes=PROCESSES if processes is None else processes,
+                         chunk_size=chunk_size or CHUNK_SIZE, writeback=writeback)
+    finally:
+        db.close()
+
+def run_score_file(input_path: str, output_path: str, chunk_size: int = None):
+    """Scores a CSV/NDJSON lead export into a results file (constant memory)."""
+    from src.prediction.streaming import score_file, STREAM_CHUNK_SIZE
+    score_file(input_path, output_path, chunk_size=chunk_size or STREAM_CHUNK_SIZE)
+
+def run_rescore_consumer():
+    """Rescores leads reported changed by ingestion (debounced, batched) until interrupted."""
+    from src.prediction.rescoring import run_rescoring_consumer
+    run_rescoring_consumer()
+
 def run_ingestion():
      """Runs the ingestion process (for the demo connector)."""
      from src.ingestion.run_ingestion import run_ingestion_script
@@ -18,22 +66,40 @@ def run_ingestion():
      print("Data ingestion finished.")
 
 
-def run_api():
-    """Starts the FastAPI prediction service."""
+def run_api(workers: int = 0, host: str = "0.0.0.0", port: int = 8000):
+    """Starts the FastAPI prediction service (dev server with --reload, or N pre-forked workers)."""
+    if workers > 0:
+        from src.prediction.server import serve
+        print(f"Starting Prediction Service API with {workers} worker(s)...")
+        serve(workers, host=host, port=port)
+        return
     print("Starting Prediction Service API...")
     # Use subprocess to run uvicorn command
     # Assumes uvicorn is installed in the environment
     # Adjust host/port/reload as needed
     command = [
         sys.executable, "-m", "uvicorn",
-        "src.prediction_service.api:app",
-        "--host", "0.0.0.0", # Listen on all interfaces
-        "--port", "8000",
+        "src.prediction.api:app",
+        "--host", host, # Listen on all interfaces by default
+        "--port", str(port),
         "--reload" # Auto-reload code changes (useful for development)
     ]
     print(f"Executing command: {' '.join(command)}")
     subprocess.run(command)
 
+def run_generate_data(num_leads: int, output_dir: str = None, load_db: bool = False):
+    """Generates synthetic leads for benchmarks (columnar files and/or DB bulk-load)."""
+    from src.training.synthetic_data import write_columnar, bulk_load_to_db
+    if output_dir:
+        write_columnar(output_dir, num_leads)
+    if load_db:
+        from src.storage.database import SessionLocal
+        db = SessionLocal()
+        try:
+            bulk_load_to_db(db, num_leads)
+        finally:
+            db.close()
+
 def init_db():
     """Initializes the database."""
     from src.storage.database import init_db
@@ -41,10 +107,35 @@ def init_db():
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="FB Marketplace Predictor Main Entry Point")
-    parser.add_argument("command", choices=["train", "ingest", "api", "init_db"], help="Command to run")
+    parser.add_argument("command", choices=["train", "ingest", "api", "init_db", "generate_data", "backtest", "writeback_worker", "score", "rescore_consumer", "score_file"], help="Command to run")
+    parser.add_argument("--search", action="store_true", help="train: run a parallel hyperparameter search")
+    parser.add_argument("--incremental", action="store_true", help="train: continue boosting on leads closed since the last training")
+    parser.add_argument("--segments", action="store_true", help="train: fit per-segment models (e.g. per crm_source) next to the global one")
+    parser.add_argument("--trials", type=int, default=32, help="train --search: number of configurations to try")
+    parser.add_argument("--strategy", choices=["random", "halving"], default="random", help="train --search: search strategy")
+    parser.add_argument("--folds", type=int, default=5, help="backtest: number of rolling-origin folds")
+    parser.add_argument("--num-leads", type=int, default=1_000_000, help="generate_data: number of synthetic leads")
+    parser.add_argument("--output-dir", help="generate_data: write Parquet files to this directory")
+    parser.add_argument("--load-db", action="store_true", help="generate_data: bulk-load leads into the database")
+    parser.add_argument("--processes", type=int, default=None, help="writeback_worker / score: number of worker processes")
+    parser.add_argument("--open-leads", action="store_true", help="score: rescore every open lead in the database")
+    parser.add_argument("--chunk-size", type=int, help="score / score_file: leads scored per chunk")
+    parser.add_argument("--input", help="score_file: CSV or NDJSON file of leads")
+    parser.add_argument("--output", help="score_file: results file (.csv or .ndjson)")
+    parser.add_argument("--writeback", action="store_true", help="score: queue CRM writebacks for changed scores")
+    parser.add_argument("--workers", type=int, default=0, help="api: pre-forked worker processes sharing one model (0: dev server with --reload)")
+    parser.add_argument("--host", default="0.0.0.0", help="api: bind address")
+    parser.add_argument("--port", type=int, default=8000, help="api: bind port")
+    parser.add_argument("--profile", nargs="?", const="true", default=None,
+                        help="train / ingest / backtest / score / score_file: write a profile (cprofile or sampling) to the profile directory")
 
     args = parser.parse_args()
 
+    if args.profile:
+        # Profiles the hooked entry points of this run (work done in worker processes is not included)
+        from src.monitoring.profiling import parse_mode, request_profiling
+        request_profiling(parse_mode(args.profile))
+
     if args.command == "init_db":
         init_db()
     elif args.command == "ingest":
@@ -54,11 +145,42 @@ if __name__ == "__main__":
     elif args.command == "train":
         # Note: Requires data to be in the DB (run ingest first, potentially multiple times)
         # and requires synthetic data generation in load_historical_data to be enabled if no real data.
-        run_train()
+        run_train(search=args.search, trials=args.trials, strategy=args.strategy, incremental=args.incremental,
+                  segments=args.segments)
     elif args.command == "api":
         # Note: Requires a trained model file to exist in ./models/
-        run_api()
+        run_api(workers=args.workers, host=args.host, port=args.port)
+    elif args.command == "backtest":
+        run_backtest(folds=args.folds)
+    elif args.command == "generate_data":
+        run_generate_data(args.num_leads, output_dir=args.output_dir, load_db=args.load_db)
+    elif args.command == "writeback_worker":
+        run_writeback_worker(processes=args.processes or 1)
+    elif args.command == "score":
+        run_score(open_leads=args.open_leads, processes=args.processes, chunk_size=args.chunk_size, writeback=args.writeback)
+    elif args.command == "rescore_consumer":
+        run_rescore_consumer()
+    elif args.command == "score_file":
+        if not args.input or not args.output:
+            parser.error("score_file requires --input and --output")
+        run_score_file(args.input, args.output, chunk_size=args.chunk_size)
+
+    # Stage timings of batch jobs (recorded in this process; worker processes keep their own)
+    if args.command in ("ingest", "train", "backtest", "score", "score_file"):
+        from src.monitoring.metrics import print_summary
+        print_summary()
     # python src/main.py init_db
     # python src/main.py ingest # Run multiple times
     # python src/main.py train
+    # python src/main.py train --search --trials 64 --strategy halving
+    # python src/main.py train --incremental # Daily warm-start refresh
+    # python src/main.py train --profile sampling # Statistical profile of the training run
+    # python src/main.py train --segments # Per-crm_source models, served with a fallback to the global model
+    # python src/main.py backtest --folds 5
     # python src/main.py api
+    # python src/main.py api --workers 8 # Production: model loaded once, shared by all workers
+    # python src/main.py generate_data --num-leads 5000000 --output-dir data/synthetic
+    # python src/main.py writeback_worker --processes 4
+    # python src/main.py score --open-leads --processes 8 --writeback
+    # python src/main.py rescore_consumer # Rescores leads changed by ingestion
+    # python src/main.py score_file --input partner_leads.csv --output scores.ndjson
@@ -0,0 +1,279 @@
+import datetime
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import settings
+from src.storage import model_registry
+from src.prediction.scoring import IMPUTED_ROWS_ATTR
+
+# Feature drift monitoring: live model inputs vs. the training distribution.
+# Training stores a reference histogram per model input feature (and per crm_source) in the
+# model version's directory (drift_reference.json). Numeric features use fixed bins at the
+# training deciles, categorical features their most frequent categories plus an "other" bin;
+# both have a missing-value bin. The API adds every scored batch to matching count arrays (a
+# bin lookup and an add per row and feature; no raw inputs are kept), so memory is fixed at
+# features x bins x segments. /drift compares the live counts with the reference (PSI per
+# feature, plus a binned KS distance for numeric features), overall and per crm_source.
+# Live counts cover the current and previous window, and are per API worker process. Values that
+# prepare_features imputed from training defaults are not counted (they would read as a point mass).
+
+DRIFT_SETTINGS = settings.get("monitoring", {}).get("drift", {})
+DRIFT_ENABLED = DRIFT_SETTINGS.get("enabled", True)
+SEGMENT_BY = DRIFT_SETTINGS.get("segment_by", "crm_source")
+NUMERIC_BINS = DRIFT_SETTINGS.get("bins", 10)
+MAX_CATEGORIES = DRIFT_SETTINGS.get("max_categories", 20)
+MAX_SEGMENTS = DRIFT_SETTINGS.get("max_segments", 50) # Further live segments are counted as OTHER_SEGMENT
+WINDOW_HOURS = DRIFT_SETTINGS.get("window_hours", 24)
+MIN_ROWS = DRIFT_SETTINGS.get("min_rows", 100) # Fewer live rows: reported without a status
+PSI_WARN = DRIFT_SETTINGS.get("psi_warn", 0.1)
+PSI_ALERT = DRIFT_SETTINGS.get("psi_alert", 0.25)
+
+REFERENCE_FILE = "drift_reference.json"
+STATUS_RANK = {'insufficient_data': 0, 'ok': 1, 'warn': 2, 'alert': 3} # The worst feature sets the overall status
+OTHER_SEGMENT = "__other__"
+_EPSILON = 1e-4 # Floor for empty bins in PSI
+
+
+# --- Reference (training) histograms ---
+def _feature_spec(values: pd.Series, bins: int, max_categories: int) -> Dict[str, Any]:
+    if pd.api.types.is_numeric_dtype(values):
+        finite = values.to_numpy(dtype=float)
+        finite = finite[np.isfinite(finite)]
+        edges = np.unique(np.quantile(finite, np.linspace(0, 1, bins + 1)[1:-1])) if len(finite) else np.array([])
+        return {'type': 'numeric', 'edges': edges.tolist()}
+    top = values.dropna().astype(str).value_counts().index[:max_categories]
+    return {'type': 'categorical', 'categories': sorted(top.tolist())}
+
+
+def bin_values(spec: Dict[str, Any], values) -> np.ndarray:
+    """Bin index per value. Numeric: len(edges) + 1 bins; categorical: one per category, then other. Missing is the last bin."""
+    values = np.asarray(values)
+    if spec['type'] == 'numeric':
+        try:
+            x = values.astype(float) # Numbers and None (-> NaN), also from object arrays
+        except (TypeError, ValueError):
+            x = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+        edges = np.asarray(spec['edges'], dtype=float)
+        return np.where(np.isnan(x), len(edges) + 1, np.searchsorted(edges, x, side='right'))
+    index = spec.get('_index') or {category: i for i, category in enumerate(spec['categories'])}
+    values = values.tolist()
+    other = len(spec['categories'])
+    return np.fromiter((other + 1 if value is None or value != value else index.get(str(value), other)
+                        for value in values), dtype=np.int64, count=len(values))
+
+
+def n_bins(spec: Dict[str, Any]) -> int:
+    return (len(spec['edges']) + 2) if spec['type'] == 'numeric' else (len(spec['categories']) + 2)
+
+
+def build_reference(X: pd.DataFrame, segment_by: str = SEGMENT_BY, bins: int = NUMERIC_BINS,
+                    max_categories: int = MAX_CATEGORIES, max_segments: int = MAX_SEGMENTS) -> Dict[str, Any]:
+    """Reference histograms of the model inputs `X` (overall and per `segment_by` value)."""
+    features = {column: _feature_spec(X[column], bins, max_categories) for column in X.columns}
+    binned = {column: bin_values(spec, X[column].to_numpy()) for column, spec in features.items()}
+    for column, spec in features.items():
+        spec['counts'] = np.bincount(binned[column], minlength=n_bins(spec)).tolist()
+    segments = {}
+    if segment_by in X.columns:
+        values = X[segment_by].astype(str).to_numpy()
+        for segment in pd.Series(values).value_counts().index[:max_segments]:
+            mask = values == segment
+            segments[segment] = {'rows': int(mask.sum()),
+                                 'counts': {column: np.bincount(binned[column][mask], minlength=n_bins(spec)).tolist()
+                                            for column, spec in features.items()}}
+    return {'created_at': datetime.datetime.utcnow().isoformat(), 'rows': len(X), 'segment_by': segment_by,
+            'features': features, 'segments': segments}
+
+
+def load_reference(version: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The drift reference stored with a registry version (None for unversioned models or older versions)."""
+    if version is None:
+        return None
+    path = os.path.join(model_registry.version_dir(version), REFERENCE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+# --- Distances ---
+def psi(expected, actual) -> float:
+    """Population stability index between two count histograms over the same bins."""
+    p = np.asarray(expected, dtype=float)
+    q = np.asarray(actual, dtype=float)
+    p = np.maximum(p / max(p.sum(), 1.0), _EPSILON)
+    q = np.maximum(q / max(q.sum(), 1.0), _EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def binned_ks(expected, actual) -> float:
+    """Largest CDF gap between two count histograms over the same ordered bins (missing bin excluded)."""
+    p = np.asarray(expected[:-1], dtype=float)
+    q = np.asarray(actual[:-1], dtype=float)
+    if p.sum() == 0 or q.sum() == 0:
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(p) / p.sum() - np.cumsum(q) / q.sum())))
+
+
+def drift_status(value: float) -> str:
+    return 'alert' if value >= PSI_ALERT else 'warn' if value >= PSI_WARN else 'ok'
+
+
+# --- Live counts ---
+class DriftMonitor:
+    """Fixed-size live histograms matching a reference; observe() is called with each scored batch's model inputs."""
+    def __init__(self, reference: Optional[Dict[str, Any]] = None, window_hours: float = WINDOW_HOURS,
+                 min_rows: int = MIN_ROWS, max_segments: int = MAX_SEGMENTS, clock=time.time):
+        self.window_seconds = window_hours * 3600
+        self.min_rows = min_rows
+        self.max_segments = max_segments
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.set_reference(reference)
+
+    def set_reference(self, reference: Optional[Dict[str, Any]], version: Optional[str] = None):
+        """Switches to a new reference (e.g. after a model swap) and restarts the live counts."""
+        with self._lock:
+            self.reference = reference
+            self.version = version
+            self._features = {}
+            self._layouts = {} # Column layout of observed frames -> positions
+            for column, spec in (reference or {}).get('features', {}).items():
+                spec = dict(spec)
+                if spec['type'] == 'categorical':
+                    spec['_index'] = {category: i for i, category in enumerate(spec['categories'])}
+                self._features[column] = spec
+            self._windows = [self._empty(), self._empty()] # [current, previous]
+            self._window_started = self._clock()
+
+    def _empty(self) -> Dict[str, Any]:
+        return {'rows': 0, 'segments': {}}
+
+    def _segment_counts(self, window, segment: str):
+        segments = window['segments']
+        if segment not in segments and len(segments) >= self.max_segments - 1: # Last slot is for OTHER_SEGMENT
+            segment = OTHER_SEGMENT
+        if segment not in segments:
+            segments[segment] = {'rows': 0, 'counts': {column: np.zeros(n_bins(spec), dtype=np.int64)
+                                                       for column, spec in self._features.items()}}
+        return segments[segment]
+
+    def _positions(self, columns: tuple):
+        """([(feature, column position)], segment column position or -1) for a column layout (cached)."""
+        cached = self._layouts.get(columns)
+        if cached is None:
+            index = {column: i for i, column in enumerate(columns)}
+            cached = ([(column, index[column]) for column in self._features if column in index],
+                      index.get(self.reference.get('segment_by'), -1))
+            self._layouts[columns] = cached
+        return cached
+
+    def observe(self, X: pd.DataFrame):
+        """Adds a batch of model inputs to the live histograms (no-op without a reference)."""
+        if not self._features or X is None or len(X) == 0:
+            return
+        try:
+            positions, segment_position = self._positions(tuple(X.columns))
+            values = X.to_numpy(dtype=object) # One conversion for all columns (column access dominates for single rows)
+            binned = {column: bin_values(self._features[column], values[:, position]) for column, position in positions}
+            # Inputs filled from training defaults (see scoring.prepare_features) say nothing about live traffic
+            imputed = {column: rows for column, rows in X.attrs.get(IMPUTED_ROWS_ATTR, {}).items() if column in binned}
+            for column, rows in imputed.items():
+                binned[column] = binned[column].copy()
+                binned[column][rows] = -1
+        except Exception as e: # Monitoring must never fail a prediction
+            print(f"Error updating drift histograms: {e}")
+            return
+        segment_values = values[:, segment_position].astype(str) if segment_position >= 0 else np.full(len(X), OTHER_SEGMENT)
+        with self._lock:
+            now = self._clock()
+            if now - self._window_started >= self.window_seconds:
+                self._windows = [self._empty(), self._windows[0]]
+                self._window_started = now
+            window = self._windows[0]
+            window['rows'] += len(X)
+            segments = set(segment_values.tolist())
+            for segment in segments:
+                # Single-segment batches (e.g. one /predict request) skip the masking
+                mask = slice(None) if len(segments) == 1 else segment_values == segment
+                entry = self._segment_counts(window, segment)
+                entry['rows'] += len(segment_values) if len(segments) == 1 else int(mask.sum())
+                for column, bins in binned.items():
+                    counts = entry['counts'][column]
+                    bins = bins[mask]
+                    if column in imputed:
+                        bins = bins[bins >= 0]
+                    counts += np.bincount(bins, minlength=len(counts))
+
+    def _live(self):
+        """Live counts over the current and previous window: (rows, {segment: (rows, {feature: counts})})."""
+        with self._lock:
+            segments: Dict[str, Any] = {}
+            for window in self._windows:
+                for segment, entry in window['segments'].items():
+                    total = segments.setdefault(segment, [0, {column: np.zeros(n_bins(spec), dtype=np.int64)
+                                                              for column, spec in self._features.items()}])
+                    total[0] += entry['rows']
+                    for column, counts in entry['counts'].items():
+                        total[1][column] += counts
+            return sum(window['rows'] for window in self._windows), segments
+
+    def _compare(self, reference_counts: Dict[str, list], live_counts: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        features = {}
+        for column, spec in self._features.items():
+            expected, actual = reference_counts[column], live_counts[column]
+            observed = int(actual.sum()) # Rows with an observed (not imputed) value
+            result = {'psi': round(psi(expected, actual), 4), 'rows': observed}
+            if spec['type'] == 'numeric':
+                result['ks'] = round(binned_ks(expected, actual), 4)
+            result['status'] = drift_status(result['psi']) if observed >= self.min_rows else 'insufficient_data'
+            features[column] = result
+        return features
+
+    def report(self) -> Dict[str, Any]:
+        if not self._features:
+            return {'enabled': DRIFT_ENABLED, 'model_version': self.version,
+                    'error': "No drift reference for the live model version."}
+        rows, segments = self._live()
+        overall = {column: np.zeros(n_bins(spec), dtype=np.int64) for column, spec in self._features.items()}
+        for _, counts in segments.values():
+            for column in overall:
+                overall[column] += counts[column]
+        reference_overall = {column: spec['counts'] for column, spec in self._features.items()}
+        by_segment = {}
+        for segment, (segment_rows, counts) in sorted(segments.items()):
+            reference_segment = self.reference.get('segments', {}).get(segment)
+            if reference_segment is not None and reference_segment['rows'] < self.min_rows:
+                reference_segment = None
+            by_segment[segment] = {
+                'rows': segment_rows,
+                # Segments unseen (or too rare) in training are compared with the overall reference
+                'reference': 'segment' if reference_segment else 'overall',
+                'features': self._compare(reference_segment['counts'] if reference_segment else reference_overall, counts),
+            }
+        features = self._compare(reference_overall, overall)
+        worst = max(features.values(), key=lambda result: (STATUS_RANK[result['status']], result['psi']))
+        return {'enabled': True, 'model_version': self.version, 'reference_rows': self.reference.get('rows'),
+                'live_rows': rows, 'window_hours': self.window_seconds / 3600,
+                'status': worst['status'], 'features': features,
+                'segment_by': self.reference.get('segment_by'), 'segments': by_segment}
+
+
+drift_monitor = DriftMonitor()
+
+
+def refresh_reference(model_pipeline=None, version: Optional[str] = None):
+    """Loads the live version's reference into the monitor (registered as a model-swap listener)."""
+    if not DRIFT_ENABLED:
+        return
+    try:
+        drift_monitor.set_reference(load_reference(version), version)
+    except Exception as e:
+        print(f"Error loading drift reference for model version {version}: {e}")
+        drift_monitor.set_reference(None, version)
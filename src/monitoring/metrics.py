@@ -0,0 +1,170 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from src.config import settings
+
+# Stage-level latency histograms.
+# `with timed('score.features'):` (or @timed_stage for a whole function) records the wall time of
+# one stage into a fixed-bucket histogram that also keeps the stage's min and max: two perf_counter
+# calls, a bisect and a few updates under a lock, so the timers can stay on in the hot path. The API exports the histograms in the
+# Prometheus text format on /metrics; batch commands print summary() when they finish.
+# Histograms are per process (each API worker exports its own; scrape every worker).
+
+METRICS_SETTINGS = settings.get("monitoring", {}).get("metrics", {})
+METRICS_ENABLED = METRICS_SETTINGS.get("enabled", True)
+METRIC_PREFIX = METRICS_SETTINGS.get("prefix", "lead_predictor")
+# Upper bounds in seconds, from sub-millisecond model calls to multi-minute training fits
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label value (e.g. per stage), Prometheus style."""
+    def __init__(self, name: str, help_text: str, label: str = 'stage', buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[str, list] = {} # label value -> [bucket counts (+Inf last), sum, count, min, max]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        index = bisect.bisect_left(self.buckets, value) # First bucket with value <= upper bound
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0, value, value]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            if value < series[3]:
+                series[3] = value
+            elif value > series[4]:
+                series[4] = value
+
+    def snapshot(self) -> Dict[str, tuple]:
+        with self._lock:
+            return {label_value: (list(counts), total, count, low, high)
+                    for label_value, (counts, total, count, low, high) in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def quantile(self, q: float, counts: List[int], low: Optional[float] = None,
+                 high: Optional[float] = None) -> Optional[float]:
+        """
+        Estimated quantile from bucket counts (linear within the bucket, like histogram_quantile),
+        clamped to the observed `low`/`high` when given: no estimate falls outside the values seen.
+        """
+        total = sum(counts)
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        estimate = self.buckets[-1]
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                if i == len(self.buckets): # +Inf bucket: the largest finite bound (or the max) is the best estimate
+                    estimate = self.buckets[-1] if high is None else max(high, self.buckets[-1])
+                    break
+                lower = self.buckets[i - 1] if i else 0.0
+                estimate = lower + (self.buckets[i] - lower) * (rank - seen) / n
+                break
+            seen += n
+        if low is not None:
+            estimate = max(estimate, low)
+        if high is not None:
+            estimate = min(estimate, high)
+        return estimate
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total, count, _, _) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total!r}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+STAGE_SECONDS = Histogram(f"{METRIC_PREFIX}_stage_duration_seconds", "Wall time per pipeline stage.")
+
+
+class timed:
+    """Context manager recording the block's wall time under `stage` (also when it raises)."""
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if METRICS_ENABLED:
+            STAGE_SECONDS.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def timed_stage(stage: str):
+    """Decorator form of `timed` for plain and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_prometheus() -> str:
+    return "\n".join(STAGE_SECONDS.render()) + "\n"
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    """
+    Per stage: calls, total seconds and mean/min/p50/p95/p99/max milliseconds (percentiles
+    estimated from buckets, within the observed min and max).
+    """
+    result = {}
+    for stage, (counts, total, count, low, high) in sorted(STAGE_SECONDS.snapshot().items()):
+        result[stage] = {'calls': count, 'total_s': round(total, 3), 'mean_ms': round(total / count * 1000, 3),
+                         'min_ms': round(low * 1000, 3)}
+        for q in (0.5, 0.95, 0.99):
+            result[stage][f"p{int(q * 100)}_ms"] = round(STAGE_SECONDS.quantile(q, counts, low, high) * 1000, 3)
+        result[stage]['max_ms'] = round(high * 1000, 3)
+    return result
+
+
+def print_summary(title: str = "Stage timings"):
+    """Prints the summary as a table (used at the end of batch commands)."""
+    stages = summary()
+    if not stages:
+        return
+    print(f"\n{title}:")
+    print(f"  {'stage':<28} {'calls':>8} {'total s':>10} {'mean ms':>10} {'min ms':>10} "
+          f"{'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for stage, s in stages.items():
+        print(f"  {stage:<28} {s['calls']:>8} {s['total_s']:>10.3f} {s['mean_ms']:>10.3f} {s['min_ms']:>10.3f} "
+              f"{s['p50_ms']:>10.3f} {s['p95_ms']:>10.3f} {s['p99_ms']:>10.3f} {s['max_ms']:>10.3f}")
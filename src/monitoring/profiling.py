@@ -0,0 +1,203 @@
+import collections
+import contextvars
+import cProfile
+import datetime
+import functools
+import inspect
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from src.config import settings
+from src.storage import model_registry
+
+# Opt-in profiling of hot paths.
+# A request asks for a profile with `?profile=true` (or `?profile=sampling`) or an `X-Profile`
+# header; a CLI run with `--profile [cprofile|sampling]`. Functions wrapped in profile_stage()
+# (/predict, the batch scoring endpoints, train_model, each ingestion batch) then capture either
+# a cProfile of the calling thread (.prof for snakeviz/pstats plus a .txt top list) or a
+# statistical profile from a thread sampling the caller's stack every few milliseconds
+# (.collapsed stacks for flamegraph.pl/speedscope; low overhead, fine for long jobs). Files go
+# to a directory that keeps the newest `max_files` profiles. When nothing asked for a profile,
+# a wrapped call costs one ContextVar lookup. One profile runs at a time per process; requests
+# arriving while one runs are served unprofiled. Async endpoints are profiled on the event loop
+# thread, so other requests' work interleaved at an await can appear in their profile.
+
+PROFILING_SETTINGS = settings.get("monitoring", {}).get("profiling", {})
+PROFILING_ENABLED = PROFILING_SETTINGS.get("enabled", True) # Off: profile flags/headers are ignored
+PROFILE_DIR = PROFILING_SETTINGS.get("dir") or os.path.join(os.path.dirname(model_registry.REGISTRY_DIR), "profiles")
+MAX_FILES = PROFILING_SETTINGS.get("max_files", 50) # Profiles kept (older ones are deleted)
+DEFAULT_MODE = PROFILING_SETTINGS.get("mode", "cprofile") # "cprofile" or "sampling"
+SAMPLE_INTERVAL_MS = PROFILING_SETTINGS.get("sample_interval_ms", 5)
+TOP_FUNCTIONS = 40 # Rows in the .txt summary of a cProfile
+MODES = ("cprofile", "sampling")
+PROFILE_HEADER = b"x-profile"
+
+_requested: contextvars.ContextVar = contextvars.ContextVar('profile_requested', default=None) # Mode or None
+_running = threading.Lock()
+
+
+def parse_mode(value) -> Optional[str]:
+    """Profiling mode for a flag/header value: 'cprofile', 'sampling' or None (off)."""
+    if value is None or value is False:
+        return None
+    value = str(value).strip().lower()
+    if value in MODES:
+        return value
+    return DEFAULT_MODE if value in ("1", "true", "yes", "on") else None
+
+
+def request_profiling(mode: Optional[str] = DEFAULT_MODE):
+    """Turns profiling of profile_stage() calls on (or off with None) for the current context, e.g. a CLI run."""
+    return _requested.set(mode)
+
+
+# --- Samplers ---
+class _StackSampler(threading.Thread):
+    """Counts the target thread's call stacks every interval (collapsed-stack format)."""
+    def __init__(self, thread_id: int, interval_ms: float = SAMPLE_INTERVAL_MS):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000.0
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class profiled:
+    """Profiles the block when profiling was requested for this context (nested blocks join the outer profile)."""
+    def __init__(self, name: str, mode: Optional[str] = None, profile_dir: Optional[str] = None):
+        self.name = name
+        self.mode = mode
+        self.profile_dir = profile_dir or PROFILE_DIR
+        self.path = None # Output path (without extension) once started
+        self._profiler = None
+        self._token = None
+
+    def __enter__(self):
+        mode = self.mode or _requested.get()
+        if mode is None or not PROFILING_ENABLED:
+            return self
+        if not _running.acquire(blocking=False):
+            return self # Another profile (or the outer block) is running
+        self._token = _requested.set(None) # Nested profile_stage() calls run unprofiled
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')
+        self.path = os.path.join(self.profile_dir, f"{stamp}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', self.name)}-{mode}")
+        self._started = time.perf_counter()
+        if mode == "sampling":
+            self._profiler = _StackSampler(threading.get_ident())
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._profiler is None:
+            return False
+        try:
+            elapsed = time.perf_counter() - self._started
+            if isinstance(self._profiler, _StackSampler):
+                self._profiler.stop()
+                with open(self.path + ".collapsed", "w") as f:
+                    for stack, count in self._profiler.stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+                written = [self.path + ".collapsed"]
+            else:
+                self._profiler.disable()
+                self._profiler.dump_stats(self.path + ".prof")
+                report = io.StringIO()
+                pstats.Stats(self._profiler, stream=report).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+                with open(self.path + ".txt", "w") as f:
+                    f.write(report.getvalue())
+                written = [self.path + ".prof", self.path + ".txt"]
+            print(f"Profile of {self.name} ({elapsed:.3f}s) written to {', '.join(written)}")
+            rotate(self.profile_dir)
+        except Exception as e:
+            print(f"Error writing profile of {self.name}: {e}")
+        finally:
+            self._profiler = None
+            _requested.reset(self._token)
+            _running.release()
+        return False
+
+
+def profile_stage(name: str):
+    """Decorator: profiles the call when profiling was requested (one ContextVar lookup otherwise)."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _requested.get() is None:
+                    return await fn(*args, **kwargs)
+                with profiled(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _requested.get() is None:
+                return fn(*args, **kwargs)
+            with profiled(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def rotate(profile_dir: str = PROFILE_DIR, max_files: int = MAX_FILES):
+    """Deletes all but the newest `max_files` profiles (a profile's files share one name stem)."""
+    stems = sorted({os.path.splitext(name)[0] for name in os.listdir(profile_dir)}, reverse=True)
+    for stem in stems[max_files:]:
+        for extension in (".prof", ".txt", ".collapsed"):
+            path = os.path.join(profile_dir, stem + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# --- API ---
+class ProfilingMiddleware:
+    """ASGI middleware: `?profile=...` or an X-Profile header requests a profile for that request's handler."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED:
+            return await self.app(scope, receive, send)
+        mode = None
+        if b"profile=" in scope.get("query_string", b""):
+            for pair in scope["query_string"].split(b"&"):
+                key, _, value = pair.partition(b"=")
+                if key == b"profile":
+                    mode = parse_mode(value.decode("latin-1"))
+        for key, value in scope.get("headers", ()):
+            if key == PROFILE_HEADER:
+                mode = parse_mode(value.decode("latin-1"))
+        if mode is None:
+            return await self.app(scope, receive, send)
+        token = _requested.set(mode) # Copied into the threadpool context for sync handlers
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            _requested.reset(token)
@@ -1,14 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
 from sqlalchemy.orm import Session
+from pydantic import ValidationError
 import pandas as pd
+import numpy as np
 import datetime
+import threading
 
-from src.storage.database import get_db
-from src.storage.models import Lead # Assuming you might want to update the lead in DB
-from src.prediction_service.schemas import LeadPredictInput, PredictionOutput
-from src.prediction_service.model_loader import load_model_pipeline, model_pipeline as loaded_model_pipeline # Import the global variable and loader
-from src.processing.feature_engineering import create_raw_features, NUMERICAL_FEATURES, CATEGORICAL_FEATURES # Import feature creation and column lists
-from src.crm_writeback.writeback_manager import writeback_score_to_crm # Import writeback function
+from src.storage.database import get_db, SessionLocal
+from src.prediction.schemas import LeadPredictInput, PredictionOutput, BatchPredictInput, BatchPredictionItem, BatchPredictionOutput, ScoreByIdInput, FeatureContribution
+from src.prediction.lead_lookup import load_lead_records, vehicle_cache
+from src.prediction.scoring import prepare_features, records_to_frame, score_features, persist_scores
+from src.prediction.result_cache import ResultCache, RESULT_CACHE_ENABLED
+from src.prediction.batcher import MicroBatcher
+from src.prediction.explain import Explainer # Per-lead top feature contributions (explain=true)
+from src.prediction import streaming
+from src.prediction.model_router import get_model_router # Per-segment models behind an LRU cache (model.partitioning)
+from src.prediction.shadow import load_shadow_scorer # Challenger model scored off the request path
+from src.prediction.model_loader import load_current_model, start_model_watcher, get_model_pipeline, get_model_version, get_model_with_version, on_model_swap # Hot-swappable model
+from src.prediction.score_sink import get_score_sink # Background score persistence
+from src.monitoring.drift import drift_monitor, refresh_reference # Live input histograms vs. training
+from src.monitoring.metrics import timed_stage, render_prometheus # Stage latency histograms (/metrics)
+from src.monitoring.profiling import ProfilingMiddleware, profile_stage # ?profile=true / X-Profile request profiles
+from src.crm_writeback.outbox_worker import start_worker_thread, outbox_stats, delta_filter_stats, INPROCESS_WORKERS
+from src.crm_writeback.dispatcher import dispatcher_stats
+from src.config import settings
+
+# Micro-batching of concurrent single-lead /predict requests (see batcher.py)
+MICRO_BATCH_SETTINGS = settings.get("prediction", {}).get("micro_batch", {})
+MICRO_BATCH_ENABLED = MICRO_BATCH_SETTINGS.get("enabled", True)
 
 
 # --- FastAPI App Setup ---
@@ -17,13 +39,97 @@ app = FastAPI(
     description="API for predicting the likelihood of a lead completing a transaction.",
     version="0.1.0",
 )
+app.add_middleware(ProfilingMiddleware) # Marks requests asking for a profile; handlers opt in via profile_stage
+
+batcher = None
+shadow_scorer = None
+model_router = get_model_router() # None unless model.partitioning is enabled
+_outbox_stop = threading.Event()
+
+
+# Scores of repeated, unchanged inputs are served from the result cache (see result_cache.py)
+result_cache = ResultCache() if RESULT_CACHE_ENABLED else None
+if result_cache is not None:
+    on_model_swap(result_cache.clear)
+explainer = Explainer()
+on_model_swap(explainer.clear)
+on_model_swap(refresh_reference) # Drift is measured against the live version's training reference
+
+
+def _score_features(model_pipeline, model_version, X):
+    """score_features through the result cache (when enabled). The inputs also feed the drift monitor."""
+    drift_monitor.observe(X)
+    if result_cache is None:
+        return score_features(model_pipeline, X)
+    return result_cache.score(model_pipeline, X, model_version)
+
+
+def _score_records(model_pipeline, model_version, records):
+    return _score_features(model_pipeline, model_version, prepare_features(records_to_frame(records), model_pipeline))
+
+
+def _model_for(record):
+    """(pipeline, version) for a record: its segment's model when partitioning is on, else the live global model."""
+    if model_router is None:
+        return get_model_with_version()
+    return model_router.route(record)
+
+
+def _score_routed(records, explain=False):
+    """
+    Scores records with their routed models: one predict_proba call (pred_contribs with `explain`)
+    per distinct model. Returns (scores, versions, explanations); explanations are None unless `explain`.
+    """
+    if model_router is None:
+        groups = [(*get_model_with_version(), list(range(len(records))))]
+    else:
+        groups = model_router.group(records)
+    scores, versions, explanations = np.empty(len(records)), [None] * len(records), [None] * len(records)
+    for model_pipeline, model_version, positions in groups:
+        if model_pipeline is None:
+            raise RuntimeError("ML model is not loaded.")
+        group_records = [records[p] for p in positions]
+        if explain:
+            X = prepare_features(records_to_frame(group_records), model_pipeline)
+            drift_monitor.observe(X)
+            scores[positions], group_explanations = explainer.explain(model_pipeline, X, model_version)
+            for position, explanation in zip(positions, group_explanations):
+                explanations[position] = explanation
+        else:
+            scores[positions] = _score_records(model_pipeline, model_version, group_records)
+        for position in positions:
+            versions[position] = model_version
+    return scores, versions, explanations
+
+
+def _contributions(explanation):
+    """Explainer output as response items (None when not requested)."""
+    return [FeatureContribution(**item) for item in explanation] if explanation is not None else None
+
+
+def _score_micro_batch(records):
+    """Scores one coalesced batch with the live (or routed) models (runs in the batcher's worker thread)."""
+    return _score_routed(records)[0]
+
 
 # --- Model Loading on Startup ---
 @app.on_event("startup")
 async def startup_event():
-    """Load the model when the FastAPI app starts."""
-    global loaded_model_pipeline # Use the global variable
-    loaded_model_pipeline = load_model_pipeline()
+    """Load the CURRENT model when the FastAPI app starts and watch the registry for new versions."""
+    global batcher, shadow_scorer
+    # Reuse a model preloaded by the pre-fork server (shared with the other workers); load otherwise
+    loaded_model_pipeline = get_model_pipeline() or load_current_model()
+    refresh_reference(loaded_model_pipeline, get_model_version())
+    start_model_watcher() # New versions are loaded in the background and swapped in without downtime
+    get_score_sink() # Starts the background score persistence worker
+    for _ in range(INPROCESS_WORKERS): # Send outbox writebacks (more workers: main.py writeback_worker)
+        start_worker_thread(_outbox_stop)
+    if MICRO_BATCH_ENABLED:
+        batcher = MicroBatcher(_score_micro_batch,
+                               max_wait_ms=MICRO_BATCH_SETTINGS.get("max_wait_ms", 2.0),
+                               max_batch_size=MICRO_BATCH_SETTINGS.get("max_batch_size", 64))
+        batcher.start()
+    shadow_scorer = load_shadow_scorer() # None unless prediction.shadow is enabled
     if loaded_model_pipeline is None:
         print("Startup failed: Could not load the model.")
         # Depending on severity, you might want to raise an exception here
@@ -31,17 +137,30 @@ async def startup_event():
         # raise RuntimeError("Failed to load ML model")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if batcher is not None:
+        await batcher.stop()
+    get_score_sink().stop() # Drain queued scores before exit
+    if shadow_scorer is not None:
+        shadow_scorer.stop()
+    _outbox_stop.set()
+
+
 # --- Prediction Endpoint ---
 @app.post("/predict", response_model=PredictionOutput)
+@profile_stage('predict_lead_likelihood')
+@timed_stage('predict.request')
 async def predict_lead_likelihood(
     lead_data_input: LeadPredictInput,
-    db: Session = Depends(get_db) # Get a DB session
+    explain: bool = False
 ):
     """
-    Receives lead data and returns a transaction likelihood score.
+    Receives lead data and returns a transaction likelihood score
+    (with ?explain=true, also the features that contributed most to it).
     """
-    # Check if model is loaded
-    if loaded_model_pipeline is None:
+    # Check if the (global, fallback) model is loaded
+    if get_model_pipeline() is None:
         raise HTTPException(status_code=503, detail="ML model is not loaded. Cannot make predictions.")
 
     # --- Data Preparation ---
@@ -53,117 +172,272 @@ async def predict_lead_likelihood(
     input_data_dict['created_at'] = input_data_dict['created_at'].replace(tzinfo=datetime.timezone.utc)
     # input_data_dict['updated_at'] = input_data_dict['updated_at'].replace(tzinfo=datetime.timezone.utc) if input_data_dict.get('updated_at') else None
     input_data_dict['time_of_prediction'] = input_data_dict['time_of_prediction'].replace(tzinfo=datetime.timezone.utc)
+    # Take one reference to the model for the whole request (a swap may happen concurrently);
+    # with partitioning on, this is the lead's segment model when one exists
+    loaded_model_pipeline, model_version = _model_for(input_data_dict)
+
 
+    # --- Prediction ---
+    # With micro-batching on, concurrent requests are coalesced and scored as one matrix.
+    # Raw feature creation selects the columns the *preprocessor* expects, in training order
+    # (see scoring.prepare_features); inputs the API schema does not carry get documented defaults.
+    explanation = None
+    try:
+        if explain: # Score and contributions come from one pred_contribs call (not micro-batched)
+            scores, versions, explanations = await run_in_threadpool(_score_routed, [input_data_dict], True)
+            likelihood_score, model_version, explanation = float(scores[0]), versions[0], explanations[0]
+        elif batcher is not None:
+            likelihood_score = await batcher.submit(input_data_dict)
+        else:
+            df_row = pd.DataFrame([input_data_dict])
+            X_predict = prepare_features(df_row, loaded_model_pipeline)
+            # predict_proba returns probabilities [P(class_0), P(class_1)]
+            likelihood_score = float(_score_features(loaded_model_pipeline, model_version, X_predict)[0]) # 1=WON
+    except KeyError as e:
+        print(f"Missing column(s) required for prediction: {e}")
+        raise HTTPException(status_code=400, detail=f"Missing required input data for feature engineering: {e}")
+    except Exception as e:
+        print(f"Error during model prediction: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal error during prediction: {e}")
 
-    df_row = pd.DataFrame([input_data_dict])
 
-    # Apply the raw feature creation function
-    # This function needs to correctly handle the 'time_of_prediction' column
-    # to calculate lead_age_hours correctly for scoring *new* data.
+    # --- Post-Prediction Actions ---
+    # Writing the score to the Lead table and queueing the CRM writeback (outbox) happen in the
+    # background score sink (one bulk transaction per batch); the caller does not wait.
     try:
-        df_row_features = create_raw_features(df_row.copy())
+        get_score_sink().submit(lead_data_input.crm_source, lead_data_input.crm_lead_id, likelihood_score)
     except Exception as e:
-        print(f"Error during raw feature creation: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal error during feature engineering: {e}")
+        print(f"Error queueing score for persistence/writeback: {e}")
+    if shadow_scorer is not None:
+        shadow_scorer.offer(input_data_dict, likelihood_score, model_version)
 
 
-    # Select the columns that the *preprocessor* inside the pipeline expects
-    # This list and order MUST match the columns fed into the preprocessor during training
-    # Ensure all expected columns are present, even if with dummy values (e.g., 0 or 'Unknown')
-    # if they weren't provided in the input. This is crucial for the preprocessor's ColumnTransformer.
-    # A more robust way is to define ALL possible input columns expected by raw_feature_creation
-    # and the preprocessor beforehand and ensure the input or fetching covers them.
+    # --- Return Response ---
+    return PredictionOutput(
+        crm_lead_id=lead_data_input.crm_lead_id,
+        likelihood_score=likelihood_score,
+        explanation=explanation
+    )
 
-    # For this example, let's manually ensure the columns expected by the preprocessor exist
-    expected_input_cols_for_pipeline = NUMERICAL_FEATURES + CATEGORICAL_FEATURES
+# --- Batch Prediction Endpoint ---
+# Sync handler: FastAPI runs it in the threadpool, so scoring a large batch does not block the event loop.
+@app.post("/predict/batch", response_model=BatchPredictionOutput)
+@profile_stage('predict_batch')
+@timed_stage('predict_batch.request')
+def predict_batch(
+    batch_input: BatchPredictInput,
+    db: Session = Depends(get_db)
+):
+    """
+    Scores many leads at once: one feature pass, one predict_proba call and one bulk UPDATE.
+    Invalid items get a per-item error; the rest of the batch is still scored.
+    """
+    if get_model_pipeline() is None:
+        raise HTTPException(status_code=503, detail="ML model is not loaded. Cannot make predictions.")
+
+    results = [BatchPredictionItem() for _ in batch_input.leads]
+    valid_positions, valid_records = [], []
+    for position, item in enumerate(batch_input.leads):
+        results[position].crm_lead_id = str(item.get('crm_lead_id')) if item.get('crm_lead_id') is not None else None
+        results[position].crm_source = item.get('crm_source')
+        try:
+            valid_records.append(LeadPredictInput(**item).dict())
+            valid_positions.append(position)
+        except ValidationError as e:
+            fields = ", ".join(".".join(str(part) for part in err['loc']) for err in e.errors())
+            results[position].error = f"Invalid input fields: {fields}"
+
+    # --- Vectorized scoring of all valid items (one call per routed model) ---
+    scored = []
+    if valid_records:
+        try:
+            scores, versions, explanations = _score_routed(valid_records, explain=batch_input.explain)
+        except Exception as e:
+            print(f"Error during batch prediction: {e}")
+            for position in valid_positions:
+                results[position].error = f"Prediction failed: {e}"
+            scores = None
+        if scores is not None:
+            for position, record, score, model_version, explanation in zip(valid_positions, valid_records, scores,
+                                                                           versions, explanations):
+                results[position].likelihood_score = float(score)
+                results[position].explanation = _contributions(explanation)
+                scored.append((record['crm_source'], record['crm_lead_id'], float(score)))
+                if shadow_scorer is not None:
+                    shadow_scorer.offer(record, score, model_version)
+
+    # --- Bulk write to the Lead table (+ writeback outbox, same transaction) ---
+    if scored:
+        try:
+            lead_ids = persist_scores(db, scored, writebacks=scored if batch_input.writeback else None)
+            for position, (crm_source, crm_lead_id, _) in zip(valid_positions, scored):
+                results[position].persisted = (crm_source, crm_lead_id) in lead_ids
+        except Exception as e:
+            db.rollback()
+            print(f"Error bulk-updating scores: {e}")
+
+    return BatchPredictionOutput(results=results, scored=len(scored), failed=len(results) - len(scored))
+
+# --- Streaming File Scoring ---
+@app.post("/predict/stream")
+async def predict_stream(request: Request, input_format: str = None, output_format: str = None,
+                         chunk_size: int = streaming.STREAM_CHUNK_SIZE):
+    """
+    Scores an NDJSON or CSV request body (format from ?input_format= or Content-Type) chunk by chunk
+    and streams one result per input row back (NDJSON or CSV, ?output_format= or Accept) as each chunk is scored.
+    """
+    loaded_model_pipeline = get_model_pipeline() # One (global) model for the whole stream, even with partitioning on
+    if loaded_model_pipeline is None:
+        raise HTTPException(status_code=503, detail="ML model is not loaded. Cannot make predictions.")
+    input_format = input_format or streaming.detect_format(request.headers.get("content-type"))
+    output_format = output_format or streaming.detect_format(request.headers.get("accept"), input_format)
+    if input_format not in streaming.FORMATS or output_format not in streaming.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formats must be one of {streaming.FORMATS}.")
+    upload = await streaming.spool_upload(request.stream())
+    chunks = streaming.iter_scored(upload, loaded_model_pipeline, input_format, chunk_size=max(1, chunk_size))
+    writer = streaming.ResultWriter(output_format)
+
+    async def body():
+        try:
+            while True: # Each chunk is parsed and scored in the threadpool, off the event loop
+                results = await run_in_threadpool(next, chunks, None)
+                if results is None:
+                    break
+                yield writer.format(results)
+        finally:
+            upload.close()
 
-    # Check for missing columns and add them if necessary (with default values, requires careful design)
-    # A better approach: the input schema/data fetching guarantees necessary fields.
-    # For demonstration, let's assume the input contains all required raw features.
-    # If not, you'd need more complex logic here to fetch missing data (e.g., from DB)
-    # or impute defaults before selecting columns for X_predict.
+    return StreamingResponse(body(), media_type=streaming.MEDIA_TYPES[output_format])
 
+# --- Score-by-ID Endpoints ---
+# Features are assembled server-side from the stored Lead/CRMData/Vehicle rows, so callers only send IDs.
+def _load_lead_records(keys):
+    db = SessionLocal()
     try:
-        # Select the columns needed for the preprocessor, ensuring order matches training
-        X_predict = df_row_features[expected_input_cols_for_pipeline]
-    except KeyError as e:
-        print(f"Missing column(s) required for prediction: {e}")
-        raise HTTPException(status_code=400, detail=f"Missing required input data for feature engineering: {e}")
-    except Exception as e:
-         print(f"Error preparing prediction data: {e}")
-         raise HTTPException(status_code=500, detail=f"Internal error preparing data: {e}")
+        return load_lead_records(db, keys)
+    finally:
+        db.close()
 
 
-    # --- Prediction ---
+@app.get("/score/{crm_source}/{crm_lead_id}", response_model=PredictionOutput)
+@profile_stage('score_lead_by_id')
+@timed_stage('score_by_id.request')
+async def score_lead_by_id(crm_source: str, crm_lead_id: str, explain: bool = False):
+    """Scores a stored lead by its CRM ID (same persistence and writeback as /predict)."""
+    if get_model_pipeline() is None:
+        raise HTTPException(status_code=503, detail="ML model is not loaded. Cannot make predictions.")
+
+    records = await run_in_threadpool(_load_lead_records, [(crm_source, crm_lead_id)])
+    record = records.get((crm_source, crm_lead_id))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Lead {crm_source}/{crm_lead_id} not found.")
+
+    explanation = None
     try:
-        # The pipeline handles both preprocessing and prediction
-        # predict_proba returns probabilities [P(class_0), P(class_1)]
-        prediction_proba = loaded_model_pipeline.predict_proba(X_predict)[:, 1] # Get probability of the positive class (1=WON)
-        likelihood_score = float(prediction_proba[0]) # Extract the single score
+        if explain:
+            scores, _, explanations = await run_in_threadpool(_score_routed, [record], True)
+            likelihood_score, explanation = float(scores[0]), explanations[0]
+        elif batcher is not None:
+            likelihood_score = await batcher.submit(record)
+        else:
+            likelihood_score = float(_score_records(*_model_for(record), [record])[0])
     except Exception as e:
         print(f"Error during model prediction: {e}")
         raise HTTPException(status_code=500, detail=f"Internal error during prediction: {e}")
 
-
-    # --- Post-Prediction Actions (Optional) ---
-    # 1. Write score back to your internal DB (Lead table)
-    # Assuming you can match the lead_data_input to a Lead record in your DB
     try:
-        # Find the Lead record based on crm_lead_id and crm_source
-        # This assumes crm_lead_id is unique within a crm_source and mapped to your Lead table
-        lead_record = db.query(Lead).join(Lead.crm_data).filter(
-             CRMData.crm_lead_id == lead_data_input.crm_lead_id,
-             CRMData.crm_source == lead_data_input.crm_source
-        ).first()
-
-        if lead_record:
-            lead_record.predicted_likelihood = likelihood_score
-            db.commit()
-            db.refresh(lead_record) # Refresh to see updated value
-            print(f"Updated lead {lead_record.id} with score {likelihood_score}")
-        else:
-            print(f"Warning: Lead with crm_lead_id={lead_data_input.crm_lead_id}, crm_source={lead_data_input.crm_source} not found in internal DB for update.")
-            # In a real system, you might want to handle this - perhaps the lead hasn't been ingested yet?
-            # Or the mapping logic needs refinement.
+        get_score_sink().submit(crm_source, crm_lead_id, likelihood_score, lead_id=record['lead_id'])
     except Exception as e:
-        db.rollback() # Rollback DB session on error
-        print(f"Error updating internal database with score: {e}")
-        # Decide if this error should prevent the API response or just log
+        print(f"Error queueing score for persistence/writeback: {e}")
+    return PredictionOutput(crm_lead_id=crm_lead_id, likelihood_score=likelihood_score, explanation=explanation)
 
 
-    # 2. Write score back to the originating CRM
-    try:
-        writeback_score_to_crm(
-            crm_source=lead_data_input.crm_source,
-            crm_lead_id=lead_data_input.crm_lead_id,
-            score=likelihood_score
-        )
-    except Exception as e:
-        print(f"Error writing score back to CRM {lead_data_input.crm_source}: {e}")
-        # Decide if this error should prevent the API response or just log
+@app.post("/score", response_model=BatchPredictionOutput)
+@profile_stage('score_leads_by_id')
+@timed_stage('score_by_ids.request')
+def score_leads_by_id(score_input: ScoreByIdInput):
+    """Scores many stored leads by CRM ID: one joined lead query, cached vehicles, one predict_proba call per model."""
+    if get_model_pipeline() is None:
+        raise HTTPException(status_code=503, detail="ML model is not loaded. Cannot make predictions.")
 
+    keys = [(lead.crm_source, lead.crm_lead_id) for lead in score_input.leads]
+    records = _load_lead_records(keys)
+    results = [BatchPredictionItem(crm_source=source, crm_lead_id=lead_id) for source, lead_id in keys]
+    found = [position for position, key in enumerate(keys) if key in records]
+    for position, key in enumerate(keys):
+        if key not in records:
+            results[position].error = "Lead not found"
 
-    # --- Return Response ---
-    return PredictionOutput(
-        crm_lead_id=lead_data_input.crm_lead_id,
-        likelihood_score=likelihood_score
-    )
+    scored = 0
+    if found:
+        try:
+            scores, _, explanations = _score_routed([records[keys[position]] for position in found], explain=score_input.explain)
+        except Exception as e:
+            print(f"Error during score-by-ID prediction: {e}")
+            for position in found:
+                results[position].error = f"Prediction failed: {e}"
+            scores, explanations = [], []
+        sink = get_score_sink()
+        for position, score, explanation in zip(found, scores, explanations):
+            record = records[keys[position]]
+            results[position].likelihood_score = float(score)
+            results[position].explanation = _contributions(explanation)
+            results[position].persisted = True # Lead exists; the sink writes the score in the background
+            sink.submit(record['crm_source'], record['crm_lead_id'], float(score), lead_id=record['lead_id'])
+            scored += 1
+
+    return BatchPredictionOutput(results=results, scored=scored, failed=len(results) - scored)
+
+# --- Feature Drift ---
+@app.get("/drift")
+async def drift_report():
+    """PSI (and binned KS for numeric features) of live model inputs vs. the training reference, overall and per crm_source."""
+    return drift_monitor.report()
+
+# --- Stage Latency Metrics ---
+@app.get("/metrics")
+async def metrics():
+    """Stage latency histograms in the Prometheus text format (per worker process)."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- Micro-batching stats ---
+@app.get("/predict/batcher")
+async def batcher_stats():
+    """p50/p99 /predict latency and rows-per-batch histogram for tuning the batching window."""
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
 
 # --- Health Check Endpoint (Optional but Recommended) ---
 @app.get("/health")
 async def health_check():
     """Basic health check endpoint."""
     status = "ok"
+    loaded_model_pipeline = get_model_pipeline()
     model_status = "loaded" if loaded_model_pipeline is not None else "not loaded"
     db_status = "ok"
+    db = None
+    writeback_outbox = None
     try:
         db = next(get_db())
-        db.execute("SELECT 1") # Simple query to check DB connection
+        db.execute(text("SELECT 1")) # Simple query to check DB connection
+        writeback_outbox = outbox_stats(db)
     except Exception:
         db_status = "error"
         status = "degraded" # Or "error" if DB is critical
+    finally:
+        if db is not None:
+            db.close()
 
     if loaded_model_pipeline is None:
          status = "degraded" if status == "ok" else status # Stay 'error' if DB also failed
 
-    return {"status": status, "model": model_status, "database": db_status}
+    return {"status": status, "model": model_status, "model_version": get_model_version(), "database": db_status,
+            "score_sink": get_score_sink().stats(), # Queue depth and lag of background persistence
+            "writeback_outbox": writeback_outbox, "writeback_delta": delta_filter_stats(),
+            "writeback_lanes": dispatcher_stats(), # Per-CRM breaker state, in-flight calls, latency
+            "vehicle_cache": vehicle_cache.stats(),
+            "result_cache": result_cache.stats() if result_cache is not None else None,
+            "explainer": explainer.stats(),
+            "shadow": shadow_scorer.stats() if shadow_scorer is not None else None,
+            "model_router": model_router.stats() if model_router is not None else None}
@@ -0,0 +1,152 @@
+import asyncio
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+# In-process request coalescer for single-lead /predict traffic.
+# Concurrent requests are queued for up to `max_wait_ms` (or until `max_batch_size`
+# requests are waiting), scored as one matrix in a worker thread, and each request's
+# future is resolved with its own score. Latency and rows-per-batch are recorded so
+# the window can be tuned against throughput. If scoring the batch fails, its records are
+# scored one by one so only the bad record's request fails. stop() scores whatever is
+# still queued before shutting down, so no caller is left waiting.
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+LATENCY_SAMPLES = 10_000 # Recent request latencies kept for percentiles
+
+
+class MicroBatcher:
+    def __init__(self, score_batch: Callable[[List[Dict[str, Any]]], np.ndarray],
+                 max_wait_ms: float = 2.0, max_batch_size: int = 64, max_in_flight: int = 2):
+        """
+        score_batch: called in a worker thread with a list of input dicts; returns one score per dict.
+        max_in_flight: batches scored concurrently while the next batch is being collected.
+        """
+        self.score_batch = score_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="micro-batch")
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._in_flight_limit = max_in_flight
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+        self._collecting = [] # Batch being collected (scored by stop() if the collector is cancelled)
+        self._stopped = False
+
+        # --- Stats ---
+        self.latencies_ms = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.batch_size_counts = collections.Counter()
+        self.batches = 0
+        self.rows = 0
+        self.fallbacks = 0 # Batches re-scored record by record after a batch error
+
+    def start(self):
+        """Starts the collector task on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def stop(self):
+        """Stops collecting, scores what is still queued and waits for in-flight batches."""
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending, self._collecting = self._collecting, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.max_batch_size):
+            await self._in_flight.acquire()
+            await self._dispatch(pending[start:start + self.max_batch_size])
+        for _ in range(self._in_flight_limit): # Every permit back: no batch is still being scored
+            await self._in_flight.acquire()
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, record: Dict[str, Any]) -> float:
+        """Queues one input dict and waits for its score."""
+        if self._stopped:
+            raise RuntimeError("Micro-batcher is stopped.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._collecting = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Drain anything already queued without waiting further
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            await self._in_flight.acquire()
+            self._collecting = []
+            loop.create_task(self._dispatch(batch))
+
+    def _score_each(self, records) -> List[Any]:
+        """Scores records one at a time: a score or the exception per record."""
+        results = []
+        for record in records:
+            try:
+                results.append(float(self.score_batch([record])[0]))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _dispatch(self, batch):
+        try:
+            records = [record for record, _, _ in batch]
+            loop = asyncio.get_running_loop()
+            try:
+                scores = await loop.run_in_executor(self._executor, self.score_batch, records)
+            except Exception as e:
+                if len(records) == 1:
+                    scores = [e]
+                else: # Isolate the failing record(s); the rest of the batch is still scored
+                    self.fallbacks += 1
+                    scores = await loop.run_in_executor(self._executor, self._score_each, records)
+            now = time.perf_counter()
+            for (_, future, enqueued_at), score in zip(batch, scores):
+                if future.done():
+                    continue
+                if isinstance(score, Exception):
+                    future.set_exception(score)
+                else:
+                    future.set_result(float(score))
+                self.latencies_ms.append((now - enqueued_at) * 1000)
+            self.batches += 1
+            self.rows += len(batch)
+            self.batch_size_counts[next((b for b in BATCH_SIZE_BUCKETS if len(batch) <= b), 'inf')] += 1
+        finally:
+            self._in_flight.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """p50/p99 latency and the rows-per-batch histogram (bucket upper bound -> batches)."""
+        latencies = np.fromiter(self.latencies_ms, dtype=np.float64)
+        p50, p99 = (np.percentile(latencies, [50, 99]) if len(latencies) else (None, None))
+        return {
+            'max_wait_ms': self.max_wait * 1000,
+            'max_batch_size': self.max_batch_size,
+            'queue_depth': self._queue.qsize(),
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_rows_per_batch': self.rows / self.batches if self.batches else None,
+            'fallbacks': self.fallbacks,
+            'latency_ms': {'p50': None if p50 is None else float(p50), 'p99': None if p99 is None else float(p99),
+                           'samples': len(latencies)},
+            'rows_per_batch_histogram': {f"le_{b}": self.batch_size_counts.get(b, 0) for b in BATCH_SIZE_BUCKETS + ['inf']},
+        }
@@ -0,0 +1,156 @@
+import collections
+import datetime
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.storage import model_registry
+from src.storage.models import Lead, CRMData, Vehicle, LeadStatus
+from src.prediction.scoring import prepare_features, score_features, bulk_update_scores
+from src.crm_writeback.outbox_worker import enqueue_writebacks
+from src.crm_writeback.writeback_manager import DELTA_THRESHOLD, SCORE_BANDS
+from src.monitoring.profiling import profile_stage
+
+# Offline rescoring of every open lead (`main.py score --open-leads`).
+# Open leads are read in keyset-paginated chunks (id > last id, ORDER BY id, LIMIT n) as plain
+# column tuples, scored in a process pool whose workers each load the model once, and written
+# back with one executemany UPDATE per chunk. Reading/writing stays in this process while the
+# pool scores the next chunks. With writebacks enabled, only scores that changed enough vs. the
+# last CRM-written score (same rule as ScoreDeltaFilter) are added to the outbox.
+
+BULK_SETTINGS = settings.get("prediction", {}).get("bulk_scoring", {})
+CHUNK_SIZE = BULK_SETTINGS.get("chunk_size", 20_000)
+PROCESSES = BULK_SETTINGS.get("processes") or max(1, (multiprocessing.cpu_count() or 2) - 1)
+CLOSED_STATUSES = [LeadStatus.WON, LeadStatus.LOST]
+
+_COLUMNS = ['lead_id', 'crm_source', 'crm_lead_id', 'created_at', 'updated_at', 'initial_message',
+            'crm_written_score', 'vehicle_price', 'vehicle_mileage', 'vehicle_make', 'days_on_lot']
+
+# Model of a pool worker process (set by _init_worker)
+_worker_model = None
+
+
+def open_leads_query(db: Session):
+    """Open leads joined with their CRM keys and vehicle fields, as plain column tuples (see _COLUMNS)."""
+    return db.query(Lead.id, CRMData.crm_source, CRMData.crm_lead_id, Lead.created_at, Lead.updated_at,
+                    Lead.initial_message, Lead.crm_written_score,
+                    Vehicle.price, Vehicle.mileage, Vehicle.make, Vehicle.days_on_lot)\
+        .join(CRMData, Lead.crm_data_fk == CRMData.id)\
+        .join(Vehicle, Lead.vehicle_id == Vehicle.id)\
+        .filter(Lead.current_status.notin_(CLOSED_STATUSES))
+
+
+def to_frame(rows) -> pd.DataFrame:
+    return pd.DataFrame.from_records(rows, columns=_COLUMNS)
+
+
+def iter_open_lead_chunks(db: Session, chunk_size: int = CHUNK_SIZE, after_id: int = 0):
+    """Yields DataFrames of open leads (with vehicle fields) in id order, one keyset page at a time."""
+    last_id = after_id
+    while True:
+        rows = open_leads_query(db).filter(Lead.id > last_id).order_by(Lead.id).limit(chunk_size).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield to_frame(rows)
+
+
+def _load_model(version: Optional[str]):
+    from src.prediction import model_loader
+    if version is None:
+        return model_loader.load_model_pipeline()
+    return model_registry.load_version(version, compiled=model_loader.SERVE_COMPILED, mmap_mode=model_loader.MMAP_MODE)
+
+
+def _init_worker(version: Optional[str]):
+    global _worker_model
+    _worker_model = _load_model(version)
+
+
+def score_chunk(chunk: pd.DataFrame, time_of_prediction: datetime.datetime, model_pipeline=None) -> np.ndarray:
+    """Scores one chunk as of `time_of_prediction` (pool workers use their preloaded model)."""
+    model_pipeline = model_pipeline if model_pipeline is not None else _worker_model
+    if model_pipeline is None:
+        raise RuntimeError("No model available for bulk scoring.")
+    df = chunk.drop(columns=['crm_written_score']).assign(time_of_prediction=time_of_prediction)
+    for col in ('created_at', 'updated_at', 'time_of_prediction'):
+        df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+    return score_features(model_pipeline, prepare_features(df, model_pipeline))
+
+
+def changed_for_crm(scores: np.ndarray, written: np.ndarray, threshold: Optional[float] = DELTA_THRESHOLD,
+                    bands=SCORE_BANDS) -> np.ndarray:
+    """Vectorized ScoreDeltaFilter.should_write: never written, moved by >= threshold, or changed band."""
+    written = np.asarray(written, dtype=float)
+    bands = sorted(bands or [])
+    changed = np.isnan(written) | (np.searchsorted(bands, scores, side='right') !=
+                                   np.searchsorted(bands, np.nan_to_num(written), side='right'))
+    if threshold is not None:
+        changed |= np.abs(scores - np.nan_to_num(written)) >= threshold
+    return changed
+
+
+def write_chunk(db: Session, chunk: pd.DataFrame, scores: np.ndarray, writeback: bool) -> int:
+    """Bulk-updates the chunk's scores (and queues changed writebacks) in one transaction."""
+    bulk_update_scores(db, dict(zip(chunk['lead_id'].tolist(), scores.tolist())))
+    queued = 0
+    if writeback:
+        changed = changed_for_crm(scores, chunk['crm_written_score'].to_numpy(dtype=float))
+        picked = chunk[changed]
+        enqueue_writebacks(db, zip(picked['crm_source'], picked['crm_lead_id'], scores[changed].tolist(),
+                                   picked['lead_id'].tolist()))
+        queued = int(changed.sum())
+    db.commit()
+    return queued
+
+
+@profile_stage('score_open_leads')
+def score_open_leads(db: Session, processes: int = PROCESSES, chunk_size: int = CHUNK_SIZE,
+                     writeback: bool = False, time_of_prediction: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+    """
+    Rescores all open leads with the CURRENT model and stores predicted_likelihood.
+    processes=0 scores in this process. Returns counts and throughput.
+    """
+    from src.prediction.model_loader import load_current_model
+    time_of_prediction = time_of_prediction or datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+    started = time.perf_counter()
+    stats = {'leads': 0, 'chunks': 0, 'writebacks_queued': 0}
+
+    def write(chunk, scores):
+        stats['writebacks_queued'] += write_chunk(db, chunk, scores, writeback)
+        stats['leads'] += len(chunk)
+        stats['chunks'] += 1
+        if stats['chunks'] % 10 == 0:
+            print(f"Scored {stats['leads']} open leads ({stats['leads'] / (time.perf_counter() - started) * 3600:,.0f}/hour)...")
+
+    if processes <= 0:
+        model_pipeline = load_current_model()
+        if model_pipeline is None:
+            raise RuntimeError("No model available for bulk scoring.")
+        for chunk in iter_open_lead_chunks(db, chunk_size):
+            write(chunk, score_chunk(chunk, time_of_prediction, model_pipeline))
+    else:
+        version = model_registry.get_current_version() # None: workers load the legacy MODEL_PATH
+        context = multiprocessing.get_context('spawn') # Fresh interpreters: no DB connections shared
+        with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker, initargs=(version,)) as pool:
+            in_flight = collections.deque()
+            for chunk in iter_open_lead_chunks(db, chunk_size):
+                in_flight.append((chunk, pool.submit(score_chunk, chunk, time_of_prediction)))
+                if len(in_flight) >= 2 * processes: # Bounded read-ahead keeps memory flat
+                    chunk, future = in_flight.popleft()
+                    write(chunk, future.result())
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                write(chunk, future.result())
+
+    elapsed = time.perf_counter() - started
+    stats.update({'seconds': round(elapsed, 2),
+                  'leads_per_hour': round(stats['leads'] / elapsed * 3600) if elapsed else None})
+    print(f"Bulk scoring finished: {stats}")
+    return stats
@@ -0,0 +1,244 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+from src.config import settings
+
+# Compiles a fitted Pipeline(preprocessor=ColumnTransformer, classifier=XGBClassifier)
+# into plain numpy arrays: scaler means/scales, category->column maps and flattened trees.
+# CompiledModel.predict_proba then scores a batch with a handful of vectorized numpy ops,
+# skipping ColumnTransformer validation, sparse one-hot builds and DMatrix construction.
+
+MODEL_PATH = settings.get("model", {}).get("path")
+COMPILED_MODEL_PATH = settings.get("model", {}).get("compiled_path") or (
+    os.path.splitext(MODEL_PATH)[0] + "_compiled.joblib" if MODEL_PATH else None)
+ROW_BLOCK = 256 # Rows scored per tree-walk block
+
+
+def _compile_preprocessor(preprocessor) -> Dict[str, Any]:
+    """Extracts the numeric scaling and one-hot layout from a fitted ColumnTransformer."""
+    numeric = {'columns': [], 'mean': [], 'scale': [], 'output': []}
+    categorical = []
+    for name, transformer, columns in preprocessor.transformers_:
+        block = preprocessor.output_indices_[name]
+        if block.stop - block.start == 0 or transformer == 'drop':
+            continue
+        columns = list(columns)
+        if isinstance(transformer, StandardScaler):
+            n = len(columns)
+            numeric['columns'] += columns
+            numeric['mean'] += list(transformer.mean_ if transformer.with_mean else np.zeros(n))
+            numeric['scale'] += list(transformer.scale_ if transformer.with_std else np.ones(n))
+            numeric['output'] += list(range(block.start, block.stop))
+        elif isinstance(transformer, OneHotEncoder):
+            if getattr(transformer, 'drop_idx_', None) is not None:
+                raise ValueError("OneHotEncoder with drop= is not supported by the compiler.")
+            offset = block.start
+            for column, categories in zip(columns, transformer.categories_):
+                categorical.append({
+                    'column': column,
+                    'categories': np.asarray(categories, dtype=object),
+                    'index': {value: offset + i for i, value in enumerate(categories)},
+                    'offset': offset,
+                })
+                offset += len(categories)
+        elif transformer == 'passthrough':
+            numeric['columns'] += columns
+            numeric['mean'] += [0.0] * len(columns)
+            numeric['scale'] += [1.0] * len(columns)
+            numeric['output'] += list(range(block.start, block.stop))
+        else:
+            raise ValueError(f"Cannot compile transformer '{name}' of type {type(transformer).__name__}.")
+
+    return {
+        'numeric_columns': numeric['columns'],
+        'numeric_mean': np.asarray(numeric['mean'], dtype=np.float64),
+        'numeric_scale': np.asarray(numeric['scale'], dtype=np.float64),
+        'numeric_output': np.asarray(numeric['output'], dtype=np.int64),
+        'categorical': categorical,
+        'n_outputs': sum(s.stop - s.start for s in preprocessor.output_indices_.values()),
+        # Sparse output means zeros reach XGBoost as *missing* values, not as 0.0
+        'sparse_output': bool(getattr(preprocessor, 'sparse_output_', False)),
+    }
+
+
+def _compile_trees(classifier) -> Dict[str, Any]:
+    """Flattens the XGBoost trees into global node arrays (leaves point to themselves)."""
+    booster = classifier.get_booster()
+    model = json.loads(booster.save_raw('json'))
+    learner = model['learner']
+    if learner['objective']['name'] != 'binary:logistic':
+        raise ValueError(f"Unsupported objective {learner['objective']['name']}.")
+    trees = learner['gradient_booster']['model']['trees']
+
+    # Honour early stopping: predict_proba only uses trees up to best_iteration
+    best_iteration = getattr(classifier, 'best_iteration', None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+
+    feature, threshold, left, right, missing, value, roots = [], [], [], [], [], [], []
+    max_depth, offset = 0, 0
+    for tree in trees:
+        lc = np.asarray(tree['left_children'], dtype=np.int64)
+        rc = np.asarray(tree['right_children'], dtype=np.int64)
+        cond = np.asarray(tree['split_conditions'], dtype=np.float32)
+        leaf = lc == -1
+        own = np.arange(len(lc)) + offset
+        left_g = np.where(leaf, own, lc + offset)
+        right_g = np.where(leaf, own, rc + offset)
+        default_left = np.asarray(tree['default_left'], dtype=bool)
+        feature.append(np.where(leaf, 0, np.asarray(tree['split_indices'], dtype=np.int64)))
+        threshold.append(np.where(leaf, np.inf, cond).astype(np.float32))
+        left.append(left_g)
+        right.append(right_g)
+        missing.append(np.where(default_left, left_g, right_g))
+        value.append(np.where(leaf, cond, 0.0).astype(np.float32))
+        roots.append(offset)
+
+        # Depth of this tree, via parent pointers
+        parents = np.asarray(tree['parents'], dtype=np.int64)
+        depth = np.zeros(len(lc), dtype=np.int64)
+        for node in range(1, len(lc)): # Parents always precede children in XGBoost's layout
+            depth[node] = depth[parents[node]] + 1
+        max_depth = max(max_depth, int(depth.max()) if len(depth) else 0)
+        offset += len(lc)
+
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+    return {
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'missing': np.concatenate(missing).astype(np.int32),
+        'value': np.concatenate(value),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': max_depth,
+        # binary:logistic stores base_score as a probability; trees add to its logit
+        'base_margin': np.float32(np.log(base_score / (1.0 - base_score))),
+    }
+
+
+class CompiledModel:
+    """Numpy-only scorer with the same predict_proba contract as the sklearn pipeline."""
+
+    def __init__(self, artifact: Dict[str, Any]):
+        self.artifact = artifact
+        self.pre = artifact['preprocessor']
+        self.trees = artifact['trees']
+        self.feature_names_in_ = np.asarray(artifact['feature_names_in'], dtype=object)
+        self.feature_defaults_ = artifact.get('feature_defaults', {})
+
+    def transform(self, X) -> np.ndarray:
+        """Builds the float32 model matrix (NaN = missing) from a DataFrame or dict of columns."""
+        pre = self.pre
+        n = len(X[pre['numeric_columns'][0]]) if pre['numeric_columns'] else len(X)
+        fill = np.nan if pre['sparse_output'] else 0.0
+        matrix = np.full((n, pre['n_outputs']), fill, dtype=np.float32)
+
+        if pre['numeric_columns']:
+            numeric = np.column_stack([np.asarray(X[col], dtype=np.float64) for col in pre['numeric_columns']])
+            scaled = ((numeric - pre['numeric_mean']) / pre['numeric_scale']).astype(np.float32)
+            if pre['sparse_output']:
+                scaled[scaled == 0] = np.nan
+            matrix[:, pre['numeric_output']] = scaled
+
+        rows = np.arange(n)
+        for cat in pre['categorical']:
+            index = cat['index']
+            values = np.asarray(X[cat['column']], dtype=object).tolist()
+            columns = np.fromiter((index.get(value, -1) for value in values), dtype=np.int64, count=n)
+            known = columns >= 0 # Unknown categories stay all-zero (handle_unknown='ignore')
+            matrix[rows[known], columns[known]] = 1.0
+        return matrix
+
+    def predict_margin(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Walks all trees for a block of rows at once, one tree level per iteration.
+        Rows are processed in blocks so the (rows x trees) node arrays stay cache-sized.
+        """
+        t = self.trees
+        # children[2 * node + go_right]: one gather per level instead of two
+        children = np.stack([t['left'], t['right']], axis=1).ravel()
+        has_missing = bool(np.isnan(matrix).any())
+        margin = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], ROW_BLOCK):
+            block = matrix[start:start + ROW_BLOCK]
+            node = np.broadcast_to(t['roots'], (len(block), len(t['roots']))).copy()
+            row_index = np.arange(len(block))[:, None]
+            for _ in range(t['max_depth']):
+                x = block[row_index, t['feature'][node]]
+                go_right = ~(x < t['threshold'][node]) # XGBoost goes left when x < split_condition
+                next_node = children[2 * node + go_right]
+                if has_missing:
+                    next_node = np.where(np.isnan(x), t['missing'][node], next_node)
+                node = next_node
+            margin[start:start + ROW_BLOCK] = t['base_margin'] + t['value'][node].sum(axis=1, dtype=np.float32)
+        return margin
+
+    def predict_proba(self, X) -> np.ndarray:
+        margin = self.predict_margin(self.transform(X)).astype(np.float64)
+        proba = 1.0 / (1.0 + np.exp(-margin))
+        return np.column_stack([1.0 - proba, proba])
+
+    def predict(self, X) -> np.ndarray:
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+
+def compile_model_pipeline(model_pipeline) -> CompiledModel:
+    """Compiles a fitted preprocessor + XGBClassifier pipeline into a CompiledModel."""
+    preprocessor = model_pipeline.named_steps['preprocessor']
+    classifier = model_pipeline.named_steps['classifier']
+    artifact = {
+        'feature_names_in': list(getattr(model_pipeline, 'feature_names_in_', [])),
+        'feature_defaults': dict(getattr(model_pipeline, 'feature_defaults_', None) or {}),
+        'preprocessor': _compile_preprocessor(preprocessor),
+        'trees': _compile_trees(classifier),
+    }
+    return CompiledModel(artifact)
+
+
+def save_compiled_model(compiled: CompiledModel, path: str = COMPILED_MODEL_PATH):
+    """Saves the compiled artifact (plain dicts and numpy arrays) with joblib."""
+    joblib.dump(compiled.artifact, path)
+
+
+def load_compiled_model(path: str = COMPILED_MODEL_PATH, mmap_mode: Optional[str] = None) -> CompiledModel:
+    # predict_proba only reads the artifact arrays, so they can be memory-mapped (mmap_mode='r')
+    return CompiledModel(joblib.load(path, mmap_mode=mmap_mode))
+
+
+def benchmark_latency(model_pipeline, compiled: CompiledModel, X: pd.DataFrame, n_single: int = 200) -> dict:
+    """Compares single-row and batch predict_proba latency of the joblib pipeline vs. the compiled kernel."""
+    results = {}
+    for name, model in (('pipeline', model_pipeline), ('compiled', compiled)):
+        rows = [X.iloc[[i % len(X)]] for i in range(n_single)]
+        start = time.perf_counter()
+        for row in rows:
+            model.predict_proba(row)
+        single_ms = (time.perf_counter() - start) / n_single * 1000
+        start = time.perf_counter()
+        model.predict_proba(X)
+        batch_seconds = time.perf_counter() - start
+        results[name] = {'single_row_ms': single_ms, 'batch_rows_per_sec': len(X) / batch_seconds}
+    diff = np.abs(model_pipeline.predict_proba(X)[:, 1] - compiled.predict_proba(X)[:, 1])
+    results['max_abs_diff'] = float(diff.max())
+    return results
+
+
+if __name__ == '__main__':
+    # Latency benchmark against the current joblib pipeline on synthetic leads
+    from src.training.synthetic_data import synthetic_leads_dataframe
+    from src.training.trainer import featurize_training_data
+
+    model_pipeline = joblib.load(MODEL_PATH)
+    compiled = compile_model_pipeline(model_pipeline)
+    _, X, _ = featurize_training_data(synthetic_leads_dataframe(100_000, seed=7))
+    X = X[list(model_pipeline.feature_names_in_)]
+    for name, result in benchmark_latency(model_pipeline, compiled, X).items():
+        print(f"{name}: {result}")
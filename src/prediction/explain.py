@@ -0,0 +1,162 @@
+import collections
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import OneHotEncoder
+
+from src.config import settings
+from src.storage import model_registry
+from src.prediction.scoring import model_feature_columns
+from src.prediction.result_cache import fingerprint_rows, LEAD_AGE_BUCKET_HOURS
+
+# Per-lead score explanations (`explain=true` on the scoring paths).
+# The batch's model matrix is built once and XGBoost's native TreeSHAP (`pred_contribs`) returns
+# one log-odds contribution per matrix column plus the bias; their sum is the margin, so the
+# score is derived from the same call. Matrix columns are summed back onto the model's input
+# features (one-hot columns onto their categorical feature) through the fitted ColumnTransformer;
+# that layout is built once per model version. The top-k features per row are cached per
+# (model version, input fingerprint), like scores in result_cache.py.
+
+EXPLAIN_SETTINGS = settings.get("prediction", {}).get("explain", {})
+TOP_K = EXPLAIN_SETTINGS.get("top_k", 5)
+CACHE_MAX_ENTRIES = EXPLAIN_SETTINGS.get("cache_max_entries", 50_000)
+# Saabas path attributions instead of exact TreeSHAP: about the cost of a prediction instead of ~50x
+APPROXIMATE = EXPLAIN_SETTINGS.get("approximate", False)
+MAX_PIPELINES = 4 # Uncompiled pipelines kept for explaining versions served by the compiled scorer
+
+
+def feature_layout(model_pipeline) -> Tuple[List[str], np.ndarray]:
+    """(input feature names, matrix column -> feature index) for a fitted preprocessor + classifier pipeline."""
+    preprocessor = model_pipeline.named_steps['preprocessor']
+    names = model_feature_columns(model_pipeline)
+    position = {name: i for i, name in enumerate(names)}
+    owner = np.full(sum(s.stop - s.start for s in preprocessor.output_indices_.values()), -1, dtype=np.int64)
+    for name, transformer, columns in preprocessor.transformers_:
+        block = preprocessor.output_indices_[name]
+        if block.stop - block.start == 0 or transformer == 'drop':
+            continue
+        columns = [names[c] if isinstance(c, (int, np.integer)) else c for c in columns] # remainder uses indices
+        if isinstance(transformer, OneHotEncoder):
+            offset = block.start
+            for column, categories in zip(columns, transformer.categories_):
+                owner[offset:offset + len(categories)] = position[column]
+                offset += len(categories)
+        else: # Scalers / passthrough: one output column per input column
+            owner[block.start:block.stop] = [position[column] for column in columns]
+    if (owner < 0).any():
+        raise ValueError("Could not map every model matrix column back to an input feature.")
+    return names, owner
+
+
+def tree_contributions(model_pipeline, X: pd.DataFrame, approximate: bool = APPROXIMATE) -> np.ndarray:
+    """TreeSHAP contributions (n_rows, n_matrix_columns + 1 bias) in log-odds, from the trees predict_proba uses."""
+    classifier = model_pipeline.named_steps['classifier']
+    matrix = model_pipeline.named_steps['preprocessor'].transform(X)
+    best_iteration = getattr(classifier, 'best_iteration', None)
+    iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+    return classifier.get_booster().predict(xgb.DMatrix(matrix, missing=classifier.missing),
+                                            pred_contribs=True, approx_contribs=approximate,
+                                            iteration_range=iteration_range)
+
+
+def _python_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    return None if isinstance(value, float) and np.isnan(value) else value
+
+
+class Explainer:
+    """Scores and explains batches with one pred_contribs call; caches layouts and top-k results per model version."""
+    def __init__(self, top_k: int = TOP_K, max_entries: int = CACHE_MAX_ENTRIES,
+                 lead_age_bucket_hours: float = LEAD_AGE_BUCKET_HOURS, approximate: bool = APPROXIMATE, loader=None):
+        self.top_k = top_k
+        self.approximate = approximate
+        self.max_entries = max_entries
+        self.lead_age_bucket_hours = lead_age_bucket_hours
+        self._loader = loader or (lambda version: model_registry.load_version(version))
+        self._layouts: Dict[Any, tuple] = {} # version -> (pipeline, names, indicator)
+        self._pipelines = collections.OrderedDict() # version -> uncompiled pipeline
+        self._entries = collections.OrderedDict() # (version, row_hash) -> (score, top_k list)
+        self._lock = threading.Lock()
+
+        # --- Stats ---
+        self.hits = 0
+        self.misses = 0
+
+    def _explainable(self, model_pipeline, model_version: Optional[str]):
+        """The sklearn pipeline behind `model_pipeline` (the compiled scorer has no booster to explain)."""
+        if hasattr(model_pipeline, 'named_steps'):
+            return model_pipeline
+        if model_version is None:
+            raise ValueError("Explanations need the XGBoost pipeline; the unversioned compiled model has none.")
+        with self._lock:
+            pipeline = self._pipelines.get(model_version)
+        if pipeline is None:
+            pipeline = self._loader(model_version)
+            with self._lock:
+                self._pipelines[model_version] = pipeline
+                while len(self._pipelines) > MAX_PIPELINES:
+                    self._pipelines.popitem(last=False)
+        return pipeline
+
+    def _layout(self, model_pipeline, model_version: Optional[str]):
+        key = model_version or id(model_pipeline)
+        cached = self._layouts.get(key)
+        if cached is not None and cached[0] is model_pipeline:
+            return cached[1:]
+        names, owner = feature_layout(model_pipeline)
+        indicator = np.zeros((len(owner), len(names)), dtype=np.float32)
+        indicator[np.arange(len(owner)), owner] = 1.0
+        self._layouts[key] = (model_pipeline, names, indicator)
+        return names, indicator
+
+    def explain(self, model_pipeline, X: pd.DataFrame, model_version: Optional[str]) -> Tuple[np.ndarray, List[List[Dict[str, Any]]]]:
+        """(scores, top-k [{'feature', 'value', 'contribution'}] per row, largest |contribution| first)."""
+        version = model_version or f"unversioned-{id(model_pipeline)}"
+        keys = [(version, int(h)) for h in fingerprint_rows(X, self.lead_age_bucket_hours)]
+        scores = np.empty(len(keys), dtype=np.float64)
+        explanations: List[Optional[List[Dict[str, Any]]]] = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._entries.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    scores[i], explanations[i] = cached
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return scores, explanations
+
+        pipeline = self._explainable(model_pipeline, model_version)
+        names, indicator = self._layout(pipeline, model_version)
+        X_missing = X.iloc[missing]
+        contribs = tree_contributions(pipeline, X_missing[names], self.approximate)
+        margin = contribs.sum(axis=1, dtype=np.float64)
+        per_feature = contribs[:, :-1] @ indicator # One-hot columns summed onto their feature
+        top = np.argsort(-np.abs(per_feature), axis=1, kind='stable')[:, :self.top_k]
+        values = X_missing[names].to_numpy(dtype=object)
+        with self._lock:
+            for row, i in enumerate(missing):
+                scores[i] = 1.0 / (1.0 + np.exp(-margin[row]))
+                explanations[i] = [{'feature': names[j], 'value': _python_value(values[row, j]),
+                                    'contribution': float(per_feature[row, j])} for j in top[row]]
+                self._entries[keys[i]] = (float(scores[i]), explanations[i])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return scores, explanations
+
+    def clear(self, *args):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {'entries': len(self._entries), 'max_entries': self.max_entries, 'top_k': self.top_k,
+                'approximate': self.approximate,
+                'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else None}
@@ -0,0 +1,102 @@
+import datetime
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.storage.models import Lead, CRMData, Vehicle
+
+# Server-side feature assembly for score-by-ID.
+# Leads are loaded with one Lead+CRMData joined query; vehicle rows come from a short-TTL
+# in-process cache, with one IN query for the vehicles not cached yet (listings get viewed
+# and rescored over and over, while their price/mileage rarely change within minutes).
+
+VEHICLE_CACHE_TTL_SECONDS = settings.get("prediction", {}).get("vehicle_cache_ttl_seconds", 60)
+VEHICLE_CACHE_MAX_ENTRIES = settings.get("prediction", {}).get("vehicle_cache_max_entries", 50_000)
+
+
+class VehicleCache:
+    """vehicle_id -> feature dict, expiring `ttl_seconds` after load."""
+    def __init__(self, ttl_seconds: float = VEHICLE_CACHE_TTL_SECONDS, max_entries: int = VEHICLE_CACHE_MAX_ENTRIES,
+                 clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = {} # vehicle_id -> (loaded_at, features)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, db: Session, vehicle_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        now = self.clock()
+        found, missing = {}, []
+        with self._lock:
+            for vehicle_id in set(vehicle_ids):
+                entry = self._entries.get(vehicle_id)
+                if entry is not None and now - entry[0] < self.ttl_seconds:
+                    found[vehicle_id] = entry[1]
+                else:
+                    missing.append(vehicle_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            rows = db.query(Vehicle.id, Vehicle.price, Vehicle.mileage, Vehicle.make, Vehicle.days_on_lot)\
+                .filter(Vehicle.id.in_(missing)).all()
+            loaded = {vehicle_id: {'vehicle_price': price, 'vehicle_mileage': mileage, 'vehicle_make': make,
+                                   'days_on_lot': days_on_lot}
+                      for vehicle_id, price, mileage, make, days_on_lot in rows}
+            with self._lock:
+                if len(self._entries) + len(loaded) > self.max_entries:
+                    self._entries = {k: v for k, v in self._entries.items() if now - v[0] < self.ttl_seconds}
+                    if len(self._entries) + len(loaded) > self.max_entries:
+                        self._entries.clear()
+                for vehicle_id, features in loaded.items():
+                    self._entries[vehicle_id] = (now, features)
+            found.update(loaded)
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+vehicle_cache = VehicleCache()
+
+
+def load_lead_records(db: Session, keys: List[Tuple[str, str]], time_of_prediction: Optional[datetime.datetime] = None,
+                      cache: Optional[VehicleCache] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Builds model input dicts (same fields as LeadPredictInput, plus lead_id and initial_message)
+    for (crm_source, crm_lead_id) keys. Unknown leads are left out of the result.
+    """
+    cache = cache or vehicle_cache
+    time_of_prediction = time_of_prediction or datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    rows = db.query(Lead.id, Lead.vehicle_id, Lead.created_at, Lead.updated_at, Lead.initial_message,
+                    CRMData.crm_source, CRMData.crm_lead_id)\
+        .join(CRMData, Lead.crm_data_fk == CRMData.id)\
+        .filter(tuple_(CRMData.crm_source, CRMData.crm_lead_id).in_(keys))\
+        .all()
+    vehicles = cache.get_many(db, [row.vehicle_id for row in rows])
+
+    records = {}
+    for row in rows:
+        vehicle = vehicles.get(row.vehicle_id)
+        if vehicle is None:
+            continue # Lead points at a vehicle that no longer exists
+        records[(row.crm_source, row.crm_lead_id)] = {
+            'lead_id': row.id,
+            'crm_source': row.crm_source,
+            'crm_lead_id': row.crm_lead_id,
+            'vehicle_id': row.vehicle_id,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at,
+            'initial_message': row.initial_message,
+            'time_of_prediction': time_of_prediction,
+            **vehicle,
+        }
+    return records
@@ -1,19 +1,34 @@
 import joblib
 import os
+import threading
+import time
 from src.config import settings
+from src.storage import model_registry
 
 MODEL_PATH = settings.get("model", {}).get("path")
 if MODEL_PATH is None:
      raise ValueError("Model path not specified in settings.yaml")
+# Serve the compiled numpy scorer (same predict_proba contract) instead of the sklearn pipeline
+SERVE_COMPILED = settings.get("model", {}).get("serve_compiled", False)
+# How often the API checks the registry's CURRENT pointer for a new version
+WATCH_INTERVAL_SECONDS = settings.get("model", {}).get("watch_interval_seconds", 10)
+# Memory-map model arrays from the read-only artifacts ('r'), shared across API worker processes
+MMAP_MODE = settings.get("model", {}).get("mmap_mode", "r")
 
 def load_model_pipeline():
-    """Loads the trained model pipeline from the file system."""
+    """Loads the trained model pipeline from the file system (legacy fixed MODEL_PATH)."""
+    if SERVE_COMPILED:
+        from src.prediction.compiled_model import load_compiled_model, COMPILED_MODEL_PATH
+        if os.path.exists(COMPILED_MODEL_PATH):
+            print(f"Loading compiled model from {COMPILED_MODEL_PATH}...")
+            return load_compiled_model(COMPILED_MODEL_PATH, mmap_mode=MMAP_MODE)
+        print(f"Warning: compiled model not found at {COMPILED_MODEL_PATH}. Falling back to the pipeline.")
     if not os.path.exists(MODEL_PATH):
         print(f"Warning: Model file not found at {MODEL_PATH}. Prediction service will not work.")
         return None
     try:
         print(f"Loading model from {MODEL_PATH}...")
-        model_pipeline = joblib.load(MODEL_PATH)
+        model_pipeline = joblib.load(MODEL_PATH, mmap_mode=MMAP_MODE)
         print("Model loaded successfully.")
         return model_pipeline
     except Exception as e:
@@ -23,3 +38,93 @@ def load_model_pipeline():
 # Global variable to hold the loaded model
 # Initialized to None, loaded on application startup
 model_pipeline = None
+# Registry version of `model_pipeline` (None when loaded from the legacy MODEL_PATH)
+model_version = None
+
+_swap_lock = threading.Lock()
+_watcher_thread = None
+_swap_listeners = []
+
+
+def get_model_pipeline():
+    """Returns the live model. Read once per request so a concurrent swap never mixes versions."""
+    return model_pipeline
+
+
+def get_model_version():
+    return model_version
+
+
+def get_model_with_version():
+    """(pipeline, version) read together, so a concurrent swap cannot pair one with the other."""
+    with _swap_lock:
+        return model_pipeline, model_version
+
+
+def on_model_swap(listener):
+    """Registers a callback(new_pipeline, new_version) run after every swap (e.g. to clear caches)."""
+    _swap_listeners.append(listener)
+
+
+def _swap(new_pipeline, new_version):
+    global model_pipeline, model_version
+    with _swap_lock:
+        model_pipeline, model_version = new_pipeline, new_version
+    for listener in _swap_listeners:
+        try:
+            listener(new_pipeline, new_version)
+        except Exception as e:
+            print(f"Error in model swap listener: {e}")
+
+
+def load_current_model():
+    """Loads the registry's CURRENT version, falling back to MODEL_PATH when the registry is empty."""
+    version = model_registry.get_current_version()
+    if version is None:
+        _swap(load_model_pipeline(), None)
+        return model_pipeline
+    try:
+        print(f"Loading model version {version} from registry...")
+        _swap(model_registry.load_version(version, compiled=SERVE_COMPILED, mmap_mode=MMAP_MODE), version)
+        print(f"Model version {version} loaded.")
+    except Exception as e:
+        print(f"Error loading model version {version}: {e}. Falling back to {MODEL_PATH}.")
+        _swap(load_model_pipeline(), None)
+    return model_pipeline
+
+
+def refresh_model() -> bool:
+    """
+    Loads the CURRENT version if it differs from the live one, then swaps it in.
+    Loading happens before the swap, so requests keep using the old model until the new one is ready.
+    """
+    version = model_registry.get_current_version()
+    if version is None or version == model_version:
+        return False
+    try:
+        print(f"New model version {version} detected, loading in background...")
+        new_pipeline = model_registry.load_version(version, compiled=SERVE_COMPILED, mmap_mode=MMAP_MODE)
+    except Exception as e:
+        print(f"Error loading model version {version}: {e}. Keeping version {model_version}.")
+        return False
+    _swap(new_pipeline, version)
+    print(f"Swapped in model version {version}.")
+    return True
+
+
+def _watch(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_model()
+        except Exception as e:
+            print(f"Model watcher error: {e}")
+
+
+def start_model_watcher(interval: float = WATCH_INTERVAL_SECONDS):
+    """Starts the daemon thread that polls the CURRENT pointer (once per process)."""
+    global _watcher_thread
+    if _watcher_thread is not None or not interval:
+        return
+    _watcher_thread = threading.Thread(target=_watch, args=(interval,), name="model-watcher", daemon=True)
+    _watcher_thread.start()
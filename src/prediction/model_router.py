@@ -0,0 +1,159 @@
+import collections
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.storage import model_registry
+from src.prediction import model_loader
+
+# Routing of requests to partitioned (per-segment) models.
+# The registry maps segments (values of `partition_by`, e.g. a crm_source) to versions through
+# CURRENT@<segment> pointers; the mapping is re-read every `refresh_interval_seconds`. Segment
+# models are loaded lazily on first use into an LRU cache bounded by a memory budget (artifact
+# size on disk as the estimate), so each API worker only holds the models its traffic needs.
+# Segments without a model, or whose model fails to load, are scored by the global model.
+
+PARTITION_SETTINGS = settings.get("model", {}).get("partitioning", {})
+PARTITIONING_ENABLED = PARTITION_SETTINGS.get("enabled", False)
+PARTITION_BY = PARTITION_SETTINGS.get("partition_by", "crm_source")
+CACHE_MAX_MB = PARTITION_SETTINGS.get("cache_max_mb", 512)
+REFRESH_INTERVAL_SECONDS = PARTITION_SETTINGS.get("refresh_interval_seconds", model_loader.WATCH_INTERVAL_SECONDS)
+
+
+def _load_version(version: str):
+    return model_registry.load_version(version, compiled=model_loader.SERVE_COMPILED, mmap_mode=model_loader.MMAP_MODE)
+
+
+def _version_bytes(version: str) -> int:
+    return model_registry.artifact_bytes(version, compiled=model_loader.SERVE_COMPILED)
+
+
+class ModelCache:
+    """
+    LRU cache of loaded model versions with a memory budget. A version is loaded on first get()
+    (concurrent gets of the same version wait for one load); least recently used versions are
+    evicted until the total fits. A single model larger than the budget is still served (alone).
+    """
+    def __init__(self, max_bytes: int, loader: Callable[[str], Any] = _load_version,
+                 sizer: Callable[[str], int] = _version_bytes):
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._sizer = sizer
+        self._models: "collections.OrderedDict[str, Tuple[Any, int]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+        # --- Stats ---
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version: str):
+        with self._lock:
+            entry = self._models.get(version)
+            if entry is not None:
+                self._models.move_to_end(version)
+                self.hits += 1
+                return entry[0]
+            load_lock = self._load_locks.setdefault(version, threading.Lock())
+        with load_lock: # Loads of different versions run in parallel, outside the cache lock
+            with self._lock:
+                entry = self._models.get(version)
+                if entry is not None: # Loaded by a concurrent get
+                    self._models.move_to_end(version)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+            model = self._loader(version)
+            size = self._sizer(version)
+            with self._lock:
+                self._models[version] = (model, size)
+                self._load_locks.pop(version, None)
+                self._evict(keep=version)
+        return model
+
+    def _evict(self, keep: str):
+        total = sum(size for _, size in self._models.values())
+        for version in list(self._models):
+            if total <= self.max_bytes:
+                break
+            if version == keep:
+                continue
+            total -= self._models.pop(version)[1]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'models': len(self._models), 'bytes': sum(size for _, size in self._models.values()),
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class ModelRouter:
+    """Picks the model for a record: its segment's CURRENT version when one exists, else the global model."""
+    def __init__(self, cache: ModelCache, partition_by: str = PARTITION_BY,
+                 refresh_interval: float = REFRESH_INTERVAL_SECONDS,
+                 segment_versions: Callable[[], Dict[str, str]] = model_registry.segment_versions,
+                 global_model: Callable[[], tuple] = model_loader.get_model_with_version):
+        self.cache = cache
+        self.partition_by = partition_by
+        self.refresh_interval = refresh_interval
+        self._segment_versions = segment_versions
+        self._global_model = global_model
+        self._segments: Dict[str, str] = {}
+        self._failed = set() # Versions that failed to load; retried after the next refresh
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+                return
+            try:
+                self._segments = self._segment_versions()
+                self._failed = set()
+            except Exception as e:
+                print(f"Error reading segment model pointers: {e}")
+            self._refreshed_at = now
+
+    def route(self, record: Dict[str, Any]) -> tuple:
+        """(pipeline, version) for one record."""
+        self._refresh()
+        segment = record.get(self.partition_by)
+        version = self._segments.get(str(segment)) if segment is not None else None
+        if version is not None and version not in self._failed:
+            try:
+                return self.cache.get(version), version
+            except Exception as e:
+                print(f"Error loading model version {version} for {self.partition_by}={segment}: {e}. Using the global model.")
+                self._failed.add(version)
+        self.fallbacks += 1
+        return self._global_model()
+
+    def group(self, records: List[Dict[str, Any]]) -> List[Tuple[Any, Optional[str], List[int]]]:
+        """Splits records by routed model: [(pipeline, version, positions)], one entry per distinct model."""
+        groups: Dict[Any, Tuple[Any, Optional[str], List[int]]] = {}
+        for position, record in enumerate(records):
+            model_pipeline, version = self.route(record)
+            key = version if version is not None else id(model_pipeline)
+            groups.setdefault(key, (model_pipeline, version, []))[2].append(position)
+        return list(groups.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {'partition_by': self.partition_by, 'segments': len(self._segments), 'fallbacks': self.fallbacks,
+                'failed_versions': sorted(self._failed), 'cache': self.cache.stats()}
+
+
+_router = None
+
+
+def get_model_router() -> Optional[ModelRouter]:
+    """The process-wide router, created on first use; None when partitioning is disabled."""
+    global _router
+    if PARTITIONING_ENABLED and _router is None:
+        _router = ModelRouter(ModelCache(int(CACHE_MAX_MB * 1024 * 1024)))
+    return _router
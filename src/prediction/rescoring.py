@@ -0,0 +1,92 @@
+import datetime
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.storage.database import SessionLocal
+from src.storage.models import Lead, LeadChangeEvent
+from src.prediction.bulk_scoring import open_leads_query, to_frame, score_chunk, write_chunk
+
+# Change-driven rescoring.
+# Ingestion adds a LeadChangeEvent per created/changed lead in the same transaction as the
+# change (emit_lead_changes). The consumer picks leads whose newest event is at least
+# `debounce_seconds` old (a burst of updates to one lead is scored once, after it settles),
+# scores them in one batch with the bulk scoring helpers, and deletes the events it covered in
+# the transaction that stores the scores. Closed leads are dropped without scoring.
+
+RESCORING_SETTINGS = settings.get("prediction", {}).get("rescoring", {})
+DEBOUNCE_SECONDS = RESCORING_SETTINGS.get("debounce_seconds", 5.0)
+BATCH_SIZE = RESCORING_SETTINGS.get("batch_size", 2000)
+POLL_INTERVAL_SECONDS = RESCORING_SETTINGS.get("poll_interval_seconds", 1.0)
+WRITEBACK = RESCORING_SETTINGS.get("writeback", True)
+
+
+def emit_lead_changes(db: Session, changes: Iterable[Tuple[int, str]]):
+    """Adds (lead_id, reason) change events (no commit: they are committed with the lead change)."""
+    now = datetime.datetime.utcnow()
+    rows = [{'lead_id': lead_id, 'reason': reason, 'created_at': now} for lead_id, reason in changes]
+    if rows:
+        db.bulk_insert_mappings(LeadChangeEvent, rows)
+
+
+def claim_changed_leads(db: Session, batch_size: int = BATCH_SIZE, debounce_seconds: float = DEBOUNCE_SECONDS,
+                        now: Optional[datetime.datetime] = None) -> Dict[int, int]:
+    """Leads quiet for `debounce_seconds`, oldest first: lead_id -> newest event id covered."""
+    cutoff = (now or datetime.datetime.utcnow()) - datetime.timedelta(seconds=debounce_seconds)
+    rows = db.query(LeadChangeEvent.lead_id, func.max(LeadChangeEvent.id))\
+        .group_by(LeadChangeEvent.lead_id)\
+        .having(func.max(LeadChangeEvent.created_at) <= cutoff)\
+        .order_by(func.min(LeadChangeEvent.id))\
+        .limit(batch_size)\
+        .all()
+    return dict(rows)
+
+
+def rescore_changed(db: Session, model_pipeline, claimed: Dict[int, int], writeback: bool = WRITEBACK,
+                    time_of_prediction: Optional[datetime.datetime] = None) -> int:
+    """Scores the claimed open leads, stores the scores and deletes the covered events in one transaction."""
+    time_of_prediction = time_of_prediction or datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+    chunk = to_frame(open_leads_query(db).filter(Lead.id.in_(list(claimed))).all())
+    # Events added after the claim (higher ids) stay for the next round
+    db.query(LeadChangeEvent)\
+        .filter(LeadChangeEvent.lead_id.in_(list(claimed)), LeadChangeEvent.id <= max(claimed.values()))\
+        .delete(synchronize_session=False)
+    if chunk.empty:
+        db.commit()
+        return 0
+    write_chunk(db, chunk, score_chunk(chunk, time_of_prediction, model_pipeline), writeback) # Commits
+    return len(chunk)
+
+
+def run_rescoring_consumer(stop_event: Optional[threading.Event] = None, batch_size: int = BATCH_SIZE,
+                           debounce_seconds: float = DEBOUNCE_SECONDS, poll_interval: float = POLL_INTERVAL_SECONDS):
+    """`rescore_consumer`: scores changed leads with the live model (hot-swapped like the API) until stopped."""
+    from src.prediction.model_loader import load_current_model, start_model_watcher, get_model_pipeline
+    load_current_model()
+    start_model_watcher()
+    stop_event = stop_event or threading.Event()
+    print(f"Rescoring consumer started (debounce {debounce_seconds}s, batch {batch_size}).")
+    try:
+        while not stop_event.is_set():
+            model_pipeline = get_model_pipeline()
+            db = SessionLocal()
+            claimed = {}
+            try:
+                claimed = claim_changed_leads(db, batch_size, debounce_seconds) if model_pipeline is not None else {}
+                if claimed:
+                    started = time.perf_counter()
+                    scored = rescore_changed(db, model_pipeline, claimed)
+                    print(f"Rescored {scored} of {len(claimed)} changed leads in {time.perf_counter() - started:.2f}s.")
+            except Exception as e:
+                db.rollback()
+                print(f"Rescoring consumer error: {e}")
+            finally:
+                db.close()
+            if len(claimed) < batch_size: # Full batch: more changes are likely waiting
+                stop_event.wait(poll_interval)
+    except KeyboardInterrupt:
+        print("Rescoring consumer stopped.")
@@ -0,0 +1,86 @@
+import collections
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import settings
+from src.prediction.scoring import score_features
+
+# Score cache keyed by a fingerprint of (model version, model input features).
+# CRM polling rescores the same leads with unchanged inputs; only lead_age_hours moves, so
+# it is quantized to `lead_age_bucket_hours` for the key (the score itself is computed from
+# the exact features on a miss). Rows are fingerprinted with one vectorized 64-bit hash per
+# row; entries are evicted LRU under an approximate memory cap.
+
+CACHE_SETTINGS = settings.get("prediction", {}).get("result_cache", {})
+RESULT_CACHE_ENABLED = CACHE_SETTINGS.get("enabled", True)
+MAX_MB = CACHE_SETTINGS.get("max_mb", 64)
+LEAD_AGE_BUCKET_HOURS = CACHE_SETTINGS.get("lead_age_bucket_hours", 1.0)
+ENTRY_BYTES = 256 # Approximate footprint of one entry (key tuple, float, LRU bookkeeping)
+
+
+def fingerprint_rows(X: pd.DataFrame, lead_age_bucket_hours: Optional[float] = LEAD_AGE_BUCKET_HOURS) -> np.ndarray:
+    """One uint64 per row over the model inputs, with lead_age_hours bucketed."""
+    if 'lead_age_hours' in X.columns and lead_age_bucket_hours:
+        X = X.assign(lead_age_hours=np.floor(X['lead_age_hours'].to_numpy(dtype=float) / lead_age_bucket_hours))
+    return pd.util.hash_pandas_object(X, index=False).to_numpy()
+
+
+class ResultCache:
+    def __init__(self, max_mb: float = MAX_MB, lead_age_bucket_hours: float = LEAD_AGE_BUCKET_HOURS):
+        self.max_entries = max(1, int(max_mb * 1024 * 1024 // ENTRY_BYTES))
+        self.lead_age_bucket_hours = lead_age_bucket_hours
+        self._entries = collections.OrderedDict() # (model_version, row_hash) -> score
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def fingerprints(self, X: pd.DataFrame) -> np.ndarray:
+        return fingerprint_rows(X, self.lead_age_bucket_hours)
+
+    def score(self, model_pipeline, X: pd.DataFrame, model_version: Optional[str]) -> np.ndarray:
+        """Like score_features, but only rows not seen for this model version reach the model."""
+        version = model_version or f"unversioned-{id(model_pipeline)}"
+        keys = [(version, int(h)) for h in self.fingerprints(X)]
+        scores = np.empty(len(keys), dtype=np.float64)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._entries.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    scores[i] = cached
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            scores[missing] = score_features(model_pipeline, X.iloc[missing])
+            with self._lock:
+                for i in missing:
+                    self._entries[keys[i]] = float(scores[i])
+                overflow = len(self._entries) - self.max_entries
+                for _ in range(max(0, overflow)):
+                    self._entries.popitem(last=False)
+                self.evictions += max(0, overflow)
+        return scores
+
+    def clear(self, *args):
+        """Drops all entries (registered as a model-swap listener; old versions can never hit again)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'approx_mb': round(len(self._entries) * ENTRY_BYTES / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else None,
+            'evictions': self.evictions,
+        }
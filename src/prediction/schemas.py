@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
 import datetime
 
 # Schema for the input data to the prediction API
@@ -9,7 +9,7 @@ class LeadPredictInput(BaseModel):
     crm_source: str
     created_at: datetime.datetime # Use datetime object
     # updated_at: Optional[datetime.datetime] = None # Include if available/needed for features
-    # initial_message: Optional[str] = None # Include if message length/sentiment is a feature
+    initial_message: Optional[str] = None # Buyer's first message; without it, its length is imputed (training median)
 
     vehicle_id: int # Need vehicle details
     # Alternatively, pass vehicle details directly if fetching from DB is slow or not desired
@@ -22,11 +22,54 @@ class LeadPredictInput(BaseModel):
 
     # Optional: Include a timestamp for when the prediction request is made
     # This is useful for calculating dynamic features like lead age correctly
-    time_of_prediction: datetime.datetime = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+    # (default_factory: evaluated per request, not once at import time)
+    time_of_prediction: datetime.datetime = Field(default_factory=lambda: datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc))
+
+
+# One input feature's share of a score (explain=true), largest |contribution| first
+class FeatureContribution(BaseModel):
+    feature: str
+    value: Optional[Any] = None # Model input value of the feature
+    contribution: float # Log-odds; the contributions plus a base value sum to the score's logit
 
 
 # Schema for the prediction output
 class PredictionOutput(BaseModel):
     crm_lead_id: str
     likelihood_score: float # Probability between 0 and 1
-    # Optionally add confidence intervals, feature contributions, etc.
+    explanation: Optional[List[FeatureContribution]] = None # Top features, with explain=true
+
+
+# Schemas for batch scoring
+class BatchPredictInput(BaseModel):
+    # Each item has the LeadPredictInput fields. Items are validated one by one so a bad
+    # item is reported in its result instead of failing the whole batch.
+    leads: List[Dict[str, Any]]
+    writeback: bool = False # Also push scores to the originating CRMs
+    explain: bool = False # Add per-lead top feature contributions
+
+
+class BatchPredictionItem(BaseModel):
+    crm_lead_id: Optional[str] = None
+    crm_source: Optional[str] = None
+    likelihood_score: Optional[float] = None
+    persisted: bool = False # Score written to Lead.predicted_likelihood
+    error: Optional[str] = None
+    explanation: Optional[List[FeatureContribution]] = None
+
+
+class BatchPredictionOutput(BaseModel):
+    results: List[BatchPredictionItem] # Same order as the input leads
+    scored: int
+    failed: int
+
+
+# Schemas for score-by-ID (features are assembled server-side from stored Lead/Vehicle data)
+class LeadKey(BaseModel):
+    crm_source: str
+    crm_lead_id: str
+
+
+class ScoreByIdInput(BaseModel):
+    leads: List[LeadKey]
+    explain: bool = False
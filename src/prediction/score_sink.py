@@ -0,0 +1,172 @@
+import collections
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.config import settings
+from src.storage.database import SessionLocal
+from src.prediction.scoring import persist_scores
+
+# Background pipeline for post-prediction work.
+# /predict enqueues (crm_source, crm_lead_id, score) and returns right away. A single worker
+# thread drains the queue in batches: each batch is one transaction holding a bulk UPDATE of
+# the scores and the CRM writeback outbox rows, which the outbox workers then send.
+# A batch whose transaction fails is retried with exponential backoff (the queue is bounded, so
+# it cannot grow without limit meanwhile); scores that still cannot be written, or that arrive
+# while the queue is full, are dropped with their lead IDs logged.
+
+SINK_SETTINGS = settings.get("prediction", {}).get("score_sink", {})
+MAX_BATCH_SIZE = SINK_SETTINGS.get("max_batch_size", 500)
+FLUSH_INTERVAL_MS = SINK_SETTINGS.get("flush_interval_ms", 50) # Max time an item waits for more to batch with
+MAX_QUEUE_SIZE = SINK_SETTINGS.get("max_queue_size", 100_000)
+MAX_RETRIES = SINK_SETTINGS.get("max_retries", 5) # Retries of a failed batch before it is dropped
+RETRY_BACKOFF_MS = SINK_SETTINGS.get("retry_backoff_ms", 200) # Doubles per retry
+MAX_BACKOFF_SECONDS = 30.0
+
+ScoreItem = collections.namedtuple('ScoreItem', ['crm_source', 'crm_lead_id', 'score', 'persist', 'writeback', 'enqueued_at', 'lead_id'])
+
+
+class ScoreSink:
+    def __init__(self, session_factory=SessionLocal, max_batch_size: int = MAX_BATCH_SIZE,
+                 flush_interval_ms: float = FLUSH_INTERVAL_MS, max_queue_size: int = MAX_QUEUE_SIZE,
+                 max_retries: int = MAX_RETRIES, retry_backoff_ms: float = RETRY_BACKOFF_MS):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._stopping = threading.Event()
+
+        # --- Stats ---
+        self.persisted = 0
+        self.not_found = 0
+        self.writebacks_queued = 0 # Outbox rows written (sent later by the outbox workers)
+        self.errors = 0 # Failed batch transactions (each retried)
+        self.retries = 0
+        self.dropped = 0 # Scores never persisted: queue full or retries exhausted
+        self.last_batch_size = 0
+        self.last_lag_seconds = None # Enqueue -> applied for the oldest item of the last batch
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="score-sink", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Drains what is queued, then stops the worker."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, crm_source: str, crm_lead_id: str, score: float, persist: bool = True, writeback: bool = True,
+               lead_id: Optional[int] = None):
+        """Non-blocking: queues one score for persistence and/or CRM writeback (`lead_id` if already known)."""
+        item = ScoreItem(crm_source, crm_lead_id, float(score), persist, writeback, time.monotonic(), lead_id)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._drop([item], "score queue full")
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write_with_retry(batch)
+
+    def _write_with_retry(self, batch):
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            if self.process_batch(batch):
+                return
+            if attempt < self.max_retries:
+                self.retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF_SECONDS)
+        self._drop(batch, f"persistence failed {self.max_retries + 1} times")
+
+    def _drop(self, items, reason: str):
+        self.dropped += len(items)
+        print(f"Error: dropped {len(items)} score(s) ({reason}): "
+              f"{', '.join(f'{item.crm_source}/{item.crm_lead_id}' for item in items)}")
+
+    def process_batch(self, batch) -> bool:
+        """One transaction per batch: bulk score UPDATE plus the writeback outbox rows. False if it failed."""
+        # The latest score wins when a lead is scored more than once in a batch
+        to_persist = {(item.crm_source, item.crm_lead_id): item.score for item in batch if item.persist}
+        to_writeback = {(item.crm_source, item.crm_lead_id): item.score for item in batch if item.writeback}
+        db = self.session_factory()
+        try:
+            known_lead_ids = {(item.crm_source, item.crm_lead_id): item.lead_id for item in batch if item.lead_id is not None}
+            lead_ids = persist_scores(db, [(source, lead_id, score) for (source, lead_id), score in to_persist.items()],
+                                      writebacks=[(source, lead_id, score) for (source, lead_id), score in to_writeback.items()],
+                                      known_lead_ids=known_lead_ids)
+            persisted = sum(1 for key in to_persist if key in lead_ids)
+            self.persisted += persisted
+            self.not_found += len(to_persist) - persisted
+            self.writebacks_queued += len(to_writeback)
+            if persisted < len(to_persist):
+                print(f"Warning: {len(to_persist) - persisted} scored lead(s) not found in internal DB for update.")
+        except Exception as e:
+            db.rollback()
+            self.errors += 1
+            print(f"Error persisting a batch of {len(batch)} scores: {e}")
+            return False
+        finally:
+            db.close()
+
+        self.last_batch_size = len(batch)
+        self.last_lag_seconds = time.monotonic() - min(item.enqueued_at for item in batch)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and lag for /health."""
+        with self._queue.mutex:
+            oldest = self._queue.queue[0].enqueued_at if self._queue.queue else None
+            depth = len(self._queue.queue)
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'queue_depth': depth,
+            'oldest_pending_seconds': None if oldest is None else time.monotonic() - oldest,
+            'last_batch_size': self.last_batch_size,
+            'last_lag_seconds': self.last_lag_seconds,
+            'persisted': self.persisted,
+            'not_found': self.not_found,
+            'writebacks_queued': self.writebacks_queued,
+            'errors': self.errors,
+            'retries': self.retries,
+            'dropped': self.dropped,
+        }
+
+
+# Process-wide sink used by the API
+score_sink: Optional[ScoreSink] = None
+
+
+def get_score_sink() -> ScoreSink:
+    """Returns the process-wide sink, starting it on first use."""
+    global score_sink
+    if score_sink is None:
+        score_sink = ScoreSink()
+        score_sink.start()
+    return score_sink
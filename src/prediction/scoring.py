@@ -0,0 +1,139 @@
+import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import tuple_, update, bindparam
+from sqlalchemy.orm import Session
+
+from src.storage.models import Lead, CRMData
+from src.processing.feature import create_raw_features, NUMERICAL_FEATURES, CATEGORICAL_FEATURES
+from src.crm_writeback.outbox_worker import enqueue_writebacks
+from src.monitoring.metrics import timed, timed_stage
+
+# Shared, vectorized scoring helpers used by the single, batch and bulk scoring paths.
+# A batch of leads becomes one DataFrame, goes through create_raw_features once and
+# is scored with one predict_proba call.
+
+# Values for model inputs the API schema does not carry
+FEATURE_DEFAULTS = {
+    'lead_source_platform': 'Facebook Marketplace', # All API leads come from FBMP today
+}
+# Features derived from an optional raw input. Rows without that input get the training median
+# stored with the model version (feature_defaults_), or NaN (XGBoost's missing value) for models
+# trained before the defaults were stored.
+DERIVED_FEATURE_SOURCES = {
+    'initial_message_length': 'initial_message',
+}
+# prepare_features output attribute: {feature: row positions filled from defaults} (skipped by drift monitoring)
+IMPUTED_ROWS_ATTR = 'imputed_rows'
+
+
+def records_to_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Builds one DataFrame from input dicts, with timestamps normalized to UTC."""
+    df = pd.DataFrame.from_records(records)
+    now = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+    if 'time_of_prediction' not in df.columns:
+        df['time_of_prediction'] = now
+    for col in ('created_at', 'updated_at', 'closed_at', 'time_of_prediction'):
+        if col in df.columns:
+            # Naive timestamps are taken to be UTC (as the API always assumed)
+            df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+    return df
+
+
+def model_feature_columns(model_pipeline) -> List[str]:
+    """Input columns the fitted model expects, in training order."""
+    names = getattr(model_pipeline, 'feature_names_in_', None)
+    if names is not None and len(names):
+        return list(names)
+    return NUMERICAL_FEATURES + CATEGORICAL_FEATURES
+
+
+def training_feature_defaults(X: pd.DataFrame) -> Dict[str, float]:
+    """Training medians of the derived features, used for rows that lack the raw input."""
+    return {col: float(X[col].median()) for col in DERIVED_FEATURE_SOURCES if col in X.columns}
+
+
+def set_feature_defaults(model_pipeline, X_train: pd.DataFrame):
+    """Stores training_feature_defaults on a fitted pipeline (saved with the model version)."""
+    model_pipeline.feature_defaults_ = training_feature_defaults(X_train)
+    return model_pipeline
+
+
+@timed_stage('score.features')
+def prepare_features(df: pd.DataFrame, model_pipeline) -> pd.DataFrame:
+    """Runs raw feature creation once for the batch and selects the model's input columns."""
+    df = create_raw_features(df)
+    defaults = getattr(model_pipeline, 'feature_defaults_', None) or {}
+    imputed = {}
+    for col in model_feature_columns(model_pipeline):
+        if col in DERIVED_FEATURE_SOURCES:
+            source = DERIVED_FEATURE_SOURCES[col]
+            missing = df[source].isna().to_numpy() if source in df.columns else np.ones(len(df), dtype=bool)
+            if missing.any():
+                df[col] = np.nan if col not in df.columns else df[col].astype(np.float64)
+                df.loc[missing, col] = defaults.get(col, np.nan)
+                imputed[col] = np.flatnonzero(missing).tolist()
+        elif col not in df.columns:
+            if col not in FEATURE_DEFAULTS:
+                raise KeyError(col)
+            df[col] = FEATURE_DEFAULTS[col]
+    X = df[model_feature_columns(model_pipeline)]
+    if imputed:
+        X.attrs[IMPUTED_ROWS_ATTR] = imputed
+    return X
+
+
+def score_features(model_pipeline, X: pd.DataFrame) -> np.ndarray:
+    """Positive-class (WON) probability for every row."""
+    with timed('score.predict_proba'):
+        return model_pipeline.predict_proba(X)[:, 1]
+
+
+def score_records(model_pipeline, records: List[Dict[str, Any]]) -> np.ndarray:
+    """Feature creation + scoring for a list of input dicts in one pass."""
+    return score_features(model_pipeline, prepare_features(records_to_frame(records), model_pipeline))
+
+
+def resolve_lead_ids(db: Session, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+    """Maps (crm_source, crm_lead_id) pairs to internal Lead ids with one query."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    rows = db.query(Lead.id, CRMData.crm_source, CRMData.crm_lead_id)\
+        .join(CRMData, Lead.crm_data_fk == CRMData.id)\
+        .filter(tuple_(CRMData.crm_source, CRMData.crm_lead_id).in_(keys))\
+        .all()
+    return {(crm_source, crm_lead_id): lead_id for lead_id, crm_source, crm_lead_id in rows}
+
+
+def bulk_update_scores(db: Session, scores_by_lead_id: Dict[int, float]):
+    """Writes predicted_likelihood for many leads as one executemany UPDATE (no commit)."""
+    if scores_by_lead_id:
+        # Core statement: about half the cost of bulk_update_mappings for large batches
+        leads = Lead.__table__
+        db.execute(update(leads).where(leads.c.id == bindparam('b_id')).values(predicted_likelihood=bindparam('b_score')),
+                   [{'b_id': lead_id, 'b_score': float(score)} for lead_id, score in scores_by_lead_id.items()])
+
+
+@timed_stage('score.db_write')
+def persist_scores(db: Session, scored: List[Tuple[str, str, float]],
+                   writebacks: Optional[List[Tuple[str, str, float]]] = None,
+                   known_lead_ids: Optional[Dict[Tuple[str, str], int]] = None) -> Dict[Tuple[str, str], int]:
+    """
+    Resolves (crm_source, crm_lead_id, score) items to leads and bulk-updates their scores.
+    `writebacks` items are added to the CRM writeback outbox in the same transaction.
+    Keys in `known_lead_ids` (e.g. from score-by-ID) are not looked up again.
+    Returns the resolved key -> lead id map; unknown leads are skipped (but still written back).
+    """
+    writebacks = writebacks or []
+    lead_ids = dict(known_lead_ids or {})
+    lead_ids.update(resolve_lead_ids(db, [(source, lead_id) for source, lead_id, _ in scored + writebacks
+                                          if (source, lead_id) not in lead_ids]))
+    bulk_update_scores(db, {lead_ids[(source, lead_id)]: score for source, lead_id, score in scored
+                            if (source, lead_id) in lead_ids})
+    enqueue_writebacks(db, [(source, lead_id, score, lead_ids.get((source, lead_id)))
+                            for source, lead_id, score in writebacks])
+    db.commit()
+    return lead_ids
@@ -0,0 +1,125 @@
+import datetime
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Dict
+
+from src.config import settings
+
+# Production multi-worker server (pre-fork).
+# The master imports the app and loads the CURRENT model once (arrays memory-mapped from the
+# read-only artifact), freezes the GC so those objects are never touched by collections in the
+# children, binds the listening socket and then forks N workers. Workers share the model pages
+# copy-on-write / via the page cache, so adding a worker costs its own request state only.
+# Each worker warms the model with a dummy prediction before it starts accepting connections.
+# The master forwards SIGTERM/SIGINT to the workers and respawns any that die.
+# Note: a version swapped in later by the model watcher is loaded per worker (until a restart).
+
+SERVER_SETTINGS = settings.get("prediction", {}).get("server", {})
+DEFAULT_HOST = SERVER_SETTINGS.get("host", "0.0.0.0")
+DEFAULT_PORT = SERVER_SETTINGS.get("port", 8000)
+BACKLOG = SERVER_SETTINGS.get("backlog", 2048)
+RESPAWN_DELAY_SECONDS = SERVER_SETTINGS.get("respawn_delay_seconds", 1.0)
+
+WARMUP_RECORD = {
+    'crm_lead_id': 'warmup', 'crm_source': 'warmup', 'vehicle_id': 0,
+    'created_at': datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc),
+    'time_of_prediction': datetime.datetime(2026, 1, 2, tzinfo=datetime.timezone.utc),
+    'vehicle_price': 20000.0, 'vehicle_mileage': 30000.0, 'vehicle_make': 'Toyota', 'days_on_lot': 10,
+}
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def warm_up():
+    """One dummy prediction (bypassing the result cache) so the first real request is not the slow one."""
+    from src.prediction.model_loader import get_model_pipeline
+    from src.prediction.scoring import score_records
+    model_pipeline = get_model_pipeline()
+    if model_pipeline is None:
+        print(f"[worker {os.getpid()}] No model loaded, skipping warm-up.")
+        return
+    started = time.perf_counter()
+    score_records(model_pipeline, [dict(WARMUP_RECORD)])
+    print(f"[worker {os.getpid()}] Warm-up prediction took {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+
+def _run_worker(sock: socket.socket, app):
+    """Child process body: never returns."""
+    import uvicorn
+    from src.storage.database import engine
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gc.enable()
+    engine.dispose(close=False) # Pooled DB connections must not be shared with the master
+    exit_code = 0
+    try:
+        warm_up()
+        config = uvicorn.Config(app, log_level="info", access_log=False, lifespan="on")
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException as e:
+        print(f"[worker {os.getpid()}] Exiting: {e!r}")
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def serve(workers: int, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Preloads the model, forks `workers` uvicorn processes on one shared socket and supervises them."""
+    gc.disable() # No collections while building the long-lived model objects
+    from src.prediction.api import app
+    from src.prediction.model_loader import load_current_model
+    if load_current_model() is None:
+        print("Warning: no model loaded; workers will answer 503 until a version is published.")
+    gc.collect()
+    gc.freeze() # Move everything loaded so far to the permanent generation (keeps shared pages clean)
+
+    sock = bind_socket(host, port)
+    print(f"Serving on {host}:{port} with {workers} worker(s) (master pid {os.getpid()}).")
+    children: Dict[int, int] = {} # pid -> worker slot
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(sock, app)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(workers):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {status}; respawning.")
+        time.sleep(RESPAWN_DELAY_SECONDS)
+        spawn(slot)
+    sock.close()
+    print("All workers stopped.")
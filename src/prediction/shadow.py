@@ -0,0 +1,280 @@
+import csv
+import glob
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import settings
+from src.storage import model_registry
+from src.prediction.scoring import records_to_frame, prepare_features, score_features
+
+# Shadow (challenger) scoring of live traffic.
+# /predict offers a sampled share of its requests (record + champion score) to a bounded queue
+# and returns; a thread batches them and the challenger model version scores each batch and
+# appends the paired scores to a CSV log for offline comparison. By default the challenger is
+# loaded and scored in a low-priority (niced) child process, so its feature building and
+# predict_proba neither hold this process's GIL nor take CPU from the champion. The request path
+# only pays a random() draw and a put_nowait; when the queue is full, samples are dropped
+# (counted) rather than slowing the champion down. Every API worker process writes its own log
+# file (shadow_<version>-<pid>.csv), so workers never interleave rows or headers in one file;
+# summarize_shadow_log reads them all through a glob.
+
+SHADOW_SETTINGS = settings.get("prediction", {}).get("shadow", {})
+SHADOW_ENABLED = SHADOW_SETTINGS.get("enabled", False)
+CHALLENGER_VERSION = SHADOW_SETTINGS.get("challenger_version") # Registry version to shadow
+SAMPLE_RATE = SHADOW_SETTINGS.get("sample_rate", 0.1)
+QUEUE_SIZE = SHADOW_SETTINGS.get("queue_size", 10_000)
+MAX_BATCH_SIZE = SHADOW_SETTINGS.get("max_batch_size", 512)
+FLUSH_INTERVAL_MS = SHADOW_SETTINGS.get("flush_interval_ms", 250)
+LOG_DIR = SHADOW_SETTINGS.get("log_dir") or os.path.join(os.path.dirname(model_registry.REGISTRY_DIR), "shadow")
+IN_PROCESS = SHADOW_SETTINGS.get("in_process", False) # Score in a thread of the API process instead
+PROCESS_NICE = SHADOW_SETTINGS.get("process_nice", 10)
+
+LOG_FIELDS = ['ts', 'crm_source', 'crm_lead_id', 'champion_version', 'champion', 'challenger']
+
+
+def shadow_log_path(challenger_version: str, log_dir: str = LOG_DIR, pid: Optional[int] = None) -> str:
+    """This process's log file for a challenger (one writer per file)."""
+    return os.path.join(log_dir, f"shadow_{challenger_version}-{pid or os.getpid()}.csv")
+
+
+def shadow_log_glob(challenger_version: str, log_dir: str = LOG_DIR) -> str:
+    """Glob matching every process's log file for a challenger."""
+    return os.path.join(log_dir, f"shadow_{glob.escape(challenger_version)}-*.csv")
+
+
+def _load_challenger(challenger_version: str):
+    from src.prediction.model_loader import SERVE_COMPILED, MMAP_MODE
+    return model_registry.load_version(challenger_version, compiled=SERVE_COMPILED, mmap_mode=MMAP_MODE)
+
+
+class ShadowLog:
+    """Scores batches with the challenger and appends the paired scores (header on a new file)."""
+    def __init__(self, challenger, log_path: str):
+        self.challenger = challenger
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        self._file = open(log_path, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(LOG_FIELDS)
+
+    def write_batch(self, batch: List[tuple]) -> int:
+        """One predict_proba call per batch of (ts, record, champion_score, champion_version)."""
+        records = [record for _, record, _, _ in batch]
+        scores = score_features(self.challenger, prepare_features(records_to_frame(records), self.challenger))
+        self._writer.writerows([int(ts * 1000), record.get('crm_source'), record.get('crm_lead_id'), champion_version,
+                                f"{champion:.6f}", f"{challenger:.6f}"]
+                               for (ts, record, champion, champion_version), challenger in zip(batch, scores))
+        self._file.flush()
+        return len(batch)
+
+    def close(self):
+        self._file.close()
+
+
+def _shadow_process(conn, challenger_version: str, log_path: str, nice: int, logged, errors):
+    """Child process: loads the challenger, then scores and logs batches until it receives None."""
+    os.nice(nice)
+    log = ShadowLog(_load_challenger(challenger_version), log_path)
+    try:
+        while True:
+            batch = conn.recv()
+            if batch is None:
+                break
+            try:
+                n = log.write_batch(batch)
+                with logged.get_lock():
+                    logged.value += n
+            except Exception as e:
+                with errors.get_lock():
+                    errors.value += 1
+                print(f"Error scoring a shadow batch of {len(batch)}: {e}")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        log.close()
+
+
+class ShadowScorer:
+    """
+    Samples requests and hands batches to the challenger: scored in a child process when only
+    `challenger_version` is given, or in this process's worker thread when `challenger` is passed.
+    """
+    def __init__(self, challenger_version: str, log_path: str, challenger=None, sample_rate: float = SAMPLE_RATE,
+                 queue_size: int = QUEUE_SIZE, max_batch_size: int = MAX_BATCH_SIZE,
+                 flush_interval_ms: float = FLUSH_INTERVAL_MS, rng: Optional[random.Random] = None):
+        self.challenger_version = challenger_version
+        self.log_path = log_path
+        self.challenger = challenger
+        self.sample_rate = sample_rate
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._random = (rng or random.Random()).random
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._stopping = threading.Event()
+        self._log = None # In-thread ShadowLog
+        self._process = None
+        self._conn = None
+        context = multiprocessing.get_context('spawn')
+        self._logged = context.Value('q', 0) # Shared with the child process
+        self._errors = context.Value('q', 0)
+
+        # --- Stats ---
+        self.sampled = 0
+        self.dropped = 0 # Queue full
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.challenger is not None:
+            self._log = ShadowLog(self.challenger, self.log_path)
+        else:
+            context = multiprocessing.get_context('spawn') # Fresh interpreter: nothing shared but the pipe
+            self._conn, child_conn = context.Pipe()
+            self._process = context.Process(target=_shadow_process, name="shadow-scorer", daemon=True,
+                                            args=(child_conn, self.challenger_version, self.log_path, PROCESS_NICE,
+                                                  self._logged, self._errors))
+            self._process.start()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="shadow-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Scores and logs what is queued, then stops the worker (and child process)."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+        if self._process is not None:
+            try:
+                self._conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout)
+            self._process = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def offer(self, record: Dict[str, Any], champion_score: float, champion_version: Optional[str]):
+        """Request path: samples the record for challenger scoring. Never blocks."""
+        if self._random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((time.time(), record, float(champion_score), champion_version))
+            self.sampled += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _next_batch(self) -> List[tuple]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self.process_batch(batch)
+
+    def process_batch(self, batch: List[tuple]):
+        try:
+            if self._log is not None:
+                n = self._log.write_batch(batch)
+                with self._logged.get_lock():
+                    self._logged.value += n
+            else:
+                self._conn.send(batch) # Pickled here; scored in the child
+        except Exception as e:
+            with self._errors.get_lock():
+                self._errors.value += 1
+            print(f"Error scoring a shadow batch of {len(batch)}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'challenger_version': self.challenger_version,
+            'sample_rate': self.sample_rate,
+            'queue_depth': self._queue.qsize(),
+            'sampled': self.sampled,
+            'dropped': self.dropped,
+            'logged': self._logged.value,
+            'errors': self._errors.value,
+            'in_process': self._log is not None,
+            'log_path': self.log_path,
+        }
+
+
+def load_shadow_scorer(challenger_version: Optional[str] = CHALLENGER_VERSION) -> Optional[ShadowScorer]:
+    """Starts shadow scoring of the configured challenger; None when shadow mode is off or it cannot be loaded."""
+    if not SHADOW_ENABLED or not challenger_version:
+        return None
+    challenger = None
+    try:
+        if IN_PROCESS:
+            challenger = _load_challenger(challenger_version)
+        elif not os.path.isdir(model_registry.version_dir(challenger_version)):
+            raise ValueError("version not found in the registry")
+    except Exception as e:
+        print(f"Error loading challenger model {challenger_version}: {e}. Shadow scoring disabled.")
+        return None
+    scorer = ShadowScorer(challenger_version, shadow_log_path(challenger_version), challenger=challenger)
+    scorer.start()
+    print(f"Shadow scoring challenger {challenger_version} on {SAMPLE_RATE:.0%} of requests.")
+    return scorer
+
+
+def summarize_shadow_log(path: str, top_fraction: float = 0.2) -> Dict[str, Any]:
+    """Champion vs. challenger agreement for a shadow log file or a glob of them (see shadow_log_glob)."""
+    paths = sorted(glob.glob(path))
+    frames = [pd.read_csv(p) for p in paths if os.path.getsize(p)]
+    if not frames:
+        return {'rows': 0, 'files': len(paths)}
+    df = pd.concat(frames, ignore_index=True)
+    if df.empty:
+        return {'rows': 0, 'files': len(paths)}
+    diff = df['challenger'] - df['champion']
+    top = max(1, int(len(df) * top_fraction))
+    champion_top = set(df.nlargest(top, 'champion').index)
+    challenger_top = set(df.nlargest(top, 'challenger').index)
+    return {
+        'rows': len(df),
+        'files': len(paths),
+        'leads': int(df[['crm_source', 'crm_lead_id']].drop_duplicates().shape[0]),
+        'mean_champion': float(df['champion'].mean()),
+        'mean_challenger': float(df['challenger'].mean()),
+        'mean_abs_diff': float(diff.abs().mean()),
+        'p99_abs_diff': float(diff.abs().quantile(0.99)),
+        'pearson': float(np.corrcoef(df['champion'], df['challenger'])[0, 1]) if len(df) > 1 else None,
+        'spearman': float(df['champion'].rank().corr(df['challenger'].rank())) if len(df) > 1 else None,
+        f'top_{int(top_fraction * 100)}pct_overlap': len(champion_top & challenger_top) / top,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Shadow scoring log summary")
+    parser.add_argument("path", nargs="?", help="Shadow log CSV or glob of them (default: every worker's log of --version)")
+    parser.add_argument("--version", default=CHALLENGER_VERSION, help="Challenger version whose logs to summarize")
+    args = parser.parse_args()
+    print(json.dumps(summarize_shadow_log(args.path or shadow_log_glob(args.version)), indent=2))
@@ -0,0 +1,173 @@
+import csv
+import io
+import json
+import tempfile
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+from src.config import settings
+from src.prediction.schemas import LeadPredictInput
+from src.prediction.scoring import records_to_frame, prepare_features, score_features
+from src.monitoring.profiling import profile_stage
+
+# Streaming file scoring for partner exports (POST /predict/stream and `main.py score_file`).
+# Input is NDJSON (one lead object per line) or CSV (header line, then one lead per line) and
+# is parsed line by line; valid rows are scored in fixed-size chunks with the normal feature
+# and model pipeline, and results are written out as soon as each chunk is scored. Only one
+# chunk is held in memory at a time, whatever the file size (uploads to the endpoint are
+# spooled to a temp file first). Scores are not persisted (partner leads are usually not in
+# our DB). CSV fields may not contain embedded newlines.
+
+STREAM_CHUNK_SIZE = settings.get("prediction", {}).get("stream_chunk_size", 5000)
+FORMATS = ("ndjson", "csv")
+RESULT_FIELDS = ['row', 'crm_source', 'crm_lead_id', 'likelihood_score', 'error']
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+SPOOL_MAX_MEMORY_BYTES = 8 * 1024 * 1024 # Uploads larger than this are spooled to disk
+
+
+def detect_format(name_or_content_type: Optional[str], default: str = "ndjson") -> str:
+    """'csv' for .csv paths / text/csv content types, 'ndjson' for json/ndjson ones."""
+    value = (name_or_content_type or "").lower()
+    if "csv" in value:
+        return "csv"
+    if "json" in value:
+        return "ndjson"
+    return default
+
+
+class LineParser:
+    """Turns one input line into a lead dict (raises ValueError on bad lines); None for blank/header lines."""
+    def __init__(self, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}', expected one of {FORMATS}.")
+        self.fmt = fmt
+        self.header = None
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            return None
+        if self.fmt == "ndjson":
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("line is not a JSON object")
+            return record
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.header):
+            raise ValueError(f"expected {len(self.header)} columns, got {len(values)}")
+        return {name: value for name, value in zip(self.header, values) if value != ''}
+
+
+def score_chunk(model_pipeline, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Scores parsed items ({'row', 'record' or 'error'}) and returns one result per item, in order.
+    Invalid rows get an error; the rest of the chunk is scored with one predict_proba call.
+    """
+    results, valid_positions, valid_records = [], [], []
+    for item in items:
+        record = item.get('record') or {}
+        result = {'row': item['row'], 'crm_source': record.get('crm_source'),
+                  'crm_lead_id': str(record['crm_lead_id']) if record.get('crm_lead_id') is not None else None,
+                  'likelihood_score': None, 'error': item.get('error')}
+        if result['error'] is None:
+            try:
+                valid_records.append(LeadPredictInput(**record).dict())
+                valid_positions.append(len(results))
+            except ValidationError as e:
+                result['error'] = "Invalid input fields: " + ", ".join(
+                    ".".join(str(part) for part in err['loc']) for err in e.errors())
+        results.append(result)
+
+    if valid_records:
+        try:
+            scores = score_features(model_pipeline, prepare_features(records_to_frame(valid_records), model_pipeline))
+            for position, score in zip(valid_positions, scores):
+                results[position]['likelihood_score'] = float(score)
+        except Exception as e:
+            print(f"Error scoring stream chunk: {e}")
+            for position in valid_positions:
+                results[position]['error'] = f"Prediction failed: {e}"
+    return results
+
+
+def _parsed(parser: LineParser, row: int, line: str) -> Optional[Dict[str, Any]]:
+    try:
+        record = parser.parse(line)
+    except (ValueError, csv.Error) as e:
+        return {'row': row, 'error': f"Unparseable line: {e}"}
+    return None if record is None else {'row': row, 'record': record}
+
+
+def iter_scored(lines: Iterable[str], model_pipeline, fmt: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yields result lists chunk by chunk (rows are numbered from 1, header excluded)."""
+    parser, items, row = LineParser(fmt), [], 0
+    for line in lines:
+        item = _parsed(parser, row + 1, line)
+        if item is None:
+            continue
+        row += 1
+        items.append(item)
+        if len(items) >= chunk_size:
+            yield score_chunk(model_pipeline, items)
+            items = []
+    if items:
+        yield score_chunk(model_pipeline, items)
+
+
+async def spool_upload(byte_chunks: AsyncIterator[bytes], max_memory_bytes: int = SPOOL_MAX_MEMORY_BYTES) -> io.TextIOBase:
+    """
+    Copies an async byte stream (e.g. a request body) into a temp file that moves to disk past
+    `max_memory_bytes`, and returns it rewound as text. Scoring then streams from the spool: the
+    upload is never held in memory, and reading it is not tied to the response's lifetime.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    async for block in byte_chunks:
+        spool.write(block)
+    spool.seek(0)
+    return io.TextIOWrapper(spool, encoding='utf-8-sig', newline='')
+
+
+class ResultWriter:
+    """Serializes result chunks as NDJSON or CSV text (CSV header before the first chunk)."""
+    def __init__(self, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}', expected one of {FORMATS}.")
+        self.fmt = fmt
+        self._wrote_header = False
+
+    def format(self, results: List[Dict[str, Any]]) -> str:
+        if self.fmt == "ndjson":
+            return "".join(json.dumps(result) + "\n" for result in results)
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS, lineterminator="\n")
+        if not self._wrote_header:
+            writer.writeheader()
+            self._wrote_header = True
+        writer.writerows(results)
+        return out.getvalue()
+
+
+@profile_stage('score_file')
+def score_file(input_path: str, output_path: str, input_format: Optional[str] = None,
+               output_format: Optional[str] = None, chunk_size: int = STREAM_CHUNK_SIZE, model_pipeline=None) -> Dict[str, int]:
+    """Scores a CSV/NDJSON file into `output_path` in constant memory (formats default to the file extensions)."""
+    if model_pipeline is None:
+        from src.prediction.model_loader import load_current_model
+        model_pipeline = load_current_model()
+    if model_pipeline is None:
+        raise RuntimeError("No model available for scoring.")
+    input_format = input_format or detect_format(input_path)
+    writer = ResultWriter(output_format or detect_format(output_path, input_format))
+    counts = {'rows': 0, 'scored': 0, 'failed': 0}
+    with open(input_path, 'r', newline='', encoding='utf-8-sig') as f, open(output_path, 'w', newline='') as out:
+        for results in iter_scored(f, model_pipeline, input_format, chunk_size):
+            out.write(writer.format(results))
+            counts['rows'] += len(results)
+            counts['scored'] += sum(1 for result in results if result['error'] is None)
+    counts['failed'] = counts['rows'] - counts['scored']
+    print(f"Scored {input_path} -> {output_path}: {counts}")
+    return counts
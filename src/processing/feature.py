@@ -64,8 +64,9 @@ def create_raw_features(df: pd.DataFrame) -> pd.DataFrame:
 
     # Feature: Initial message length
     if 'initial_message' in df.columns:
-        df['initial_message_length'] = df['initial_message'].fillna('').apply(len)
-        NUMERICAL_FEATURES.append('initial_message_length') # Add this dynamic feature
+        df['initial_message_length'] = df['initial_message'].fillna('').str.len()
+        if 'initial_message_length' not in NUMERICAL_FEATURES:
+            NUMERICAL_FEATURES.append('initial_message_length') # Add this dynamic feature (once, not per call)
 
 
     # Add more complex features here:
@@ -0,0 +1,224 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import stat
+import uuid
+from typing import Dict, List, Optional
+
+import joblib
+
+from src.config import settings
+
+# File-system model registry.
+# Each published model is an immutable version directory:
+#   <registry>/<version>/model.joblib, compiled.joblib (optional), metadata.json
+# A single CURRENT file names the live version. Versions are written to a temp dir and
+# renamed into place, and CURRENT is swapped with os.replace, so readers never see a
+# half-written artifact. Old versions are kept for instant rollback.
+# Partitioned models (e.g. one per crm_source) are ordinary versions with their own pointer,
+# CURRENT@<segment>; segments without a pointer are served by the global CURRENT version.
+
+MODEL_PATH = settings.get("model", {}).get("path")
+REGISTRY_DIR = settings.get("model", {}).get("registry_dir") or os.path.join(os.path.dirname(MODEL_PATH), "registry")
+CURRENT_POINTER = "CURRENT"
+SEGMENT_SEPARATOR = "@"
+MODEL_FILE = "model.joblib"
+COMPILED_FILE = "compiled.joblib"
+METADATA_FILE = "metadata.json"
+
+
+def _new_version() -> str:
+    """Sortable, unique version id, e.g. 20261019T063000Z-1a2b3c."""
+    return datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:6]
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write_text(path: str, text: str):
+    """Writes a small file via temp file + os.replace (atomic on POSIX and Windows)."""
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def version_dir(version: str, registry_dir: str = REGISTRY_DIR) -> str:
+    return os.path.join(registry_dir, version)
+
+
+def publish_model(model_pipeline, metadata: Optional[dict] = None, compiled_model=None,
+                  make_current: bool = True, registry_dir: str = REGISTRY_DIR,
+                  artifacts: Optional[Dict[str, dict]] = None) -> str:
+    """
+    Writes a new immutable version and (by default) points CURRENT at it.
+    `artifacts` are extra JSON files (file name -> content) stored with the version.
+    Returns the version id.
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+    version = _new_version()
+    tmp_dir = os.path.join(registry_dir, f".tmp-{version}")
+    os.makedirs(tmp_dir)
+    try:
+        model_file = os.path.join(tmp_dir, MODEL_FILE)
+        joblib.dump(model_pipeline, model_file)
+        if compiled_model is not None:
+            joblib.dump(compiled_model.artifact, os.path.join(tmp_dir, COMPILED_FILE))
+        full_metadata = dict(metadata or {})
+        full_metadata.update({
+            'version': version,
+            'published_at': datetime.datetime.utcnow().isoformat(),
+            'model_sha256': _sha256(model_file),
+            'has_compiled': compiled_model is not None,
+        })
+        with open(os.path.join(tmp_dir, METADATA_FILE), 'w') as f:
+            json.dump(full_metadata, f, indent=2, default=str)
+        for name, content in (artifacts or {}).items():
+            with open(os.path.join(tmp_dir, name), 'w') as f:
+                json.dump(content, f, default=str)
+        for name in os.listdir(tmp_dir): # Published artifacts are read-only
+            os.chmod(os.path.join(tmp_dir, name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.rename(tmp_dir, version_dir(version, registry_dir))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    print(f"Published model version {version} to {registry_dir}.")
+    if make_current:
+        set_current_version(version, registry_dir)
+    return version
+
+
+def list_versions(registry_dir: str = REGISTRY_DIR) -> List[str]:
+    """All published versions, oldest first."""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name for name in os.listdir(registry_dir)
+                  if not name.startswith('.') and os.path.isdir(os.path.join(registry_dir, name)))
+
+
+def _pointer_name(segment: Optional[str] = None) -> str:
+    if segment is None:
+        return CURRENT_POINTER
+    if not segment or any(c in segment for c in '/\\' + os.sep) or segment.startswith('.'):
+        raise ValueError(f"Invalid model segment name: {segment!r}")
+    return f"{CURRENT_POINTER}{SEGMENT_SEPARATOR}{segment}"
+
+
+def get_current_version(registry_dir: str = REGISTRY_DIR, segment: Optional[str] = None) -> Optional[str]:
+    """CURRENT version (of `segment`'s partitioned model when given)."""
+    pointer = os.path.join(registry_dir, _pointer_name(segment))
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, 'r') as f:
+        return f.read().strip() or None
+
+
+def set_current_version(version: str, registry_dir: str = REGISTRY_DIR, segment: Optional[str] = None):
+    """Atomically points CURRENT (or `segment`'s pointer) at an existing version."""
+    if not os.path.isdir(version_dir(version, registry_dir)):
+        raise ValueError(f"Model version {version} not found in {registry_dir}")
+    atomic_write_text(os.path.join(registry_dir, _pointer_name(segment)), version + "\n")
+    print(f"CURRENT model version{f' for segment {segment}' if segment else ''} is now {version}.")
+
+
+def segment_versions(registry_dir: str = REGISTRY_DIR) -> Dict[str, str]:
+    """segment -> CURRENT version for every partitioned model."""
+    if not os.path.isdir(registry_dir):
+        return {}
+    prefix = CURRENT_POINTER + SEGMENT_SEPARATOR
+    versions = {}
+    for name in os.listdir(registry_dir):
+        if name.startswith(prefix) and '.tmp-' not in name:
+            version = get_current_version(registry_dir, name[len(prefix):])
+            if version:
+                versions[name[len(prefix):]] = version
+    return versions
+
+
+def artifact_bytes(version: str, compiled: bool = False, registry_dir: str = REGISTRY_DIR) -> int:
+    """On-disk size of the artifact load_version would read (a proxy for its memory footprint)."""
+    directory = version_dir(version, registry_dir)
+    path = os.path.join(directory, COMPILED_FILE)
+    if not (compiled and os.path.exists(path)):
+        path = os.path.join(directory, MODEL_FILE)
+    return os.path.getsize(path)
+
+
+def load_metadata(version: str, registry_dir: str = REGISTRY_DIR) -> dict:
+    with open(os.path.join(version_dir(version, registry_dir), METADATA_FILE), 'r') as f:
+        return json.load(f)
+
+
+def version_segment(version: str, registry_dir: str = REGISTRY_DIR) -> Optional[str]:
+    """Segment a version was trained for (None for global models)."""
+    try:
+        metadata = load_metadata(version, registry_dir)
+    except FileNotFoundError:
+        return None
+    if metadata.get('mode') != 'segment':
+        return None
+    return str((metadata.get('segment') or {}).get('value'))
+
+
+def rollback(version: Optional[str] = None, registry_dir: str = REGISTRY_DIR, segment: Optional[str] = None) -> str:
+    """
+    Points CURRENT (or `segment`'s pointer) at `version`, or at the version of the same kind
+    published before the current one: global rollbacks skip segment models and vice versa.
+    """
+    if version is None:
+        current = get_current_version(registry_dir, segment)
+        versions = [v for v in list_versions(registry_dir)
+                    if v == current or version_segment(v, registry_dir) == segment]
+        if current not in versions or versions.index(current) == 0:
+            raise ValueError("No earlier model version to roll back to.")
+        version = versions[versions.index(current) - 1]
+    elif version_segment(version, registry_dir) != segment:
+        raise ValueError(f"Model version {version} was not trained for "
+                         f"{f'segment {segment}' if segment else 'the global model'}.")
+    set_current_version(version, registry_dir, segment)
+    return version
+
+
+def load_version(version: str, compiled: bool = False, registry_dir: str = REGISTRY_DIR, mmap_mode: Optional[str] = None):
+    """
+    Loads a version's pipeline (or its compiled scorer when `compiled` and available).
+    With mmap_mode='r', numpy arrays are memory-mapped from the read-only artifact instead of
+    copied, so every process serving the version shares the same page-cache pages.
+    """
+    directory = version_dir(version, registry_dir)
+    if compiled and os.path.exists(os.path.join(directory, COMPILED_FILE)):
+        from src.prediction.compiled_model import load_compiled_model
+        return load_compiled_model(os.path.join(directory, COMPILED_FILE), mmap_mode=mmap_mode)
+    return joblib.load(os.path.join(directory, MODEL_FILE), mmap_mode=mmap_mode)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Model registry")
+    parser.add_argument("action", choices=["list", "current", "rollback", "promote"])
+    parser.add_argument("--version", help="Version for rollback/promote")
+    parser.add_argument("--segment", help="Partitioned model segment (e.g. a crm_source) for current/rollback/promote")
+    args = parser.parse_args()
+
+    if args.action == "list":
+        current = get_current_version()
+        segments = segment_versions()
+        for v in list_versions():
+            tags = [name for name, version in sorted(segments.items()) if version == v]
+            print(("* " if v == current else "  ") + v + (f"  [{', '.join(tags)}]" if tags else ""))
+    elif args.action == "current":
+        print(get_current_version(segment=args.segment))
+    elif args.action == "rollback":
+        rollback(args.version, segment=args.segment)
+    elif args.action == "promote":
+        set_current_version(args.version, segment=args.segment)
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, JSON, Enum, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, JSON, Enum, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import enum
@@ -90,10 +90,57 @@ class Lead(Base):
 
     # Prediction result
     predicted_likelihood = Column(Float, nullable=True)
+    # Score last written to the originating CRM (delta suppression compares against it)
+    crm_written_score = Column(Float, nullable=True)
 
     # Add fields for interactions (calls, emails, etc.) - could be a separate table linked here
     # interactions = relationship("Interaction", back_populates="lead") # Example
 
+class WritebackStatus(enum.Enum):
+    PENDING = "pending" # Waiting to be sent (or retried once next_attempt_at has passed)
+    IN_PROGRESS = "in_progress" # Leased by a writeback worker until leased_until
+    DONE = "done"
+    SUPPRESSED = "suppressed" # Not sent: superseded by a newer score or change too small to matter
+    FAILED = "failed" # Gave up after max attempts
+
+class WritebackOutbox(Base):
+    """
+    Transactional outbox for CRM writebacks.
+    Rows are inserted in the same transaction as the Lead score update and sent by the
+    writeback workers (src/crm_writeback/outbox_worker.py), which lease, retry and complete them.
+    """
+    __tablename__ = 'writeback_outbox'
+    id = Column(Integer, primary_key=True, index=True)
+    lead_id = Column(Integer, ForeignKey('leads.id'), nullable=True) # Null if the lead is not in our DB yet
+    crm_source = Column(String, nullable=False)
+    crm_lead_id = Column(String, nullable=False)
+    score = Column(Float, nullable=False)
+
+    status = Column(Enum(WritebackStatus), default=WritebackStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    lease_token = Column(String, nullable=True) # Worker claim that currently owns the row
+    leased_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_writeback_outbox_claim', 'status', 'next_attempt_at'),
+    )
+
+class LeadChangeEvent(Base):
+    """
+    Change feed written by ingestion in the same transaction as the lead change.
+    The rescoring consumer (src/prediction/rescoring.py) rescores changed leads and deletes their events.
+    """
+    __tablename__ = 'lead_change_events'
+    id = Column(Integer, primary_key=True, index=True)
+    lead_id = Column(Integer, ForeignKey('leads.id'), nullable=False, index=True)
+    reason = Column(String, nullable=False) # 'created', 'status', 'updated'
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
 # class Interaction(Base):
 #     __tablename__ = 'interactions'
 #     id = Column(Integer, primary_key=True, index=True)
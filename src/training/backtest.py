@@ -0,0 +1,155 @@
+import os
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sqlalchemy.orm import Session
+from sklearn.metrics import roc_auc_score, average_precision_score, log_loss
+
+from src.training.pipeline import build_classifier, build_preprocessor
+from src.training.trainer import prepare_training_data, MODEL_DIR
+from src.monitoring.profiling import profile_stage
+
+# Rolling-origin backtesting on `created_at`.
+# Leads are ordered by creation time; each fold trains on leads created before its
+# test window and is evaluated on the window itself, so no future lead leaks into training.
+# A training lead must also have closed before the window starts (its origin): an outcome
+# learned later was not known at the origin. Leads without a close time are left out.
+# The preprocessed matrix is written once to .npy files and every worker process
+# opens it with mmap_mode='r', so folds share the same pages instead of copies.
+
+BACKTEST_RESULTS_PATH = os.path.join(MODEL_DIR, "backtest_results.csv")
+
+
+def rolling_origin_splits(n_samples: int, n_folds: int = 5, min_train_fraction: float = 0.5,
+                          max_train_size: Optional[int] = None) -> List[Tuple[int, int, int, int]]:
+    """
+    Returns (train_start, train_end, test_start, test_end) row bounds over time-ordered data.
+    The span after the first `min_train_fraction` is cut into `n_folds` consecutive test windows.
+    Training is expanding by default, or a sliding window of `max_train_size` rows.
+    """
+    first_test = int(n_samples * min_train_fraction)
+    bounds = np.linspace(first_test, n_samples, n_folds + 1).astype(int)
+    splits = []
+    for test_start, test_end in zip(bounds[:-1], bounds[1:]):
+        if test_end <= test_start:
+            continue
+        train_start = 0 if max_train_size is None else max(0, test_start - max_train_size)
+        splits.append((train_start, test_start, test_start, test_end))
+    return splits
+
+
+def _run_fold(fold_id: int, matrix_path: str, labels_path: str, closed_path: str, bounds: Tuple[int, int, int, int],
+              origin: int, classifier_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Fits and scores one fold on the memory-mapped matrix, training on rows closed before `origin` (ns)."""
+    X = np.load(matrix_path, mmap_mode='r')
+    y = np.load(labels_path, mmap_mode='r')
+    closed_at = np.load(closed_path, mmap_mode='r')
+    train_start, train_end, test_start, test_end = bounds
+    train_rows = train_start + np.flatnonzero(closed_at[train_start:train_end] < origin)
+    y_train, y_test = y[train_rows], y[test_start:test_end]
+    result = {
+        'fold': fold_id,
+        'n_train': len(train_rows),
+        'n_test': test_end - test_start,
+        'test_positive_rate': float(np.mean(y_test)),
+    }
+    if len(np.unique(y_train)) < 2:
+        print(f"Fold {fold_id}: only one outcome known at the origin ({len(train_rows)} closed leads). Skipping.")
+        return dict(result, logloss=None, auc_roc=None, pr_auc=None, fit_seconds=0.0, predict_seconds=0.0)
+
+    start = time.perf_counter()
+    classifier = build_classifier(n_jobs=1, **classifier_params)
+    classifier.fit(X[train_rows], y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba = classifier.predict_proba(X[test_start:test_end])[:, 1]
+    predict_seconds = time.perf_counter() - start
+
+    result.update({
+        'logloss': float(log_loss(y_test, proba, labels=[0, 1])),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+    })
+    try:
+        result['auc_roc'] = float(roc_auc_score(y_test, proba))
+        result['pr_auc'] = float(average_precision_score(y_test, proba))
+    except ValueError:
+        result['auc_roc'] = result['pr_auc'] = None # Single class in the window
+    return result
+
+
+def run_backtest(df: pd.DataFrame, X: pd.DataFrame, y: pd.Series, n_folds: int = 5,
+                 min_train_fraction: float = 0.5, max_train_size: Optional[int] = None,
+                 n_jobs: Optional[int] = None, classifier_params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """Runs rolling-origin folds in parallel worker processes. Returns per-fold metrics and timing."""
+    classifier_params = classifier_params or {}
+    created_at = pd.to_datetime(df['created_at'], utc=True).values.astype('datetime64[ns]')
+    order = np.argsort(created_at, kind='stable')
+    created_at = created_at[order]
+    X_sorted = X.iloc[order]
+    y_sorted = np.asarray(y)[order].astype(np.float32)
+    closed_at = pd.to_datetime(df['closed_at'], utc=True).values.astype('datetime64[ns]')[order]
+    # Nanoseconds; a lead that never closed sorts after every origin
+    closed_ns = np.where(np.isnat(closed_at), np.iinfo(np.int64).max, closed_at.astype(np.int64))
+
+    splits = rolling_origin_splits(len(X_sorted), n_folds, min_train_fraction, max_train_size)
+    if not splits:
+        print("Not enough data for backtesting.")
+        return pd.DataFrame()
+
+    # Fit the preprocessor on the first fold's training rows only: they precede every test window.
+    # (Tree models are insensitive to the scaling itself; this just avoids learning future categories.)
+    first_train_start, first_train_end = splits[0][0], splits[0][1]
+    preprocessor = build_preprocessor()
+    preprocessor.fit(X_sorted.iloc[first_train_start:first_train_end])
+    Xt = preprocessor.transform(X_sorted)
+    Xt = Xt.toarray() if sp.issparse(Xt) else np.asarray(Xt)
+
+    n_jobs = n_jobs or min(len(splits), os.cpu_count() or 1)
+    print(f"Backtesting {len(splits)} rolling-origin folds on {n_jobs} processes ({len(X_sorted)} leads)...")
+    with tempfile.TemporaryDirectory(prefix="backtest-") as tmp_dir:
+        matrix_path = os.path.join(tmp_dir, "X.npy")
+        labels_path = os.path.join(tmp_dir, "y.npy")
+        closed_path = os.path.join(tmp_dir, "closed_at.npy")
+        np.save(matrix_path, Xt.astype(np.float32))
+        np.save(labels_path, y_sorted)
+        np.save(closed_path, closed_ns)
+        del Xt
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_run_fold, i, matrix_path, labels_path, closed_path, bounds,
+                                   int(created_at[bounds[2]].astype(np.int64)), classifier_params)
+                       for i, bounds in enumerate(splits)]
+            results = [f.result() for f in futures]
+        wall_seconds = time.perf_counter() - start
+
+    for result, (_, _, test_start, test_end) in zip(results, splits):
+        result['test_from'] = created_at[test_start]
+        result['test_to'] = created_at[test_end - 1]
+
+    results_df = pd.DataFrame(results)
+    print(results_df.to_string(index=False))
+    print(f"Mean AUC: {results_df['auc_roc'].mean():.4f} (std {results_df['auc_roc'].std():.4f}), "
+          f"wall time {wall_seconds:.2f}s vs. {results_df['fit_seconds'].sum():.2f}s total fit time.")
+    return results_df
+
+
+@profile_stage('backtest')
+def backtest_model(db: Session, n_folds: int = 5, results_path: str = BACKTEST_RESULTS_PATH, **kwargs) -> pd.DataFrame:
+    """`backtest` command: loads training data, runs the rolling-origin backtest and writes the results."""
+    prepared = prepare_training_data(db)
+    if prepared is None:
+        return pd.DataFrame()
+    df, X, y = prepared
+    results_df = run_backtest(df, X, y, n_folds=n_folds, **kwargs)
+    if not results_df.empty:
+        results_df.to_csv(results_path, index=False)
+        print(f"Backtest results written to {results_path}")
+    return results_df
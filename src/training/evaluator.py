@@ -1,57 +1,252 @@
-from sklearn.metrics import classification_report, roc_auc_score, confusion_matrix, precision_recall_curve, auc
-import matplotlib.pyplot as plt # Optional for plotting
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
 
-def evaluate_model(model_pipeline, X_test, y_test):
-    """Evaluates the trained model pipeline."""
-    print("Evaluating model...")
+import numpy as np
+import pandas as pd
 
-    # Predict probabilities and classes
-    y_pred_proba = model_pipeline.predict_proba(X_test)[:, 1]
-    y_pred = model_pipeline.predict(X_test)
+# Single-pass evaluation engine.
+# Inference runs once (predict_proba); every metric is derived from the probabilities.
+# Scores are sorted once and all threshold/curve metrics come from weighted cumulative
+# sums over that order. Bootstrap resamples are just count-weight matrices over the same
+# sorted order, so a whole chunk of resamples is evaluated with a few vectorized ops.
+# Note: no plotting here (no matplotlib import); plot from the returned metrics instead.
+
+DEFAULT_THRESHOLD = 0.5 # Same cut-off as XGBClassifier.predict (proba > 0.5)
+LEAD_AGE_BUCKETS = [0, 24, 72, 168, 720, np.inf] # Hours
+LEAD_AGE_LABELS = ['<1d', '1-3d', '3-7d', '7-30d', '30d+']
+SEGMENT_COLUMNS = ['crm_source', 'vehicle_make']
+MIN_SEGMENT_SIZE = 30 # Smaller segments are reported with counts only
+CI_METRICS = ['auc_roc', 'pr_auc', 'precision', 'recall', 'f1', 'accuracy', 'logloss']
+BOOTSTRAP_MEMORY_BYTES = 256 * 2**20 # Per worker process, for one chunk of resamples
+BOOTSTRAP_WORKING_ARRAYS = 8 # (resamples, n) float64 arrays alive at once in _weighted_metrics
+
+
+def _sort_by_score(y_true, y_score):
+    """Sorts labels/scores by descending score. Returns (y_sorted, s_sorted, distinct_end_idx)."""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_score = np.asarray(y_score, dtype=np.float64)
+    order = np.argsort(-y_score, kind='mergesort')
+    y_sorted, s_sorted = y_true[order], y_score[order]
+    # Last index of each run of tied scores: one curve point per distinct threshold
+    distinct_end = np.r_[np.flatnonzero(np.diff(s_sorted)), len(s_sorted) - 1]
+    return y_sorted, s_sorted, distinct_end
+
+
+def _weighted_metrics(y_sorted, s_sorted, distinct_end, weights, threshold=DEFAULT_THRESHOLD) -> Dict[str, np.ndarray]:
+    """
+    Computes metrics for each row of `weights` (shape (B, n), count weights over the sorted rows).
+    weights=np.ones((1, n)) gives the plain metrics; multinomial counts give bootstrap resamples.
+    """
+    weights = np.atleast_2d(weights).astype(np.float64)
+    tps = np.cumsum(weights * y_sorted, axis=1)[:, distinct_end]
+    fps = np.cumsum(weights * (1.0 - y_sorted), axis=1)[:, distinct_end]
+    pos, neg = tps[:, -1], fps[:, -1]
+    total = pos + neg
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # ROC AUC: trapezoid over (fpr, tpr) starting at the origin
+        tpr = np.hstack([np.zeros((len(tps), 1)), tps]) / pos[:, None]
+        fpr = np.hstack([np.zeros((len(fps), 1)), fps]) / neg[:, None]
+        auc_roc = np.trapezoid(tpr, fpr, axis=1) if hasattr(np, 'trapezoid') else np.trapz(tpr, fpr, axis=1)
+        auc_roc = np.where((pos > 0) & (neg > 0), auc_roc, np.nan)
+
+        # PR AUC: trapezoid over (recall, precision) with the (0, 1) end point, like sklearn's auc(recall, precision)
+        precision_curve = np.hstack([np.ones((len(tps), 1)), tps / (tps + fps)])
+        recall_curve = np.hstack([np.zeros((len(tps), 1)), tps / pos[:, None]])
+        precision_curve = np.nan_to_num(precision_curve, nan=1.0)
+        pr_auc = np.trapezoid(precision_curve, recall_curve, axis=1) if hasattr(np, 'trapezoid') else np.trapz(precision_curve, recall_curve, axis=1)
+        pr_auc = np.where(pos > 0, pr_auc, np.nan)
+
+        # Threshold metrics: rows with score > threshold are predicted positive
+        k = np.searchsorted(-s_sorted, -threshold, side='left')
+        tp = (weights[:, :k] * y_sorted[:k]).sum(axis=1)
+        fp = weights[:, :k].sum(axis=1) - tp
+        fn, tn = pos - tp, neg - fp
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(pos > 0, tp / pos, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        # Negative-class view for the classification report
+        npv = np.where(tn + fn > 0, tn / (tn + fn), 0.0)
+        specificity = np.where(neg > 0, tn / neg, 0.0)
+        f1_neg = np.where(npv + specificity > 0, 2 * npv * specificity / (npv + specificity), 0.0)
+
+        clipped = np.clip(s_sorted, 1e-15, 1 - 1e-15)
+        point_loss = -(y_sorted * np.log(clipped) + (1 - y_sorted) * np.log(1 - clipped))
+        logloss = (weights * point_loss).sum(axis=1) / total
+        brier = (weights * (s_sorted - y_sorted) ** 2).sum(axis=1) / total
+
+    return {
+        'auc_roc': auc_roc, 'pr_auc': pr_auc,
+        'tp': tp, 'fp': fp, 'tn': tn, 'fn': fn, 'support_pos': pos, 'support_neg': neg,
+        'precision': precision, 'recall': recall, 'f1': f1,
+        'npv': npv, 'specificity': specificity, 'f1_neg': f1_neg,
+        'accuracy': (tp + tn) / total, 'logloss': logloss, 'brier': brier,
+    }
+
+
+def _nan_to_none(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def binary_metrics(y_true, y_score, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    """All metrics for one set of labels/probabilities, from a single sort."""
+    y_sorted, s_sorted, distinct_end = _sort_by_score(y_true, y_score)
+    m = {name: values[0] for name, values in
+         _weighted_metrics(y_sorted, s_sorted, distinct_end, np.ones((1, len(y_sorted))), threshold).items()}
+
+    support_neg, support_pos = int(m['support_neg']), int(m['support_pos'])
+    total = support_neg + support_pos
+    class_0 = {'precision': float(m['npv']), 'recall': float(m['specificity']), 'f1-score': float(m['f1_neg']), 'support': support_neg}
+    class_1 = {'precision': float(m['precision']), 'recall': float(m['recall']), 'f1-score': float(m['f1']), 'support': support_pos}
+    report = {
+        '0': class_0,
+        '1': class_1,
+        'accuracy': float(m['accuracy']),
+        'macro avg': {key: (class_0[key] + class_1[key]) / 2 for key in ('precision', 'recall', 'f1-score')},
+        'weighted avg': {key: (class_0[key] * support_neg + class_1[key] * support_pos) / total
+                         for key in ('precision', 'recall', 'f1-score')},
+    }
+    report['macro avg']['support'] = report['weighted avg']['support'] = total
+
+    return {
+        'auc_roc': _nan_to_none(m['auc_roc']),
+        'pr_auc': _nan_to_none(m['pr_auc']),
+        'precision': float(m['precision']),
+        'recall': float(m['recall']),
+        'f1': float(m['f1']),
+        'accuracy': float(m['accuracy']),
+        'logloss': float(m['logloss']),
+        'brier': float(m['brier']),
+        'positive_rate': support_pos / total if total else None,
+        'classification_report': report,
+        # Same layout as sklearn's confusion_matrix: rows = actual, columns = predicted
+        'confusion_matrix': [[int(m['tn']), int(m['fp'])], [int(m['fn']), int(m['tp'])]],
+    }
 
-    # Classification Report
+
+def _bootstrap_chunk(y_sorted, s_sorted, distinct_end, n_resamples: int, seed, threshold: float) -> Dict[str, np.ndarray]:
+    """Evaluates `n_resamples` bootstrap resamples at once as a (n_resamples, n) count-weight matrix."""
+    rng = np.random.default_rng(seed)
+    n = len(y_sorted)
+    # Resample counts per original row, one bincount per resample (no (n_resamples, n) index matrix)
+    weights = np.empty((n_resamples, n), dtype=np.float64)
+    for row in range(n_resamples):
+        weights[row] = np.bincount(rng.integers(0, n, size=n), minlength=n)
+    metrics = _weighted_metrics(y_sorted, s_sorted, distinct_end, weights, threshold)
+    return {name: metrics[name] for name in CI_METRICS}
+
+
+def bootstrap_ci(y_true, y_score, n_bootstrap: int = 1000, alpha: float = 0.05, threshold: float = DEFAULT_THRESHOLD,
+                 chunk_size: int = 100, n_jobs: Optional[int] = None, seed: int = 42,
+                 memory_budget: int = BOOTSTRAP_MEMORY_BYTES) -> dict:
+    """
+    Percentile bootstrap confidence intervals, with resample chunks evaluated in parallel processes.
+    Chunks hold at most `chunk_size` resamples, fewer for large n so a chunk stays within `memory_budget`.
+    """
+    y_sorted, s_sorted, distinct_end = _sort_by_score(y_true, y_score)
+    if len(y_sorted) == 0 or n_bootstrap <= 0:
+        return {}
+    chunk_size = max(1, min(chunk_size, memory_budget // (len(y_sorted) * 8 * BOOTSTRAP_WORKING_ARRAYS)))
+    sizes = [min(chunk_size, n_bootstrap - start) for start in range(0, n_bootstrap, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    n_jobs = n_jobs or min(len(sizes), os.cpu_count() or 1)
+
+    if n_jobs == 1:
+        chunks = [_bootstrap_chunk(y_sorted, s_sorted, distinct_end, size, s, threshold) for size, s in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_bootstrap_chunk, y_sorted, s_sorted, distinct_end, size, s, threshold)
+                       for size, s in zip(sizes, seeds)]
+            chunks = [f.result() for f in futures]
+
+    intervals = {}
+    for name in CI_METRICS:
+        values = np.concatenate([chunk[name] for chunk in chunks])
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            intervals[name] = None
+            continue
+        low, high = np.percentile(values, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+        intervals[name] = {'low': float(low), 'high': float(high), 'std': float(values.std())}
+    return intervals
+
+
+def lead_age_bucket(lead_age_hours) -> np.ndarray:
+    """Buckets lead_age_hours into the labels used for segment breakdowns."""
+    return pd.cut(pd.Series(lead_age_hours, dtype='float64'), LEAD_AGE_BUCKETS, labels=LEAD_AGE_LABELS,
+                  right=False).astype(str).to_numpy()
+
+
+def segment_metrics(y_true, y_score, segments: Dict[str, np.ndarray], threshold: float = DEFAULT_THRESHOLD,
+                    min_segment_size: int = MIN_SEGMENT_SIZE) -> dict:
+    """Metrics per value of each segment column ({column: {value: metrics}})."""
+    y_true = np.asarray(y_true)
+    y_score = np.asarray(y_score)
+    breakdown = {}
+    for column, values in segments.items():
+        keys, inverse = np.unique(np.asarray(values).astype(str), return_inverse=True)
+        group_order = np.argsort(inverse, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(inverse, minlength=len(keys)))]
+        breakdown[column] = {}
+        for i, key in enumerate(keys):
+            rows = group_order[bounds[i]:bounds[i + 1]]
+            if len(rows) < min_segment_size:
+                breakdown[column][key] = {'count': int(len(rows)), 'positive_rate': float(y_true[rows].mean())}
+                continue
+            m = binary_metrics(y_true[rows], y_score[rows], threshold)
+            breakdown[column][key] = {'count': int(len(rows)), **{name: m[name] for name in
+                                      ('auc_roc', 'pr_auc', 'precision', 'recall', 'f1', 'logloss', 'positive_rate')}}
+    return breakdown
+
+
+def _print_summary(metrics: dict):
+    report = metrics['classification_report']
     print("\nClassification Report:")
-    print(classification_report(y_test, y_pred))
+    print(f"{'':>14}{'precision':>10}{'recall':>10}{'f1-score':>10}{'support':>10}")
+    for label in ('0', '1', 'macro avg', 'weighted avg'):
+        row = report[label]
+        print(f"{label:>14}{row['precision']:>10.2f}{row['recall']:>10.2f}{row['f1-score']:>10.2f}{row['support']:>10}")
+    print(f"{'accuracy':>14}{'':>20}{report['accuracy']:>10.2f}{report['weighted avg']['support']:>10}")
 
-    # AUC Score
-    try:
-        auc_score = roc_auc_score(y_test, y_pred_proba)
-        print(f"\nROC AUC Score: {auc_score:.4f}")
-    except ValueError:
+    if metrics['auc_roc'] is not None:
+        print(f"\nROC AUC Score: {metrics['auc_roc']:.4f}")
+    else:
         print("\nROC AUC score could not be calculated (possibly only one class present in test set).")
+    print("\nConfusion Matrix:")
+    print(np.array(metrics['confusion_matrix']))
+    if metrics['pr_auc'] is not None:
+        print(f"\nPrecision-Recall AUC: {metrics['pr_auc']:.4f}")
 
+    for name, ci in (metrics.get('confidence_intervals') or {}).items():
+        if ci:
+            print(f"  {name}: 95% CI [{ci['low']:.4f}, {ci['high']:.4f}]")
+    for column, groups in (metrics.get('segments') or {}).items():
+        print(f"\nBy {column}:")
+        for key, m in groups.items():
+            auc_text = f"{m['auc_roc']:.4f}" if m.get('auc_roc') is not None else 'n/a'
+            print(f"  {key:>20}: n={m['count']:<7} AUC={auc_text}")
 
-    # Confusion Matrix
-    print("\nConfusion Matrix:")
-    print(confusion_matrix(y_test, y_pred))
-
-    # Precision-Recall AUC (useful for imbalanced data)
-    precision, recall, _ = precision_recall_curve(y_test, y_pred_proba)
-    pr_auc = auc(recall, precision)
-    print(f"\nPrecision-Recall AUC: {pr_auc:.4f}")
-
-    # Optional: Plotting
-    # try:
-    #     from sklearn.metrics import RocCurveDisplay, PrecisionRecallDisplay
-    #     RocCurveDisplay.from_estimator(model_pipeline, X_test, y_test)
-    #     plt.title('ROC Curve')
-    #     plt.show()
-    #
-    #     PrecisionRecallDisplay.from_estimator(model_pipeline, X_test, y_test)
-    #     plt.title('Precision-Recall Curve')
-    #     plt.show()
-    # except ImportError:
-    #     print("Matplotlib/Display not available for plotting.")
-    # except Exception as e:
-    #     print(f"Error during plotting: {e}")
-
-
-    # Return metrics as a dictionary
-    metrics = {
-        'auc_roc': auc_score if 'auc_score' in locals() else None,
-        'pr_auc': pr_auc,
-        'classification_report': classification_report(y_test, y_pred, output_dict=True),
-        'confusion_matrix': confusion_matrix(y_test, y_pred).tolist() # Convert to list for JSON compatibility
-    }
+
+def evaluate_model(model_pipeline, X_test, y_test, n_bootstrap: int = 200, threshold: float = DEFAULT_THRESHOLD,
+                   segments: bool = True):
+    """Evaluates the trained model pipeline from a single predict_proba pass."""
+    print("Evaluating model...")
+
+    # Inference runs once; class predictions are derived from the probabilities
+    y_pred_proba = model_pipeline.predict_proba(X_test)[:, 1]
+    y_true = np.asarray(y_test)
+
+    metrics = binary_metrics(y_true, y_pred_proba, threshold)
+    metrics['threshold'] = threshold
+    metrics['confidence_intervals'] = bootstrap_ci(y_true, y_pred_proba, n_bootstrap=n_bootstrap, threshold=threshold)
+
+    if segments and isinstance(X_test, pd.DataFrame):
+        segment_values = {col: X_test[col].to_numpy() for col in SEGMENT_COLUMNS if col in X_test.columns}
+        if 'lead_age_hours' in X_test.columns:
+            segment_values['lead_age_bucket'] = lead_age_bucket(X_test['lead_age_hours'].to_numpy())
+        metrics['segments'] = segment_metrics(y_true, y_pred_proba, segment_values, threshold)
+
+    _print_summary(metrics)
     print("Evaluation complete.")
     return metrics
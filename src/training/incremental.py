@@ -0,0 +1,122 @@
+import datetime
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sklearn.metrics import roc_auc_score, log_loss
+from sklearn.pipeline import Pipeline
+
+from src.training.pipeline import build_classifier
+from src.storage import model_registry
+from src.monitoring.drift import load_reference
+from src.monitoring.metrics import timed
+from src.prediction.scoring import training_feature_defaults
+from src.training.trainer import (load_closed_leads, featurize_training_data, save_model_pipeline,
+                                  training_watermark, train_model)
+
+# Warm-start retraining: continue boosting the registry's CURRENT model on leads closed since
+# that version's training watermark (so a rollback is never undone by the next update). The
+# fitted preprocessor is frozen (reused as-is), so only the new trees are fitted. A candidate
+# is promoted only if it does not score worse than the current model on the most recently
+# closed leads.
+
+MIN_NEW_LEADS = 50 # Below this, there is not enough signal to justify an update
+EXTRA_ROUNDS = 50 # Trees added per incremental update
+HOLDOUT_FRACTION = 0.2 # Most recently closed share of new leads used for the promotion gate
+PROMOTION_TOLERANCE = 0.005 # Allowed AUC drop (or log loss increase) vs. the current model
+
+
+def _score(model_pipeline, X, y) -> dict:
+    proba = model_pipeline.predict_proba(X)[:, 1]
+    try:
+        auc_roc = roc_auc_score(y, proba)
+    except ValueError:
+        auc_roc = None # Only one class in the holdout
+    return {'auc_roc': auc_roc, 'logloss': float(log_loss(y, proba, labels=[0, 1]))}
+
+
+def should_promote(candidate: dict, current: dict, tolerance: float = PROMOTION_TOLERANCE) -> bool:
+    """Promotion gate: AUC must not drop by more than `tolerance` (log loss when AUC is undefined)."""
+    if candidate['auc_roc'] is not None and current['auc_roc'] is not None:
+        return candidate['auc_roc'] >= current['auc_roc'] - tolerance
+    return candidate['logloss'] <= current['logloss'] + tolerance
+
+
+def train_incremental(db: Session, min_new_leads: int = MIN_NEW_LEADS, extra_rounds: int = EXTRA_ROUNDS,
+                      holdout_fraction: float = HOLDOUT_FRACTION, tolerance: float = PROMOTION_TOLERANCE):
+    """
+    `train --incremental`: loads the registry's CURRENT model and continues boosting it
+    (XGBoost `xgb_model=` continuation) on leads closed after that version's watermark.
+    Falls back to a full `train_model` when there is no model or watermark yet.
+    """
+    print("Starting incremental training...")
+    version = model_registry.get_current_version()
+    metadata = model_registry.load_metadata(version) if version else {}
+    if not metadata.get('trained_through'):
+        print("No current model version or training watermark found. Running full training instead.")
+        return train_model(db)
+
+    watermark = datetime.datetime.fromisoformat(metadata['trained_through'])
+    df = load_closed_leads(db, since=watermark)
+    if len(df) < min_new_leads:
+        print(f"Only {len(df)} leads closed since {watermark} (need {min_new_leads}). Skipping update.")
+        return None
+
+    start = time.perf_counter()
+    current_pipeline = model_registry.load_version(version)
+    df, X, y = featurize_training_data(df)
+    # Keep the columns (and order) the frozen preprocessor was fitted on
+    feature_columns = list(getattr(current_pipeline, 'feature_names_in_', X.columns))
+    X = df[feature_columns]
+
+    # Time-ordered split: oldest new leads update the model, the most recent ones gate promotion.
+    # Leads closed at the cutoff time all join the holdout, so none sit at (and get skipped behind) the new watermark
+    closed_at = df['closed_at'].values
+    order = np.argsort(closed_at, kind='stable')
+    n_holdout = max(1, int(len(order) * holdout_fraction))
+    in_holdout = closed_at[order] >= closed_at[order[-n_holdout]]
+    update_idx, holdout_idx = order[~in_holdout], order[in_holdout]
+    X_update, y_update = X.iloc[update_idx], y.iloc[update_idx]
+    X_holdout, y_holdout = X.iloc[holdout_idx], y.iloc[holdout_idx]
+    if y_update.nunique() < 2:
+        print("New leads contain a single outcome class. Skipping update.")
+        return None
+
+    # Frozen preprocessor: transform only, never refit
+    preprocessor = current_pipeline.named_steps['preprocessor']
+    current_classifier = current_pipeline.named_steps['classifier']
+    params = current_classifier.get_params()
+    for name in ('n_estimators', 'early_stopping_rounds'):
+        params.pop(name, None)
+    classifier = build_classifier(**params, n_estimators=extra_rounds)
+    with timed('train.fit'):
+        classifier.fit(preprocessor.transform(X_update), y_update, xgb_model=current_classifier.get_booster())
+    candidate_pipeline = Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('classifier', classifier)
+    ])
+    # Frozen inputs: keep the base version's imputation defaults (models without them get the update's)
+    candidate_pipeline.feature_defaults_ = getattr(current_pipeline, 'feature_defaults_', None) or training_feature_defaults(X_update)
+    fit_seconds = time.perf_counter() - start
+    print(f"Continued boosting with {extra_rounds} trees on {len(X_update)} leads in {fit_seconds:.2f}s.")
+
+    current_metrics = _score(current_pipeline, X_holdout, y_holdout)
+    candidate_metrics = _score(candidate_pipeline, X_holdout, y_holdout)
+    print(f"Holdout ({len(X_holdout)} leads) current: {current_metrics}, candidate: {candidate_metrics}")
+
+    promoted = should_promote(candidate_metrics, current_metrics, tolerance)
+    if promoted:
+        # Advance the watermark only past the leads we trained on; the holdout is reused next time
+        save_model_pipeline(candidate_pipeline, metadata={
+            'trained_at': datetime.datetime.utcnow().isoformat(),
+            'trained_through': training_watermark(df.iloc[update_idx]),
+            'mode': 'incremental',
+            'previous': {'version': version, 'trained_through': metadata['trained_through'], 'mode': metadata.get('mode')},
+            'metrics': candidate_metrics,
+        }, drift_reference=load_reference(version)) # Frozen preprocessor: same input reference
+        print("Candidate promoted.")
+    else:
+        print("Candidate did not pass the promotion gate. Keeping the current model.")
+
+    return {'promoted': promoted, 'base_version': version, 'fit_seconds': fit_seconds, 'new_leads': len(df),
+            'current': current_metrics, 'candidate': candidate_metrics}
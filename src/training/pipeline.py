@@ -1,19 +1,41 @@
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from xgboost import XGBClassifier # Popular choice for performance
-from src.processing.feature_engineering import preprocessor
+from src.processing.feature import preprocessor
 
-def build_model_pipeline():
+# Default XGBoost configuration. The hyperparameter search (search.py) overrides these.
+DEFAULT_CLASSIFIER_PARAMS = {
+    'use_label_encoder': False,
+    'eval_metric': 'logloss',
+    'random_state': 42,
+    'n_estimators': 200,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+}
+
+def build_classifier(**classifier_params):
+    """Builds the XGBoost classifier, overriding DEFAULT_CLASSIFIER_PARAMS with any given params."""
+    params = dict(DEFAULT_CLASSIFIER_PARAMS)
+    params.update(classifier_params)
+    return XGBClassifier(**params)
+
+def build_preprocessor():
+    """Returns an unfitted copy of the shared preprocessor so pipelines never share fitted state."""
+    return clone(preprocessor)
+
+def build_model_pipeline(**classifier_params):
     """Builds the full scikit-learn pipeline including preprocessing and model."""
     # Choose your classifier
     # classifier = LogisticRegression(random_state=42, solver='liblinear')
     # classifier = RandomForestClassifier(n_estimators=200, random_state=42, class_weight='balanced', max_depth=10) # class_weight='balanced' helps with imbalance
-    classifier = XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42, n_estimators=200, learning_rate=0.1, subsample=0.8, colsample_bytree=0.8)
+    classifier = build_classifier(**classifier_params)
 
     # Create the pipeline
     pipeline = Pipeline(steps=[
-        ('preprocessor', preprocessor),
+        ('preprocessor', build_preprocessor()),
         ('classifier', classifier)
     ])
 
@@ -0,0 +1,196 @@
+import os
+import time
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import roc_auc_score, log_loss
+from sklearn.pipeline import Pipeline
+
+from src.training.pipeline import build_classifier, build_preprocessor
+from src.training.trainer import (prepare_training_data, split_training_data, save_model_pipeline,
+                                  training_watermark, MODEL_DIR)
+from src.training.evaluator import evaluate_model
+from src.monitoring.drift import build_reference
+from src.monitoring.metrics import timed
+from src.prediction.scoring import set_feature_defaults
+
+# Budgeted hyperparameter search for the XGBoost classifier.
+# The ColumnTransformer is fitted ONCE on the training split and the transformed
+# matrices are shared with every trial; trials run in a process pool and use
+# early stopping on a held-out validation split.
+
+LEADERBOARD_PATH = os.path.join(MODEL_DIR, "search_leaderboard.csv")
+
+# (kind, low, high) per parameter
+SEARCH_SPACE = {
+    'learning_rate': ('log_uniform', 0.01, 0.3),
+    'max_depth': ('int', 3, 10),
+    'min_child_weight': ('log_uniform', 0.5, 10.0),
+    'subsample': ('uniform', 0.5, 1.0),
+    'colsample_bytree': ('uniform', 0.5, 1.0),
+    'reg_lambda': ('log_uniform', 0.1, 10.0),
+    'gamma': ('uniform', 0.0, 5.0),
+}
+
+
+def sample_params(rng: np.random.Generator, space: Dict[str, tuple] = SEARCH_SPACE) -> Dict[str, Any]:
+    """Draws one random configuration from the search space."""
+    params = {}
+    for name, (kind, low, high) in space.items():
+        if kind == 'int':
+            params[name] = int(rng.integers(low, high + 1))
+        elif kind == 'log_uniform':
+            params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+
+# --- Worker process state ---
+# Set once per worker by the pool initializer so the matrices are not re-sent with every trial.
+_WORKER_DATA = {}
+
+def _init_worker(X_fit, y_fit, X_valid, y_valid):
+    _WORKER_DATA.update(X_fit=X_fit, y_fit=y_fit, X_valid=X_valid, y_valid=y_valid)
+
+
+def _run_trial(trial_id: int, params: Dict[str, Any], n_estimators: int, early_stopping_rounds: int) -> Dict[str, Any]:
+    """Fits one configuration with early stopping on the validation split."""
+    start = time.perf_counter()
+    classifier = build_classifier(
+        n_estimators=n_estimators,
+        early_stopping_rounds=early_stopping_rounds,
+        n_jobs=1, # Parallelism comes from the process pool
+        **params,
+    )
+    classifier.fit(_WORKER_DATA['X_fit'], _WORKER_DATA['y_fit'],
+                   eval_set=[(_WORKER_DATA['X_valid'], _WORKER_DATA['y_valid'])], verbose=False)
+    fit_seconds = time.perf_counter() - start
+
+    best_iteration = getattr(classifier, 'best_iteration', None)
+    y_valid = _WORKER_DATA['y_valid']
+    valid_proba = classifier.predict_proba(_WORKER_DATA['X_valid'])[:, 1]
+    try:
+        valid_auc = roc_auc_score(y_valid, valid_proba)
+    except ValueError:
+        valid_auc = float('nan')
+    return {
+        'trial_id': trial_id,
+        'n_estimators': n_estimators,
+        'best_iteration': int(best_iteration) if best_iteration is not None else n_estimators - 1,
+        'valid_logloss': float(log_loss(y_valid, valid_proba, labels=[0, 1])),
+        'valid_auc': float(valid_auc),
+        'fit_seconds': fit_seconds,
+        **params,
+    }
+
+
+def run_search(X_fit, y_fit, X_valid, y_valid, n_trials: int = 32, strategy: str = 'random',
+               max_estimators: int = 1000, min_estimators: int = 50, eta: int = 3,
+               early_stopping_rounds: int = 30, n_jobs: Optional[int] = None, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Runs a random or successive-halving search over classifier params on pre-transformed matrices.
+    Successive halving starts all configs at `min_estimators`, keeps the best 1/eta by validation
+    log loss and multiplies the tree budget by eta until `max_estimators` is reached.
+    Returns the leaderboard (one row per trial and rung), best first.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = [(i, sample_params(rng)) for i in range(n_trials)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    print(f"Running {strategy} search: {n_trials} trials on {n_jobs} processes...")
+
+    leaderboard = []
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(X_fit, y_fit, X_valid, y_valid)) as pool:
+        if strategy == 'halving':
+            budget = min_estimators
+            rung = 0
+            while candidates:
+                results = list(pool.map(_run_trial, *zip(*[(i, p, budget, early_stopping_rounds) for i, p in candidates])))
+                for r in results:
+                    r['rung'] = rung
+                leaderboard.extend(results)
+                print(f"  Rung {rung}: {len(results)} trials at {budget} trees, best logloss {min(r['valid_logloss'] for r in results):.4f}")
+                if budget >= max_estimators or len(candidates) == 1:
+                    break
+                keep = max(1, len(candidates) // eta)
+                survivors = {r['trial_id'] for r in sorted(results, key=lambda r: r['valid_logloss'])[:keep]}
+                candidates = [(i, p) for i, p in candidates if i in survivors]
+                budget = min(budget * eta, max_estimators)
+                rung += 1
+        else:
+            futures = [pool.submit(_run_trial, i, p, max_estimators, early_stopping_rounds) for i, p in candidates]
+            for future in futures:
+                result = future.result()
+                result['rung'] = 0
+                leaderboard.append(result)
+
+    # Rank the highest rung first (only survivors reach it), then by validation log loss
+    leaderboard.sort(key=lambda r: (-r['rung'], r['valid_logloss']))
+    return leaderboard
+
+
+def search_model(db: Session, n_trials: int = 32, strategy: str = 'random', max_estimators: int = 1000,
+                 early_stopping_rounds: int = 30, n_jobs: Optional[int] = None,
+                 leaderboard_path: str = LEADERBOARD_PATH):
+    """
+    `train --search`: searches classifier params, writes the leaderboard, then refits the best
+    configuration on the whole training split (fit plus validation, preprocessor included) with
+    its early-stopped tree count and saves it as the model pipeline.
+    """
+    print("Starting hyperparameter search...")
+    prepared = prepare_training_data(db)
+    if prepared is None:
+        return
+    df, X, y = prepared
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
+    # Hold out part of the training split for early stopping
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.2, random_state=42, stratify=y_train)
+
+    # Fit the preprocessor once; every trial reuses the transformed matrices
+    preprocessor = build_preprocessor()
+    Xt_fit = preprocessor.fit_transform(X_fit)
+    Xt_valid = preprocessor.transform(X_valid)
+    y_fit_arr = np.asarray(y_fit)
+    y_valid_arr = np.asarray(y_valid)
+
+    start = time.perf_counter()
+    leaderboard = run_search(Xt_fit, y_fit_arr, Xt_valid, y_valid_arr, n_trials=n_trials, strategy=strategy,
+                             max_estimators=max_estimators, early_stopping_rounds=early_stopping_rounds, n_jobs=n_jobs)
+    print(f"Search finished in {time.perf_counter() - start:.1f}s.")
+
+    leaderboard_df = pd.DataFrame(leaderboard)
+    leaderboard_df.to_csv(leaderboard_path, index=False)
+    print(f"Leaderboard written to {leaderboard_path}")
+    print(leaderboard_df.head(5).to_string(index=False))
+
+    # Refit the winner on fit + validation with its early-stopped tree count (all cores, no early stopping)
+    best = leaderboard[0]
+    best_params = {name: best[name] for name in SEARCH_SPACE}
+    preprocessor = build_preprocessor()
+    classifier = build_classifier(n_estimators=best['best_iteration'] + 1, **best_params)
+    with timed('train.fit'):
+        classifier.fit(preprocessor.fit_transform(X_train), np.asarray(y_train))
+    model_pipeline = set_feature_defaults(Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('classifier', classifier)
+    ]), X_train)
+
+    with timed('train.evaluate'):
+        metrics = evaluate_model(model_pipeline, X_test, y_test)
+    metrics['search'] = {'best_params': best_params, 'n_estimators': best['best_iteration'] + 1,
+                         'leaderboard_path': leaderboard_path,
+                         'finished_at': datetime.datetime.utcnow().isoformat()}
+    save_model_pipeline(model_pipeline, metadata={
+        'trained_at': datetime.datetime.utcnow().isoformat(),
+        'trained_through': training_watermark(df),
+        'mode': 'search',
+        'metrics': {'auc_roc': metrics.get('auc_roc'), 'pr_auc': metrics.get('pr_auc')},
+        'search': metrics['search'],
+    }, drift_reference=build_reference(X_train))
+    return metrics
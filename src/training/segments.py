@@ -0,0 +1,101 @@
+import datetime
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sklearn.metrics import roc_auc_score
+
+from src.config import settings
+from src.storage import model_registry
+from src.training.pipeline import build_model_pipeline
+from src.training.trainer import prepare_training_data, split_training_data, training_watermark
+from src.training.evaluator import evaluate_model
+from src.prediction.compiled_model import compile_model_pipeline
+from src.prediction.scoring import set_feature_defaults
+from src.monitoring.drift import build_reference, REFERENCE_FILE
+
+# Partitioned (per-segment) models, e.g. one per crm_source (`train --segments`).
+# Historical data is loaded and featurized once, then a model is fitted per value of the
+# partition column. Each segment model is published as an ordinary registry version and its
+# CURRENT@<segment> pointer is moved only if it beats the global CURRENT model on the segment's
+# test rows. The full frame is split once, exactly as full training splits it, so those rows
+# are the global model's held-out rows (as long as the data has not changed since it was
+# trained) and segment models fit on the train side only. Segments that are too small,
+# single-class or not better keep being served by the global model (see prediction/model_router.py).
+
+PARTITION_SETTINGS = settings.get("model", {}).get("partitioning", {})
+PARTITION_BY = PARTITION_SETTINGS.get("partition_by", "crm_source")
+MIN_SEGMENT_SAMPLES = PARTITION_SETTINGS.get("min_segment_samples", 500)
+MIN_AUC_GAIN = PARTITION_SETTINGS.get("min_auc_gain", 0.0) # Segment model must beat the global one by this much
+
+
+def _auc(model_pipeline, X, y) -> Optional[float]:
+    try:
+        return float(roc_auc_score(y, model_pipeline.predict_proba(X)[:, 1]))
+    except ValueError:
+        return None # Only one class in the test split
+
+
+def _load_global_model():
+    version = model_registry.get_current_version()
+    return model_registry.load_version(version) if version else None
+
+
+def train_segment_models(db: Session, partition_by: str = PARTITION_BY, min_samples: int = MIN_SEGMENT_SAMPLES,
+                         min_auc_gain: float = MIN_AUC_GAIN) -> Dict[str, dict]:
+    """Fits, publishes and (if better than the global model) promotes one model per segment. Returns per-segment results."""
+    prepared = prepare_training_data(db)
+    if prepared is None:
+        return {}
+    df, X, y = prepared
+    if partition_by not in df.columns:
+        raise ValueError(f"Partition column '{partition_by}' not found in the training data.")
+    global_model = _load_global_model()
+    # One split of the full frame (the one train_model makes): neither model has seen the test rows
+    _, X_test_all, _, _ = split_training_data(X, y)
+    is_test = X.index.isin(X_test_all.index)
+    results = {}
+
+    for segment, index in df.groupby(partition_by).groups.items():
+        segment = str(segment)
+        X_seg, y_seg = X.loc[index], y.loc[index]
+        seg_test = is_test[X.index.get_indexer(index)]
+        X_train, X_test, y_train, y_test = X_seg[~seg_test], X_seg[seg_test], y_seg[~seg_test], y_seg[seg_test]
+        if len(y_seg) < min_samples or y_train.nunique() < 2 or y_test.nunique() < 2:
+            print(f"Segment {segment}: {len(y_seg)} samples, skipped (served by the global model).")
+            results[segment] = {'status': 'skipped', 'samples': int(len(y_seg))}
+            continue
+
+        print(f"Segment {segment}: training on {len(y_train)} samples, testing on {len(y_test)}...")
+        model_pipeline = build_model_pipeline()
+        model_pipeline.fit(X_train, y_train)
+        set_feature_defaults(model_pipeline, X_train)
+        metrics = evaluate_model(model_pipeline, X_test, y_test, segments=False)
+        segment_auc = metrics.get('auc_roc')
+        global_auc = _auc(global_model, X_test, y_test) if global_model is not None else None
+
+        compiled = None
+        try:
+            compiled = compile_model_pipeline(model_pipeline)
+        except Exception as e:
+            print(f"Warning: could not compile model for segment {segment}: {e}")
+        version = model_registry.publish_model(model_pipeline, metadata={
+            'trained_at': datetime.datetime.utcnow().isoformat(),
+            'trained_through': training_watermark(df.loc[index]),
+            'mode': 'segment',
+            'segment': {'partition_by': partition_by, 'value': segment, 'samples': int(len(y_seg))},
+            'metrics': {'auc_roc': segment_auc, 'pr_auc': metrics.get('pr_auc'), 'global_auc_roc': global_auc},
+        }, compiled_model=compiled, make_current=False, artifacts={REFERENCE_FILE: build_reference(X_train)})
+
+        promote = global_auc is None or (segment_auc is not None and
+                                         not np.isnan(segment_auc) and segment_auc >= global_auc + min_auc_gain)
+        if promote:
+            model_registry.set_current_version(version, segment=segment)
+        else:
+            print(f"Segment {segment}: AUC {segment_auc} does not beat the global model ({global_auc:.4f}); not promoted.")
+        results[segment] = {'status': 'promoted' if promote else 'published', 'version': version,
+                            'samples': int(len(y_seg)), 'auc_roc': segment_auc, 'global_auc_roc': global_auc}
+
+    print(f"Segment training finished: {sum(r['status'] == 'promoted' for r in results.values())} of "
+          f"{len(results)} segments promoted.")
+    return results
@@ -0,0 +1,319 @@
+import argparse
+import datetime
+import os
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+from src.storage.models import LeadStatus
+
+# Vectorized synthetic data generator used for demo training and for benchmarks.
+# Everything is produced as columnar numpy arrays (one dict of arrays per table),
+# so generating millions of leads is a handful of numpy calls instead of a Python loop.
+# Tables produced: vehicles, leads (with CRM source/message fields), status_history, interactions.
+
+VEHICLE_MAKES = np.array(['Toyota', 'Honda', 'Ford', 'Chevrolet', 'BMW', 'Mercedes', 'Other'])
+VEHICLE_MODELS = np.array(['Sedan', 'SUV', 'Truck', 'Coupe'])
+CRM_SOURCES = np.array(['VinSolutions', 'CDK', 'Reynolds'])
+LEAD_SOURCE_PLATFORMS = np.array(['Facebook Marketplace', 'Website', 'Direct'])
+LEAD_SOURCE_PLATFORM_P = [0.9, 0.05, 0.05]
+INITIAL_MESSAGES = np.array([
+    "Is this still available?",
+    "Tell me about pricing options.",
+    "What's the lowest you'll go?",
+    "Interested, can I see it today?",
+    "Do you offer financing?",
+    "Looking to trade my car.",
+])
+INTERACTION_TYPES = np.array(['call', 'email', 'sms', 'visit'])
+
+# Funnel stages an open lead walks through before reaching a terminal status
+STATUS_FUNNEL = np.array([
+    LeadStatus.NEW.value, LeadStatus.CONTACTED.value, LeadStatus.APPOINTMENT.value,
+    LeadStatus.SHOWED.value, LeadStatus.TEST_DRIVE.value, LeadStatus.NEGOTIATION.value,
+])
+
+CONVERSION_RATE = 0.3 # Simulate 30% conversion rate
+STALE_AFTER_DAYS = 90 # Unconverted leads older than this are marked LOST
+
+HOUR = np.timedelta64(1, 'h')
+DAY = np.timedelta64(1, 'D')
+MAX_CLOSE_DELAY = 30 * DAY # Converted leads close within this long after creation
+
+
+def _utcnow() -> np.datetime64:
+    return np.datetime64(datetime.datetime.utcnow().replace(microsecond=0), 'us')
+
+
+def generate_vehicles(num_vehicles: int, seed: int = 42, start_id: int = 1) -> Dict[str, np.ndarray]:
+    """Generates the vehicle inventory table as columnar arrays."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(start_id, start_id + num_vehicles, dtype=np.int64)
+    return {
+        'id': ids,
+        'vin': np.char.add('SYNTH', ids.astype(str)),
+        'make': VEHICLE_MAKES[rng.integers(0, len(VEHICLE_MAKES), num_vehicles)],
+        'model': VEHICLE_MODELS[rng.integers(0, len(VEHICLE_MODELS), num_vehicles)],
+        'year': rng.integers(2010, 2024, num_vehicles),
+        'price': rng.integers(5000, 80000, num_vehicles).astype(np.float64),
+        'mileage': rng.integers(1000, 200000, num_vehicles).astype(np.float64),
+        'days_on_lot': rng.integers(5, 180, num_vehicles),
+    }
+
+
+def _expand(counts: np.ndarray):
+    """Returns (owner_index, position_within_owner) for a flattened one-to-many table."""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    position = np.arange(len(owner)) - np.repeat(starts, counts)
+    return owner, position
+
+
+def generate_lead_chunk(vehicles: Dict[str, np.ndarray], num_leads: int, rng: np.random.Generator,
+                        start_id: int = 1, now: Optional[np.datetime64] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Generates one chunk of leads plus their status history and interactions.
+    Vehicle fields are gathered from the shared `vehicles` table so leads and
+    inventory stay consistent when bulk-loaded into the database.
+    """
+    now = _utcnow() if now is None else now
+    ids = np.arange(start_id, start_id + num_leads, dtype=np.int64)
+
+    is_converted = (rng.random(num_leads) < CONVERSION_RATE).astype(np.int8)
+    converted = is_converted == 1
+    created_at = now - rng.integers(1, 365, num_leads) * DAY - rng.integers(1, 24, num_leads) * HOUR
+
+    # Converted leads close some days after creation; old unconverted leads are LOST, the rest STALE
+    lost = ~converted & ((now - created_at) > STALE_AFTER_DAYS * DAY)
+    closed_at = np.full(num_leads, np.datetime64('NaT'), dtype='datetime64[us]')
+    close_delay = (rng.integers(1, 30, converted.sum()) * DAY
+                   + rng.integers(1, 24, converted.sum()) * HOUR).astype('timedelta64[us]')
+    # Leads younger than their drawn delay close proportionally sooner, so no close time is in the future
+    age = (now - created_at[converted]).astype('timedelta64[us]')
+    too_late = close_delay >= age
+    scale = age[too_late] / MAX_CLOSE_DELAY # < 1, and every drawn delay is < MAX_CLOSE_DELAY
+    close_delay[too_late] = (close_delay[too_late].astype(np.int64) * scale).astype(np.int64).astype('timedelta64[us]')
+    closed_at[converted] = created_at[converted] + close_delay
+    closed_at[lost] = now - rng.integers(1, 30, lost.sum()) * DAY
+    is_closed = converted | lost
+    updated_at = np.where(is_closed, closed_at, now)
+
+    status = np.full(num_leads, LeadStatus.STALE.value, dtype=object)
+    status[converted] = LeadStatus.WON.value
+    status[lost] = LeadStatus.LOST.value
+
+    vehicle_index = rng.integers(0, len(vehicles['id']), num_leads)
+    message_index = rng.integers(0, len(INITIAL_MESSAGES), num_leads)
+    crm_source = CRM_SOURCES[rng.integers(0, len(CRM_SOURCES), num_leads)]
+    num_interactions = rng.integers(1, np.where(converted, 15, 10))
+
+    leads = {
+        'id': ids,
+        'crm_data_fk': ids, # One CRMData row per lead
+        'crm_lead_id': np.char.add('SYNTH-', ids.astype(str)),
+        'vehicle_id': vehicles['id'][vehicle_index],
+        'current_status': status,
+        'initial_message': INITIAL_MESSAGES[message_index],
+        'created_at': created_at,
+        'updated_at': updated_at,
+        'closed_at': closed_at,
+        'is_converted': is_converted,
+        'vehicle_price': vehicles['price'][vehicle_index],
+        'vehicle_mileage': vehicles['mileage'][vehicle_index],
+        'vehicle_make': vehicles['make'][vehicle_index],
+        'days_on_lot': vehicles['days_on_lot'][vehicle_index],
+        'crm_source': crm_source,
+        'lead_source_platform': LEAD_SOURCE_PLATFORMS[rng.choice(len(LEAD_SOURCE_PLATFORMS), num_leads, p=LEAD_SOURCE_PLATFORM_P)],
+        'num_interactions': num_interactions,
+    }
+
+    # --- Status history ---
+    # Each lead walks 1..len(STATUS_FUNNEL) funnel stages; closed leads get one extra terminal row.
+    funnel_steps = rng.integers(1, len(STATUS_FUNNEL) + 1, num_leads)
+    history_counts = funnel_steps + is_closed
+    owner, position = _expand(history_counts)
+    history_status = STATUS_FUNNEL[np.minimum(position, len(STATUS_FUNNEL) - 1)].astype(object)
+    terminal = is_closed[owner] & (position == history_counts[owner] - 1)
+    history_status[terminal] = status[owner[terminal]]
+    # Spread status changes evenly between creation and the last update
+    span = (updated_at - created_at)[owner]
+    fraction = position / np.maximum(history_counts[owner] - 1, 1)
+    status_history = {
+        'lead_id': ids[owner],
+        'status': history_status,
+        'changed_at': created_at[owner] + (span * fraction).astype('timedelta64[us]'),
+    }
+
+    # --- Interactions ---
+    owner, _ = _expand(num_interactions)
+    span = (updated_at - created_at)[owner]
+    interactions = {
+        'lead_id': ids[owner],
+        'type': INTERACTION_TYPES[rng.integers(0, len(INTERACTION_TYPES), len(owner))],
+        'timestamp': created_at[owner] + (span * rng.random(len(owner))).astype('timedelta64[us]'),
+    }
+
+    return {'leads': leads, 'status_history': status_history, 'interactions': interactions}
+
+
+def iter_synthetic_lead_chunks(num_leads: int, vehicles: Dict[str, np.ndarray], chunk_size: int = 1_000_000,
+                               seed: int = 42, start_id: int = 1,
+                               now: Optional[np.datetime64] = None) -> Iterator[Dict[str, Dict[str, np.ndarray]]]:
+    """
+    Yields lead chunks of at most `chunk_size` rows so memory stays bounded at 1M-50M leads.
+    Each chunk gets its own child seed, so output is reproducible for a given seed and chunk size.
+    """
+    now = _utcnow() if now is None else now
+    num_chunks = max(1, -(-num_leads // chunk_size))
+    child_seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+    for i, child_seed in enumerate(child_seeds):
+        size = min(chunk_size, num_leads - i * chunk_size)
+        if size <= 0:
+            break
+        yield generate_lead_chunk(vehicles, size, np.random.default_rng(child_seed),
+                                  start_id=start_id + i * chunk_size, now=now)
+
+
+def default_num_vehicles(num_leads: int) -> int:
+    """Roughly 20 leads per vehicle, like a busy lot."""
+    return max(100, num_leads // 20)
+
+
+def generate_synthetic_leads(num_leads: int, seed: int = 42, num_vehicles: Optional[int] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """Generates all tables in memory (convenient up to a few million leads)."""
+    vehicles = generate_vehicles(num_vehicles or default_num_vehicles(num_leads), seed=seed)
+    chunks = list(iter_synthetic_lead_chunks(num_leads, vehicles, chunk_size=max(num_leads, 1), seed=seed))
+    tables = {'vehicles': vehicles}
+    for name in chunks[0]:
+        tables[name] = {col: np.concatenate([c[name][col] for c in chunks]) for col in chunks[0][name]}
+    return tables
+
+
+def synthetic_leads_dataframe(num_leads: int, seed: int = 42):
+    """Returns the leads table as a DataFrame shaped like `load_historical_data` output."""
+    import pandas as pd
+    leads = generate_synthetic_leads(num_leads, seed=seed)['leads']
+    df = pd.DataFrame(leads)
+    df['predicted_likelihood'] = None # Not predicted yet
+    return df
+
+
+def write_columnar(output_dir: str, num_leads: int, seed: int = 42, chunk_size: int = 1_000_000,
+                   file_format: str = 'parquet', num_vehicles: Optional[int] = None):
+    """
+    Streams synthetic tables to `output_dir`, one file per table.
+    Parquet (requires pyarrow) appends one row group per chunk; 'npz' writes one file per table per chunk.
+    """
+    if file_format == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required for Parquet output. Use file_format='npz' or install pyarrow.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    vehicles = generate_vehicles(num_vehicles or default_num_vehicles(num_leads), seed=seed)
+
+    if file_format == 'npz':
+        np.savez(os.path.join(output_dir, 'vehicles.npz'), **vehicles)
+        for i, chunk in enumerate(iter_synthetic_lead_chunks(num_leads, vehicles, chunk_size, seed)):
+            for name, columns in chunk.items():
+                np.savez(os.path.join(output_dir, f'{name}-{i:05d}.npz'),
+                         **{col: (arr.astype(str) if arr.dtype == object else arr) for col, arr in columns.items()})
+        print(f"Wrote {num_leads} synthetic leads as npz chunks to {output_dir}")
+        return
+
+    pq.write_table(pa.table(vehicles), os.path.join(output_dir, 'vehicles.parquet'))
+    writers = {}
+    try:
+        for chunk in iter_synthetic_lead_chunks(num_leads, vehicles, chunk_size, seed):
+            for name, columns in chunk.items():
+                table = pa.table(columns)
+                if name not in writers:
+                    writers[name] = pq.ParquetWriter(os.path.join(output_dir, f'{name}.parquet'), table.schema)
+                writers[name].write_table(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    print(f"Wrote {num_leads} synthetic leads as Parquet to {output_dir}")
+
+
+def _to_python(arr: np.ndarray) -> list:
+    """Converts a numpy column to Python values for DB inserts (NaT -> None)."""
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype('datetime64[us]').tolist()
+    return arr.tolist()
+
+
+def _rows(columns: Dict[str, np.ndarray]) -> list:
+    names = list(columns)
+    values = [_to_python(columns[name]) for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def bulk_load_to_db(db, num_leads: int, seed: int = 42, chunk_size: int = 100_000, num_vehicles: Optional[int] = None):
+    """
+    Bulk-inserts synthetic vehicles, CRMData and Leads using executemany inserts per chunk.
+    IDs continue after the current max IDs, so it can be run against a non-empty database.
+    Status history and interactions have no tables yet and are not loaded.
+    """
+    from sqlalchemy import func, insert
+    from src.storage.models import CRMData, Lead, Vehicle
+
+    vehicle_start = (db.query(func.max(Vehicle.id)).scalar() or 0) + 1
+    lead_start = max((db.query(func.max(Lead.id)).scalar() or 0), (db.query(func.max(CRMData.id)).scalar() or 0)) + 1
+
+    vehicles = generate_vehicles(num_vehicles or default_num_vehicles(num_leads), seed=seed, start_id=vehicle_start)
+    vehicles_db = dict(vehicles)
+    vehicles_db['vin'] = np.char.add(vehicles['vin'], f'-{seed}') # Keep VINs unique across repeated loads
+    db.execute(insert(Vehicle), _rows(vehicles_db))
+
+    status_lookup = {status.value: status for status in LeadStatus}
+    loaded = 0
+    for chunk in iter_synthetic_lead_chunks(num_leads, vehicles, chunk_size, seed, start_id=lead_start):
+        leads = chunk['leads']
+        db.execute(insert(CRMData), _rows({
+            'id': leads['crm_data_fk'],
+            'crm_lead_id': leads['crm_lead_id'],
+            'crm_source': leads['crm_source'],
+            'created_at': leads['created_at'],
+            'updated_at': leads['updated_at'],
+        }))
+        lead_rows = _rows({
+            'id': leads['id'],
+            'crm_data_fk': leads['crm_data_fk'],
+            'vehicle_id': leads['vehicle_id'],
+            'initial_message': leads['initial_message'],
+            'created_at': leads['created_at'],
+            'updated_at': leads['updated_at'],
+            'closed_at': leads['closed_at'],
+            'is_converted': leads['is_converted'],
+        })
+        for row, status in zip(lead_rows, leads['current_status']):
+            row['current_status'] = status_lookup[status]
+        db.execute(insert(Lead), lead_rows)
+        db.commit()
+        loaded += len(lead_rows)
+        print(f"Loaded {loaded}/{num_leads} synthetic leads...")
+    print(f"Bulk-loaded {loaded} synthetic leads and {len(vehicles['id'])} vehicles.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic leads for benchmarks")
+    parser.add_argument("--num-leads", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--output-dir", help="Write columnar files to this directory")
+    parser.add_argument("--format", choices=["parquet", "npz"], default="parquet")
+    parser.add_argument("--load-db", action="store_true", help="Bulk-load leads into the configured database")
+    args = parser.parse_args()
+
+    if args.output_dir:
+        write_columnar(args.output_dir, args.num_leads, seed=args.seed, chunk_size=args.chunk_size, file_format=args.format)
+    if args.load_db:
+        from src.storage.database import SessionLocal
+        db = SessionLocal()
+        try:
+            bulk_load_to_db(db, args.num_leads, seed=args.seed, chunk_size=min(args.chunk_size, 100_000))
+        finally:
+            db.close()
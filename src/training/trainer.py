@@ -3,14 +3,22 @@ from sqlalchemy.orm import Session
 from src.storage.database import get_db, SessionLocal # Need SessionLocal for script usage
 from src.storage.models import Lead, Vehicle, CRMData, LeadStatus
 from src.processing.data_cleaning import clean_data # Import cleaning
-from src.processing.feature_engineering import create_raw_features, NUMERICAL_FEATURES, CATEGORICAL_FEATURES # Import feature creation
+from src.processing.feature import create_raw_features, NUMERICAL_FEATURES, CATEGORICAL_FEATURES # Import feature creation
 from src.training.pipeline import build_model_pipeline
 from src.training.evaluator import evaluate_model
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.prediction.compiled_model import compile_model_pipeline, save_compiled_model, COMPILED_MODEL_PATH
+from src.prediction.scoring import set_feature_defaults
+from src.storage.model_registry import publish_model
+from src.monitoring.drift import build_reference, REFERENCE_FILE
+from src.monitoring.metrics import timed
+from src.monitoring.profiling import profile_stage
 from src.config import settings
 from sklearn.model_selection import train_test_split
 import joblib
 import os
 import datetime
+import json
 import numpy as np
 
 MODEL_PATH = settings.get("model", {}).get("path")
@@ -18,6 +26,8 @@ if MODEL_PATH is None:
      raise ValueError("Model path not specified in settings.yaml")
 MODEL_DIR = os.path.dirname(MODEL_PATH)
 os.makedirs(MODEL_DIR, exist_ok=True)
+# Training metadata (watermark, metrics) stored next to the model artifact
+MODEL_METADATA_PATH = os.path.splitext(MODEL_PATH)[0] + "_metadata.json"
 
 
 def load_historical_data(db: Session) -> pd.DataFrame:
@@ -60,58 +70,10 @@ def load_historical_data(db: Session) -> pd.DataFrame:
     #      data.append(row)
 
     # --- Synthetic Data Generation for Demo ---
+    # Vectorized generator (see synthetic_data.py); also used for large-scale benchmarks.
     print("Generating synthetic training data...")
     num_samples = 1000
-    data = []
-    for i in range(num_samples):
-        is_converted = np.random.choice([0, 1], p=[0.7, 0.3]) # Simulate 30% conversion rate
-        created_at = datetime.datetime.utcnow() - datetime.timedelta(days=np.random.randint(1, 365), hours=np.random.randint(1, 24))
-        closed_at = None
-        status = LeadStatus.STALE.value if is_converted == 0 else LeadStatus.WON.value
-        if is_converted == 1:
-             closed_at = created_at + datetime.timedelta(days=np.random.randint(1, 30), hours=np.random.randint(1, 24))
-             status = LeadStatus.WON.value
-        elif (datetime.datetime.utcnow() - created_at).total_seconds() / (3600 * 24) > 90: # Older than 90 days, mark LOST/STALE
-            closed_at = datetime.datetime.utcnow() - datetime.timedelta(days=np.random.randint(1, 30))
-            status = LeadStatus.LOST.value # Or STALE
-
-
-        vehicle_id = np.random.randint(1, 100) # Dummy vehicle ID
-        vehicle_price = np.random.randint(5000, 80000)
-        vehicle_mileage = np.random.randint(1000, 200000)
-        vehicle_make = np.random.choice(['Toyota', 'Honda', 'Ford', 'Chevrolet', 'BMW', 'Mercedes', 'Other'])
-        days_on_lot = np.random.randint(5, 180)
-
-        # Simulate interaction count
-        num_interactions = np.random.randint(1, 15 if is_converted == 1 else 10)
-        # Simulate initial message length
-        initial_message_length = np.random.randint(20, 500)
-
-        data.append({
-            'id': i + 1, # Dummy ID
-            'crm_data_fk': i + 1, # Dummy FK
-            'vehicle_id': vehicle_id,
-            'current_status': status,
-            'initial_message': 'This is a simulated message ' * (initial_message_length // 30), # Make message length somewhat realistic
-            'created_at': created_at,
-            'updated_at': closed_at if closed_at else datetime.datetime.utcnow(), # Use closed_at for conversion, otherwise current time
-            'closed_at': closed_at,
-            'is_converted': is_converted,
-            'predicted_likelihood': None, # Not predicted yet
-
-            # Vehicle fields (simulate joining)
-            'vehicle_price': float(vehicle_price),
-            'vehicle_mileage': float(vehicle_mileage),
-            'vehicle_make': vehicle_make,
-            'days_on_lot': days_on_lot,
-
-            # Other potential features to simulate
-            'crm_source': np.random.choice(['VinSolutions', 'CDK', 'Reynolds']),
-            'lead_source_platform': 'Facebook Marketplace', # Or sometimes Direct, Website etc.
-            'num_interactions': num_interactions # Requires Interaction data in real DB
-        })
-
-    df = pd.DataFrame(data)
+    df = synthetic_leads_dataframe(num_samples)
     print(f"Generated {len(df)} synthetic samples.")
 
     # Calculate lead_age_hours for synthetic data
@@ -120,19 +82,28 @@ def load_historical_data(db: Session) -> pd.DataFrame:
     # We will use the create_raw_features function which handles datetime conversion
     return df
 
-def train_model(db: Session):
-    """Orchestrates the model training process."""
-    print("Starting model training process...")
-
+def prepare_training_data(db: Session):
+    """
+    Loads, cleans and featurizes historical data.
+    Returns (df, X, y) where X holds the raw columns fed into the preprocessor,
+    or None if there is no data. Shared by full training, search and backtesting.
+    """
     # 1. Load Data
-    df = load_historical_data(db)
+    with timed('train.load'):
+        df = load_historical_data(db)
 
     if df.empty:
         print("No historical data found for training.")
-        return
+        return None
+
+    return featurize_training_data(df)
+
 
+def featurize_training_data(df: pd.DataFrame):
+    """Cleans and featurizes a historical DataFrame. Returns (df, X, y)."""
     # 2. Clean Data (Optional, could be part of pipeline)
-    df = clean_data(df.copy())
+    with timed('train.clean'):
+        df = clean_data(df.copy())
 
     # 3. Create Raw Features (Fields like lead_age_hours, message_length etc.)
     # Note: For `lead_age_hours` in training, we use `closed_at` if available,
@@ -149,7 +120,8 @@ def train_model(db: Session):
     df['time_of_prediction'] = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
 
 
-    df = create_raw_features(df.copy())
+    with timed('train.features'):
+        df = create_raw_features(df.copy())
 
 
     # Ensure all expected feature columns exist after raw feature creation
@@ -158,9 +130,9 @@ def train_model(db: Session):
          if col not in df.columns:
               print(f"Warning: Feature column '{col}' not found in DataFrame. Will use dummy values.")
               if col in NUMERICAL_FEATURES:
-                   df[col] = df[col].fillna(0.0) # Or median/mean from historical data
+                   df[col] = 0.0 # Or median/mean from historical data
               elif col in CATEGORICAL_FEATURES:
-                   df[col] = df[col].fillna('Missing')
+                   df[col] = 'Missing'
 
 
     # Select features (X) and target (y)
@@ -171,44 +143,170 @@ def train_model(db: Session):
     # and pass them here. Let's refine feature_engineering.py to expose these lists.
     X = df[NUMERICAL_FEATURES + CATEGORICAL_FEATURES].copy() # Select the columns to be fed into the preprocessor
     y = df['is_converted']
+    return df, X, y
 
 
-    # 4. Split Data
+def split_training_data(X, y):
+    """Random stratified train/test split used by full training and search."""
     print("Splitting data...")
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
     print(f"Train samples: {len(X_train)}, Test samples: {len(X_test)}")
     print(f"Train conversion rate: {y_train.mean():.4f}, Test conversion rate: {y_test.mean():.4f}")
+    return X_train, X_test, y_train, y_test
+
+
+def save_model_pipeline(model_pipeline, metadata: dict = None, path: str = MODEL_PATH,
+                        compiled_path: str = COMPILED_MODEL_PATH, publish: bool = True,
+                        drift_reference: dict = None):
+    """
+    Saves a fitted model pipeline (and its compiled numpy scoring artifact).
+    Files are written to a temp name and os.replace'd, so readers never see a partial file.
+    The model is also published as a new version in the model registry and made CURRENT,
+    which the running API picks up without a restart.
+    `drift_reference` (training feature histograms, see monitoring/drift.py) is stored with the version.
+    """
+    # Export step: compiled artifact for the low-latency numpy scorer
+    compiled = None
+    try:
+        compiled = compile_model_pipeline(model_pipeline)
+    except Exception as e:
+        print(f"Warning: could not compile model pipeline: {e}")
+
+    print(f"Saving model pipeline to {path}...")
+    try:
+        tmp_path = f"{path}.tmp"
+        joblib.dump(model_pipeline, tmp_path)
+        os.replace(tmp_path, path)
+        print("Model pipeline saved successfully.")
+        if compiled is not None:
+            save_compiled_model(compiled, f"{compiled_path}.tmp")
+            os.replace(f"{compiled_path}.tmp", compiled_path)
+            print(f"Compiled scoring artifact saved to {compiled_path}.")
+    except Exception as e:
+        print(f"Error saving model: {e}")
+
+    if metadata is not None:
+        save_model_metadata(metadata)
+    if publish:
+        try:
+            artifacts = {REFERENCE_FILE: drift_reference} if drift_reference is not None else None
+            return publish_model(model_pipeline, metadata=metadata, compiled_model=compiled, artifacts=artifacts)
+        except Exception as e:
+            print(f"Error publishing model to registry: {e}")
+
+
+def load_closed_leads(db: Session, since: datetime.datetime = None) -> pd.DataFrame:
+    """
+    Loads leads that reached WON/LOST (optionally only those closed after `since`)
+    with their vehicle and CRM fields, in the same column layout as load_historical_data.
+    """
+    query = db.query(
+        Lead.id, Lead.crm_data_fk, Lead.vehicle_id, Lead.current_status, Lead.initial_message,
+        Lead.created_at, Lead.updated_at, Lead.closed_at, Lead.is_converted,
+        Vehicle.price.label('vehicle_price'), Vehicle.mileage.label('vehicle_mileage'),
+        Vehicle.make.label('vehicle_make'), Vehicle.days_on_lot,
+        CRMData.crm_source,
+    ).join(Vehicle, Lead.vehicle_id == Vehicle.id)\
+     .join(CRMData, Lead.crm_data_fk == CRMData.id)\
+     .filter(Lead.current_status.in_([LeadStatus.WON, LeadStatus.LOST]))\
+     .filter(Lead.closed_at.isnot(None))
+    if since is not None:
+        query = query.filter(Lead.closed_at > since)
+
+    df = pd.DataFrame(query.order_by(Lead.closed_at).all(), columns=[
+        'id', 'crm_data_fk', 'vehicle_id', 'current_status', 'initial_message',
+        'created_at', 'updated_at', 'closed_at', 'is_converted',
+        'vehicle_price', 'vehicle_mileage', 'vehicle_make', 'days_on_lot', 'crm_source'])
+    if not df.empty:
+        df['current_status'] = df['current_status'].map(lambda s: s.value)
+        df['is_converted'] = (df['current_status'] == LeadStatus.WON.value).astype(int)
+        df['lead_source_platform'] = 'Facebook Marketplace' # All ingested leads come from FBMP today
+    print(f"Loaded {len(df)} closed leads" + (f" since {since}." if since else "."))
+    return df
+
+
+def load_model_metadata(path: str = MODEL_METADATA_PATH) -> dict:
+    """Loads the training metadata saved next to the model, or {} if there is none."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_model_metadata(metadata: dict, path: str = MODEL_METADATA_PATH):
+    """Saves training metadata (watermark, metrics) as JSON next to the model."""
+    with open(path, 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+
+
+def training_watermark(df: pd.DataFrame) -> str:
+    """Latest close time covered by a training set (ISO string), used as the incremental watermark."""
+    closed_at = pd.to_datetime(df['closed_at'], errors='coerce', utc=True) if 'closed_at' in df.columns else None
+    if closed_at is None or closed_at.isna().all():
+        return datetime.datetime.utcnow().isoformat()
+    # Never in the future (clock skew, bad CRM data): leads closing later would be skipped forever
+    return min(closed_at.max(), pd.Timestamp.now(tz='UTC')).tz_convert(None).isoformat()
+
+
+@profile_stage('train_model')
+def train_model(db: Session):
+    """Orchestrates the model training process."""
+    print("Starting model training process...")
+
+    # 1-3. Load, clean and featurize
+    prepared = prepare_training_data(db)
+    if prepared is None:
+        return
+    df, X, y = prepared
+
+
+    # 4. Split Data
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
 
 
     # 5. Build & Train Model Pipeline
     print("Building and training model pipeline...")
     model_pipeline = build_model_pipeline()
-    model_pipeline.fit(X_train, y_train)
+    with timed('train.fit'):
+        model_pipeline.fit(X_train, y_train)
+    set_feature_defaults(model_pipeline, X_train)
     print("Training complete.")
 
 
     # 6. Evaluate Model
-    metrics = evaluate_model(model_pipeline, X_test, y_test)
+    with timed('train.evaluate'):
+        metrics = evaluate_model(model_pipeline, X_test, y_test)
 
 
-    # 7. Save Model Pipeline
-    print(f"Saving model pipeline to {MODEL_PATH}...")
-    try:
-        joblib.dump(model_pipeline, MODEL_PATH)
-        print("Model pipeline saved successfully.")
-    except Exception as e:
-        print(f"Error saving model: {e}")
+    # 7. Save Model Pipeline with the watermark for incremental retraining
+    save_model_pipeline(model_pipeline, metadata={
+        'trained_at': datetime.datetime.utcnow().isoformat(),
+        'trained_through': training_watermark(df),
+        'mode': 'full',
+        'metrics': {'auc_roc': metrics.get('auc_roc'), 'pr_auc': metrics.get('pr_auc')},
+    }, drift_reference=build_reference(X_train))
 
     print("Model training process finished.")
     return metrics # Optional: return metrics
 
 
 # Helper function to run training directly from script
-def train_model_script():
-    """Helper to run train_model using a database session."""
+@profile_stage('train')
+def train_model_script(search: bool = False, incremental: bool = False, segments: bool = False, **search_kwargs):
+    """Helper to run train_model (or the hyperparameter search / incremental update / per-segment models) using a database session."""
     db = SessionLocal()
     try:
-        train_model(db)
+        if segments:
+            from src.training.segments import train_segment_models
+            train_segment_models(db)
+        elif search:
+            from src.training.search import search_model
+            search_model(db, **search_kwargs)
+        elif incremental:
+            from src.training.incremental import train_incremental
+            train_incremental(db)
+        else:
+            train_model(db)
     finally:
         db.close()
 
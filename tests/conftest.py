@@ -0,0 +1,56 @@
+import datetime
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.storage.models import Base, Lead, Vehicle, CRMData
+
+# Shared fixtures and stand-ins. Test modules keep their own rows (see add_leads).
+
+
+class FakeClock:
+    """Callable clock whose time the test sets (`clock.now = 61`)."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class PriceModel:
+    """predict_proba stand-in scoring vehicle_price / 100k; records the chunk sizes it was called with."""
+    def __init__(self):
+        self.chunk_sizes = []
+
+    def predict_proba(self, X):
+        self.chunk_sizes.append(len(X))
+        p = X['vehicle_price'].to_numpy() / 100000.0
+        return np.column_stack([1 - p, p])
+
+
+@pytest.fixture
+def db_session():
+    """Session on a fresh in-memory SQLite database with every table created."""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def add_leads(db_session):
+    """Adds CDK leads L0, L1, ... (one per dict of Lead fields) on one Toyota vehicle and commits."""
+    def add(leads):
+        vehicle = Vehicle(make="Toyota", price=20000.0, mileage=30000, days_on_lot=12)
+        db_session.add(vehicle)
+        db_session.flush()
+        for i, fields in enumerate(leads):
+            crm_data = CRMData(crm_lead_id=f"L{i}", crm_source="CDK")
+            db_session.add(crm_data)
+            db_session.flush()
+            db_session.add(Lead(crm_data_fk=crm_data.id, vehicle_id=vehicle.id,
+                                **dict({'created_at': datetime.datetime(2026, 10, 1)}, **fields)))
+        db_session.commit()
+    return add
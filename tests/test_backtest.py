@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+from src.training.backtest import rolling_origin_splits, run_backtest
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data
+
+
+# --- Tests ---
+def test_training_folds_only_use_outcomes_known_at_the_origin():
+    raw = synthetic_leads_dataframe(1500, seed=7)
+    closed = raw['closed_at'].notna() # Close every lead 0-60 days after creation, won or lost
+    delays = np.random.default_rng(7).integers(0, 60 * 24, closed.sum()) * np.timedelta64(1, 'h')
+    raw.loc[closed, 'closed_at'] = raw.loc[closed, 'created_at'] + delays
+    df, X, y = featurize_training_data(raw)
+    results = run_backtest(df, X, y, n_folds=3, n_jobs=1, classifier_params={'n_estimators': 10, 'max_depth': 3})
+    assert len(results) == 3
+
+    created_at = pd.to_datetime(df['created_at'], utc=True)
+    closed_at = pd.to_datetime(df['closed_at'], utc=True)
+    order = np.argsort(created_at.values, kind='stable')
+    for result, (train_start, train_end, test_start, _) in zip(results.to_dict('records'),
+                                                               rolling_origin_splits(len(df), n_folds=3)):
+        origin = created_at.iloc[order[test_start]]
+        assert pd.Timestamp(result['test_from']) == origin.tz_convert(None)
+        window = closed_at.iloc[order[train_start:train_end]]
+        # Leads created before the origin but closed after it (or still open) are left out
+        assert result['n_train'] == (window < origin).sum() < train_end - train_start
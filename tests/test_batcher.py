@@ -0,0 +1,65 @@
+import asyncio
+import numpy as np
+from src.prediction.batcher import MicroBatcher
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+# --- Tests ---
+def test_concurrent_requests_are_coalesced():
+    batch_sizes = []
+
+    def score_batch(records):
+        batch_sizes.append(len(records))
+        return np.array([record['x'] * 0.1 for record in records])
+
+    async def main():
+        batcher = MicroBatcher(score_batch, max_wait_ms=20, max_batch_size=8)
+        batcher.start()
+        scores = await asyncio.gather(*[batcher.submit({'x': i}) for i in range(20)])
+        stats = batcher.stats()
+        await batcher.stop()
+        return scores, stats
+
+    scores, stats = _run(main())
+    np.testing.assert_allclose(scores, [i * 0.1 for i in range(20)]) # Each request gets its own score
+    assert max(batch_sizes) <= 8
+    assert len(batch_sizes) < 20
+    assert stats['rows'] == 20 and stats['batches'] == len(batch_sizes)
+    assert stats['latency_ms']['p99'] is not None
+
+def test_scoring_error_reaches_every_request_in_batch():
+    def score_batch(records):
+        raise KeyError('vehicle_price')
+
+    async def main():
+        batcher = MicroBatcher(score_batch, max_wait_ms=5)
+        batcher.start()
+        results = await asyncio.gather(*[batcher.submit({}) for _ in range(3)], return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, KeyError) for result in _run(main()))
+
+def test_bad_record_fails_alone_and_stop_scores_queued_requests():
+    def score_batch(records):
+        if any(record['x'] < 0 for record in records):
+            raise ValueError('negative input')
+        return np.array([record['x'] * 0.1 for record in records])
+
+    async def main():
+        batcher = MicroBatcher(score_batch, max_wait_ms=20, max_batch_size=8)
+        batcher.start()
+        results = await asyncio.gather(*[batcher.submit({'x': x}) for x in (1, -1, 2)], return_exceptions=True)
+        fallbacks = batcher.stats()['fallbacks']
+        pending = [asyncio.ensure_future(batcher.submit({'x': x})) for x in (3, 4)]
+        await asyncio.sleep(0) # Queued, still inside the batching window
+        await batcher.stop()
+        return results, fallbacks, await asyncio.wait_for(asyncio.gather(*pending), 1)
+
+    results, fallbacks, drained = _run(main())
+    assert results[0] == 0.1 and isinstance(results[1], ValueError) and results[2] == 0.2
+    assert fallbacks == 1
+    np.testing.assert_allclose(drained, [0.3, 0.4])
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from src.storage.models import Lead, LeadStatus, WritebackOutbox
+from src.prediction.bulk_scoring import iter_open_lead_chunks, changed_for_crm, write_chunk
+
+
+@pytest.fixture
+def db(db_session, add_leads):
+    statuses = [LeadStatus.NEW, LeadStatus.WON, LeadStatus.CONTACTED, LeadStatus.LOST, LeadStatus.STALE, LeadStatus.NEW]
+    add_leads([{'current_status': status, 'crm_written_score': 0.3 if i == 2 else None} for i, status in enumerate(statuses)])
+    return db_session
+
+
+# --- Tests ---
+def test_open_leads_are_paged_by_id(db):
+    chunks = list(iter_open_lead_chunks(db, chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert [lead for chunk in chunks for lead in chunk['crm_lead_id']] == ["L0", "L2", "L4", "L5"]
+    assert chunks[0]['vehicle_make'].tolist() == ["Toyota", "Toyota"]
+
+def test_only_changed_scores_are_queued_for_writeback(db):
+    chunk = next(iter_open_lead_chunks(db, chunk_size=2)) # L0 never written, L2 written at 0.3
+    assert write_chunk(db, chunk, np.array([0.6, 0.31]), writeback=True) == 1
+    assert [row.crm_lead_id for row in db.query(WritebackOutbox)] == ["L0"]
+    assert sorted(score for score, in db.query(Lead.predicted_likelihood).filter(Lead.predicted_likelihood.isnot(None))) == [0.31, 0.6]
+
+    written = np.array([np.nan, 0.30, 0.30, 0.24])
+    np.testing.assert_array_equal(changed_for_crm(np.array([0.1, 0.31, 0.33, 0.26]), written, threshold=0.02, bands=[0.25]),
+                                  [True, False, True, True])
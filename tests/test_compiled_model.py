@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+import pandas as pd
+from src.training.pipeline import build_model_pipeline
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data
+from src.prediction.compiled_model import compile_model_pipeline, save_compiled_model, load_compiled_model
+
+
+@pytest.fixture(scope="module")
+def training_data():
+    df, X, y = featurize_training_data(synthetic_leads_dataframe(2000, seed=1))
+    return X, y
+
+
+# --- Tests ---
+def test_compiled_scores_match_pipeline(training_data):
+    X, y = training_data
+    pipeline = build_model_pipeline(n_estimators=50, max_depth=5)
+    pipeline.fit(X, y)
+    compiled = compile_model_pipeline(pipeline)
+
+    expected = pipeline.predict_proba(X)[:, 1]
+    actual = compiled.predict_proba(X)[:, 1]
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+def test_compiled_handles_unknown_category_and_missing(training_data):
+    X, y = training_data
+    pipeline = build_model_pipeline(n_estimators=20)
+    pipeline.fit(X, y)
+    compiled = compile_model_pipeline(pipeline)
+
+    X_new = X.head(20).copy()
+    X_new['vehicle_make'] = 'NeverSeenMake'
+    X_new.loc[X_new.index[:5], 'vehicle_mileage'] = np.nan
+    np.testing.assert_allclose(compiled.predict_proba(X_new)[:, 1], pipeline.predict_proba(X_new)[:, 1], atol=1e-6)
+
+def test_compiled_round_trip(tmp_path, training_data):
+    X, y = training_data
+    pipeline = build_model_pipeline(n_estimators=10)
+    pipeline.fit(X, y)
+    path = tmp_path / "compiled.joblib"
+    save_compiled_model(compile_model_pipeline(pipeline), str(path))
+
+    loaded = load_compiled_model(str(path))
+    row = {col: X[col].to_numpy()[:1] for col in X.columns}
+    assert loaded.predict_proba(row)[0, 1] == pytest.approx(pipeline.predict_proba(X.head(1))[0, 1], abs=1e-6)
+
+def test_memory_mapped_load_scores_the_same(tmp_path, training_data):
+    X, y = training_data
+    pipeline = build_model_pipeline(n_estimators=10)
+    pipeline.fit(X, y)
+    path = tmp_path / "compiled.joblib"
+    save_compiled_model(compile_model_pipeline(pipeline), str(path))
+
+    mapped = load_compiled_model(str(path), mmap_mode='r')
+    trees = mapped.artifact['trees']
+    assert any(isinstance(v, np.memmap) for v in trees.values())
+    np.testing.assert_allclose(mapped.predict_proba(X)[:, 1], pipeline.predict_proba(X)[:, 1], atol=1e-6)
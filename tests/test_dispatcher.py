@@ -0,0 +1,91 @@
+import asyncio
+import time
+import pytest
+from conftest import FakeClock
+from src.crm_writeback import writeback_manager
+from src.crm_writeback.dispatcher import CircuitBreaker, CircuitOpenError, CrmLane, lane_config
+from src.crm_writeback.stub_server import CrmStubHandler, http_sender, start_stub_server
+
+
+class SlowApi:
+    """Bulk CRM client whose calls take `seconds` unless their timeout is shorter."""
+    MAX_BATCH_SIZE = 25
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.timeouts = []
+
+    def update_lead_scores(self, scores, timeout=10):
+        self.timeouts.append(timeout)
+        time.sleep(min(self.seconds, timeout))
+        if timeout < self.seconds:
+            raise TimeoutError("read timed out")
+
+
+# --- Tests ---
+def test_breaker_opens_on_error_rate_and_recovers_through_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=4, window_seconds=30, open_seconds=10, clock=clock)
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(ok)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    clock.now = 11
+    assert breaker.allow() # Half-open: a single probe
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+def test_slow_crm_times_out_without_delaying_another_lane(monkeypatch):
+    config = dict(lane_config('Reynolds'), timeout_seconds=0.2, min_calls=1, error_rate=1.0)
+    api = SlowApi(seconds=1.0)
+    monkeypatch.setitem(writeback_manager._api_instances, 'Reynolds', api)
+    slow = CrmLane('Reynolds', None, config=config)
+    fast = CrmLane('CDK', None, send=lambda crm_source, scores, timeout: None, config=dict(config))
+
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(slow.send([('A', 0.5)]), fast.send([('B', 0.5)]), return_exceptions=True)
+        fast_done = time.perf_counter() - started
+        with pytest.raises(CircuitOpenError): # One timeout at error_rate 1.0 opens Reynolds' breaker
+            await slow.send([('A', 0.5)])
+        return results, fast_done
+
+    (slow_result, fast_result), fast_done = asyncio.run(main())
+    assert isinstance(slow_result, TimeoutError) and fast_result is None
+    assert fast_done < 0.5
+    assert slow.stats()['timeouts'] == 1 and fast.stats()['breaker'] == CircuitBreaker.CLOSED
+    assert len(api.timeouts) == 1 and api.timeouts[0] <= 0.2 # The HTTP call itself gave up, not just the lane
+    slow.shutdown()
+    fast.shutdown()
+
+
+def test_send_deadline_covers_every_chunk(monkeypatch):
+    api = SlowApi(seconds=0.1)
+    monkeypatch.setitem(writeback_manager._api_instances, 'Reynolds', api)
+    with pytest.raises(TimeoutError):
+        writeback_manager.send_scores_to_crm('Reynolds', [(str(i), 0.5) for i in range(75)], timeout=0.25)
+    # Each call gets only the time left; the third chunk's call runs into the deadline
+    assert len(api.timeouts) == 3 and api.timeouts[0] > api.timeouts[1] > api.timeouts[2]
+
+
+def test_lanes_write_back_through_the_http_stub():
+    server = start_stub_server(port=0, faults={'Reynolds': {'latency_ms': 1000}})
+    send = http_sender(f"http://127.0.0.1:{server.server_address[1]}")
+    config = dict(lane_config('CDK'), timeout_seconds=0.3)
+    healthy = CrmLane('CDK', None, send=send, config=config)
+    slow = CrmLane('Reynolds', None, send=send, config=dict(config))
+
+    async def main():
+        return await asyncio.gather(healthy.send([('A', 0.5), ('B', 0.7)]), slow.send([('C', 0.1)]), return_exceptions=True)
+
+    try:
+        healthy_result, slow_result = asyncio.run(main())
+    finally:
+        server.shutdown()
+        healthy.shutdown()
+        slow.shutdown()
+    assert healthy_result is None and isinstance(slow_result, TimeoutError)
+    assert CrmStubHandler.received == {'CDK': 2}
+    assert healthy.stats()['timeouts'] == 0 and slow.stats()['timeouts'] == 1
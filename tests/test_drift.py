@@ -0,0 +1,69 @@
+import numpy as np
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data
+from src.training.pipeline import build_model_pipeline
+from src.prediction.scoring import prepare_features, records_to_frame, set_feature_defaults
+from src.monitoring.drift import DriftMonitor, build_reference
+
+
+def _inputs(n, seed):
+    _, X, _ = featurize_training_data(synthetic_leads_dataframe(n, seed=seed))
+    return X
+
+
+# --- Tests ---
+def test_price_shift_in_one_crm_source_is_reported_for_that_segment():
+    X = _inputs(7000, seed=1).sample(frac=1.0, random_state=0) # Same population for reference and live
+    reference = build_reference(X.iloc[:4000])
+    assert reference['features']['vehicle_price']['type'] == 'numeric'
+    assert reference['features']['crm_source']['type'] == 'categorical' and reference['segments']
+
+    live = X.iloc[4000:].copy()
+    shifted = live['crm_source'] == 'CDK'
+    live.loc[shifted, 'vehicle_price'] *= 1.6 # One CRM's dealers reprice
+    monitor = DriftMonitor(reference, min_rows=50)
+    for start in range(0, len(live), 100):
+        monitor.observe(live.iloc[start:start + 100])
+    report = monitor.report()
+
+    assert report['live_rows'] == len(live)
+    cdk = report['segments']['CDK']['features']
+    assert cdk['vehicle_price']['status'] == 'alert' and cdk['vehicle_price']['ks'] > 0.2
+    assert cdk['vehicle_mileage']['status'] == 'ok'
+    others = [segment for segment in report['segments'] if segment != 'CDK']
+    assert others and all(report['segments'][s]['features']['vehicle_price']['status'] == 'ok' for s in others)
+
+
+def test_live_counts_are_bounded_and_roll_over_by_window():
+    now = [0.0]
+    reference = build_reference(_inputs(1000, seed=3))
+    monitor = DriftMonitor(reference, window_hours=1, max_segments=3, clock=lambda: now[0])
+    X = _inputs(500, seed=4)
+    X['crm_source'] = [f"source-{i}" for i in range(len(X))] # Far more segments than slots
+    monitor.observe(X)
+    assert monitor.report()['live_rows'] == 500 and len(monitor.report()['segments']) == 3
+
+    now[0] += 3600
+    monitor.observe(X.head(10)) # Starts a new window; the last full one is kept
+    now[0] += 3600
+    monitor.observe(X.head(10))
+    assert monitor.report()['live_rows'] == 20
+    counts = np.array(reference['features']['vehicle_price']['counts'])
+    assert counts.sum() == 1000
+
+
+def test_inputs_imputed_by_prepare_features_are_not_counted_as_drift():
+    df = synthetic_leads_dataframe(3000, seed=6).sample(frac=1.0, random_state=0)
+    _, X, y = featurize_training_data(df.iloc[:2000])
+    pipeline = set_feature_defaults(build_model_pipeline(n_estimators=10, max_depth=3).fit(X, y), X)
+    monitor = DriftMonitor(build_reference(X), min_rows=50)
+
+    # API-style records: same population, but no initial_message (its length is imputed)
+    records = df.iloc[2000:].drop(columns=['initial_message']).to_dict('records')
+    live = prepare_features(records_to_frame(records), pipeline)
+    assert (live['initial_message_length'] == pipeline.feature_defaults_['initial_message_length']).all()
+    monitor.observe(live)
+    report = monitor.report()
+    assert report['features']['initial_message_length']['status'] == 'insufficient_data'
+    assert report['features']['vehicle_price']['status'] == 'ok'
+    assert report['status'] == 'ok'
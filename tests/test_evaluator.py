@@ -0,0 +1,44 @@
+import pytest
+import numpy as np
+from sklearn.metrics import roc_auc_score, precision_recall_curve, auc, classification_report, confusion_matrix, log_loss
+from src.training.evaluator import binary_metrics, bootstrap_ci, segment_metrics, lead_age_bucket
+
+# Synthetic scores with ties (rounded) and some signal
+rng = np.random.default_rng(0)
+y_true = rng.integers(0, 2, 2000)
+y_score = np.round(np.clip(rng.random(2000) * 0.6 + y_true * 0.3, 0, 1), 2)
+
+
+# --- Tests ---
+def test_binary_metrics_match_sklearn():
+    metrics = binary_metrics(y_true, y_score)
+    precision, recall, _ = precision_recall_curve(y_true, y_score)
+    y_pred = (y_score > 0.5).astype(int)
+
+    assert metrics['auc_roc'] == pytest.approx(roc_auc_score(y_true, y_score))
+    assert metrics['pr_auc'] == pytest.approx(auc(recall, precision))
+    assert metrics['logloss'] == pytest.approx(log_loss(y_true, y_score))
+    assert metrics['confusion_matrix'] == confusion_matrix(y_true, y_pred).tolist()
+
+    expected_report = classification_report(y_true, y_pred, output_dict=True)
+    for label in ('0', '1', 'macro avg', 'weighted avg'):
+        for key, value in expected_report[label].items():
+            assert metrics['classification_report'][label][key] == pytest.approx(value)
+    assert metrics['classification_report']['accuracy'] == pytest.approx(expected_report['accuracy'])
+
+def test_single_class_auc_is_none():
+    metrics = binary_metrics([1, 1, 1], [0.2, 0.7, 0.9])
+    assert metrics['auc_roc'] is None
+
+def test_bootstrap_ci_contains_point_estimate():
+    intervals = bootstrap_ci(y_true, y_score, n_bootstrap=200, n_jobs=1)
+    point = roc_auc_score(y_true, y_score)
+    assert intervals['auc_roc']['low'] < point < intervals['auc_roc']['high']
+
+def test_segment_metrics():
+    segments = {'crm_source': np.where(np.arange(2000) % 2 == 0, 'CDK', 'Reynolds'),
+                'lead_age_bucket': lead_age_bucket(np.full(2000, 30.0))}
+    breakdown = segment_metrics(y_true, y_score, segments)
+    assert set(breakdown['crm_source']) == {'CDK', 'Reynolds'}
+    assert breakdown['crm_source']['CDK']['count'] == 1000
+    assert breakdown['lead_age_bucket']['1-3d']['auc_roc'] == pytest.approx(roc_auc_score(y_true, y_score))
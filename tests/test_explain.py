@@ -0,0 +1,61 @@
+import asyncio
+from unittest import mock
+import numpy as np
+from fastapi.testclient import TestClient
+from src.training.pipeline import build_model_pipeline
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data
+from src.prediction.compiled_model import compile_model_pipeline
+from src.prediction.explain import Explainer, feature_layout, tree_contributions
+
+
+# --- Tests ---
+def test_explanations_sum_to_the_score_and_use_input_feature_names():
+    _, X, y = featurize_training_data(synthetic_leads_dataframe(1000, seed=2))
+    pipeline = build_model_pipeline(n_estimators=30, max_depth=4)
+    pipeline.fit(X, y)
+    X = X[list(pipeline.feature_names_in_)].head(50)
+
+    names, owner = feature_layout(pipeline)
+    assert names == list(X.columns) and np.bincount(owner).min() >= 1 # Every feature owns a matrix column
+    contribs = tree_contributions(pipeline, X)
+    np.testing.assert_allclose(1 / (1 + np.exp(-contribs.sum(axis=1))), pipeline.predict_proba(X)[:, 1], atol=1e-5)
+
+    explainer = Explainer(top_k=3)
+    scores, explanations = explainer.explain(pipeline, X, 'v1')
+    np.testing.assert_allclose(scores, pipeline.predict_proba(X)[:, 1], atol=1e-5)
+    first = explanations[0]
+    assert len(first) == 3 and all(item['feature'] in names for item in first)
+    assert abs(first[0]['contribution']) >= abs(first[1]['contribution']) >= abs(first[2]['contribution'])
+    assert first[0]['value'] == X.iloc[0][first[0]['feature']]
+
+    # Cached per version; the compiled scorer is explained through its version's pipeline
+    compiled_explainer = Explainer(top_k=3, loader=lambda version: pipeline)
+    cached_scores, cached = compiled_explainer.explain(compile_model_pipeline(pipeline), X, 'v1')
+    assert cached == explanations and compiled_explainer.explain(pipeline, X, 'v1')[1] == explanations
+    assert compiled_explainer.stats()['hits'] == 50
+
+
+def test_explained_requests_are_scored_off_the_event_loop(monkeypatch):
+    from src.prediction import api
+    threads = []
+
+    def fake_score_routed(records, explain=False):
+        try:
+            asyncio.get_running_loop()
+            threads.append('event loop')
+        except RuntimeError:
+            threads.append('worker thread')
+        return [0.42], ['v1'], [[{'feature': 'vehicle_price', 'value': 18000.0, 'contribution': 0.1}]]
+
+    monkeypatch.setattr(api, '_score_routed', fake_score_routed)
+    monkeypatch.setattr(api, 'get_model_pipeline', lambda: object())
+    monkeypatch.setattr(api, '_model_for', lambda record: (object(), 'v1'))
+    monkeypatch.setattr(api, '_load_lead_records', lambda keys: {keys[0]: {'lead_id': 1}})
+    monkeypatch.setattr(api, 'get_score_sink', mock.MagicMock)
+    client = TestClient(api.app)
+    lead = {'crm_lead_id': 'L1', 'crm_source': 'CDK', 'created_at': '2026-10-01T12:00:00', 'vehicle_id': 1,
+            'vehicle_price': 18000.0, 'vehicle_mileage': 40000.0, 'vehicle_make': 'Ford', 'days_on_lot': 20}
+    assert client.post("/predict?explain=true", json=lead).json()['likelihood_score'] == 0.42
+    assert client.get("/score/CDK/L1?explain=true").json()['explanation'][0]['feature'] == 'vehicle_price'
+    assert threads == ['worker thread', 'worker thread']
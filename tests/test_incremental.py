@@ -0,0 +1,47 @@
+import pandas as pd
+from src.training import incremental
+from src.training.incremental import should_promote, train_incremental
+from src.training.pipeline import build_model_pipeline
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data, training_watermark
+
+
+# --- Tests ---
+def test_promotion_gate_compares_auc_and_falls_back_to_log_loss():
+    current = {'auc_roc': 0.80, 'logloss': 0.40}
+    assert should_promote({'auc_roc': 0.797, 'logloss': 0.50}, current, tolerance=0.005) # Within tolerance
+    assert not should_promote({'auc_roc': 0.79, 'logloss': 0.30}, current, tolerance=0.005)
+    assert should_promote({'auc_roc': None, 'logloss': 0.404}, current, tolerance=0.005) # One-class holdout
+    assert not should_promote({'auc_roc': None, 'logloss': 0.41}, current, tolerance=0.005)
+
+
+def test_update_continues_the_current_booster_and_moves_the_watermark_past_the_update_split(monkeypatch):
+    df = synthetic_leads_dataframe(3000, seed=11)
+    df = df[df['closed_at'].notna()].sort_values('closed_at', kind='stable').reset_index(drop=True)
+    old, new = df.iloc[:len(df) // 2], df.iloc[len(df) // 2:]
+    _, X_old, y_old = featurize_training_data(old)
+    base = build_model_pipeline(n_estimators=10, max_depth=3).fit(X_old, y_old)
+    watermark = training_watermark(old)
+
+    monkeypatch.setattr(incremental.model_registry, 'get_current_version', lambda: 'v1')
+    monkeypatch.setattr(incremental.model_registry, 'load_metadata', lambda version: {'trained_through': watermark, 'mode': 'full'})
+    monkeypatch.setattr(incremental.model_registry, 'load_version', lambda version: base)
+    monkeypatch.setattr(incremental, 'load_reference', lambda version: None)
+    monkeypatch.setattr(incremental, 'load_closed_leads',
+                        lambda db, since: new[new['closed_at'] > pd.Timestamp(since)].reset_index(drop=True))
+    saved = {}
+    monkeypatch.setattr(incremental, 'save_model_pipeline',
+                        lambda pipeline, metadata=None, drift_reference=None: saved.update(pipeline=pipeline, metadata=metadata))
+
+    result = train_incremental(None, extra_rounds=5, tolerance=1.0) # Gate tested above; always promote here
+    assert result['promoted'] and result['base_version'] == 'v1'
+    assert saved['pipeline'].named_steps['classifier'].get_booster().num_boosted_rounds() == 15 # 10 + 5 trees
+
+    # The watermark covers the update split only: the most recent leads (the holdout) stay ahead of it,
+    # including those closed at the same time as the first holdout lead
+    closed = new[new['closed_at'] > pd.Timestamp(watermark)]['closed_at'].sort_values()
+    cutoff = closed.iloc[-int(len(closed) * incremental.HOLDOUT_FRACTION)]
+    assert (closed == cutoff).sum() > 1 # Ties at the cutoff
+    assert saved['metadata']['trained_through'] == training_watermark(closed[closed < cutoff].to_frame())
+    assert (closed > pd.Timestamp(saved['metadata']['trained_through'])).sum() == (closed >= cutoff).sum()
+    assert saved['metadata']['previous'] == {'version': 'v1', 'trained_through': watermark, 'mode': 'full'}
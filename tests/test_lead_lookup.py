@@ -0,0 +1,32 @@
+import pytest
+from conftest import FakeClock
+from src.storage.models import Vehicle
+from src.prediction.lead_lookup import VehicleCache, load_lead_records
+
+
+@pytest.fixture
+def db(db_session, add_leads):
+    add_leads([{'initial_message': "Is this available?"}] * 3)
+    return db_session
+
+
+# --- Tests ---
+def test_records_are_built_from_stored_rows(db):
+    records = load_lead_records(db, [("CDK", "L0"), ("CDK", "L2"), ("CDK", "missing")], cache=VehicleCache())
+    assert set(records) == {("CDK", "L0"), ("CDK", "L2")}
+    record = records[("CDK", "L0")]
+    assert record['vehicle_make'] == "Toyota" and record['vehicle_price'] == 20000.0 and record['days_on_lot'] == 12
+    assert record['lead_id'] is not None and record['initial_message'] == "Is this available?"
+
+def test_vehicle_cache_expires_after_ttl(db):
+    clock = FakeClock()
+    cache = VehicleCache(ttl_seconds=60, clock=clock)
+    load_lead_records(db, [("CDK", "L0")], cache=cache)
+    load_lead_records(db, [("CDK", "L1")], cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    db.query(Vehicle).update({Vehicle.price: 18000.0}) # Price drop becomes visible after the TTL
+    db.commit()
+    assert load_lead_records(db, [("CDK", "L0")], cache=cache)[("CDK", "L0")]['vehicle_price'] == 20000.0
+    clock.now = 61
+    assert load_lead_records(db, [("CDK", "L0")], cache=cache)[("CDK", "L0")]['vehicle_price'] == 18000.0
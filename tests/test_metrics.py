@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+from src.monitoring.metrics import Histogram, STAGE_SECONDS, timed, timed_stage, summary
+
+
+# --- Tests ---
+def test_histogram_renders_cumulative_prometheus_buckets_and_estimates_quantiles():
+    histogram = Histogram("test_seconds", "Test.", buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.05, 0.05, 0.5, 5.0):
+        histogram.observe('fit', value)
+    lines = histogram.render()
+    assert '# TYPE test_seconds histogram' in lines
+    assert 'test_seconds_bucket{stage="fit",le="0.01"} 1' in lines
+    assert 'test_seconds_bucket{stage="fit",le="0.1"} 3' in lines
+    assert 'test_seconds_bucket{stage="fit",le="+Inf"} 5' in lines
+    assert 'test_seconds_count{stage="fit"} 5' in lines
+    counts = histogram.snapshot()['fit'][0]
+    assert 0.01 < histogram.quantile(0.5, counts) <= 0.1
+    assert histogram.quantile(0.99, counts) == 1.0 # +Inf bucket reports the largest finite bound
+
+
+def test_quantiles_stay_within_the_observed_min_and_max():
+    histogram = Histogram("test_seconds", "Test.", buckets=(0.1, 0.25, 1.0))
+    histogram.observe('predict', 0.143) # One call: every percentile is that call
+    counts, _, _, low, high = histogram.snapshot()['predict']
+    assert (low, high) == (0.143, 0.143)
+    assert [histogram.quantile(q, counts, low, high) for q in (0.5, 0.99)] == [0.143, 0.143]
+    histogram.observe('predict', 4.0) # Beyond the last bucket: the max, not the largest bound
+    counts, _, _, low, high = histogram.snapshot()['predict']
+    assert histogram.quantile(0.99, counts, low, high) == 4.0
+
+
+def test_stage_timers_feed_the_metrics_endpoint():
+    @timed_stage('test.decorated')
+    def work():
+        return 42
+
+    with timed('test.block'):
+        assert work() == 42
+    assert summary()['test.decorated']['calls'] >= 1 and 'test.block' in STAGE_SECONDS.snapshot()
+
+    from src.prediction.api import app
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200 and response.headers['content-type'].startswith('text/plain')
+    assert 'stage_duration_seconds_count{stage="test.block"}' in response.text
@@ -0,0 +1,80 @@
+import hashlib
+import itertools
+import json
+import os
+import stat
+import pytest
+from src.storage import model_registry
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    counter = itertools.count()
+    monkeypatch.setattr(model_registry, '_new_version', lambda: f"20260101T0000{next(counter):02d}Z-test") # Ordered ids
+    return str(tmp_path)
+
+
+def _publish_segment(registry, segment):
+    version = model_registry.publish_model(FakeModel(segment), metadata={'mode': 'segment', 'segment': {'value': segment}},
+                                           make_current=False, registry_dir=registry)
+    model_registry.set_current_version(version, registry, segment=segment)
+    return version
+
+
+# --- Tests ---
+def test_publish_writes_a_read_only_version_with_metadata_and_checksum(registry):
+    version = model_registry.publish_model(FakeModel('m1'), metadata={'mode': 'full', 'trained_through': '2026-10-01T00:00:00'},
+                                           registry_dir=registry, artifacts={'drift_reference.json': {'features': {}}})
+    directory = model_registry.version_dir(version, registry)
+    assert sorted(os.listdir(directory)) == ['drift_reference.json', 'metadata.json', 'model.joblib']
+    for name in os.listdir(directory):
+        assert not os.stat(os.path.join(directory, name)).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+
+    metadata = model_registry.load_metadata(version, registry)
+    assert metadata['version'] == version and metadata['trained_through'] == '2026-10-01T00:00:00'
+    assert metadata['has_compiled'] is False
+    assert metadata['model_sha256'] == hashlib.sha256(open(os.path.join(directory, 'model.joblib'), 'rb').read()).hexdigest()
+    assert json.load(open(os.path.join(directory, 'drift_reference.json'))) == {'features': {}}
+    assert model_registry.load_version(version, registry_dir=registry).name == 'm1'
+
+    with pytest.raises(Exception): # Unpicklable: nothing is published, no temp dir is left behind
+        model_registry.publish_model(lambda: None, registry_dir=registry)
+    assert model_registry.list_versions(registry) == [version]
+    assert not [name for name in os.listdir(registry) if name.startswith('.tmp-')]
+
+
+def test_current_pointer_swaps_only_to_published_versions(registry):
+    assert model_registry.get_current_version(registry) is None
+    v1 = model_registry.publish_model(FakeModel('v1'), registry_dir=registry)
+    v2 = model_registry.publish_model(FakeModel('v2'), make_current=False, registry_dir=registry)
+    assert model_registry.get_current_version(registry) == v1 # Staged, not live
+
+    model_registry.set_current_version(v2, registry)
+    assert model_registry.get_current_version(registry) == v2
+    assert model_registry.load_version(model_registry.get_current_version(registry), registry_dir=registry).name == 'v2'
+    with pytest.raises(ValueError):
+        model_registry.set_current_version("20260101T000000Z-missing", registry)
+    assert model_registry.get_current_version(registry) == v2
+    assert not [name for name in os.listdir(registry) if '.tmp-' in name] # Pointer written via temp file + rename
+
+
+def test_rollback_moves_along_its_own_pointer_kind(registry):
+    g1 = model_registry.publish_model(FakeModel('g1'), metadata={'mode': 'full'}, registry_dir=registry)
+    cdk1 = _publish_segment(registry, 'CDK')
+    g2 = model_registry.publish_model(FakeModel('g2'), metadata={'mode': 'full'}, registry_dir=registry)
+    cdk2 = _publish_segment(registry, 'CDK')
+
+    assert model_registry.rollback(registry_dir=registry) == g1 # Skips the CDK model published in between
+    assert model_registry.get_current_version(registry) == g1
+    assert model_registry.get_current_version(registry, segment='CDK') == cdk2
+    assert model_registry.rollback(registry_dir=registry, segment='CDK') == cdk1
+    with pytest.raises(ValueError):
+        model_registry.rollback(registry_dir=registry) # Nothing global before g1
+    with pytest.raises(ValueError):
+        model_registry.rollback(cdk2, registry_dir=registry) # A segment model never becomes the global CURRENT
+    assert model_registry.rollback(g2, registry_dir=registry) == g2
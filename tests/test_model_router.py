@@ -0,0 +1,44 @@
+from src.prediction.model_router import ModelCache, ModelRouter
+
+
+class FakeModel:
+    def __init__(self, version):
+        self.version = version
+
+
+def _cache(max_bytes, sizes, loaded):
+    def loader(version):
+        if version not in sizes:
+            raise FileNotFoundError(version)
+        loaded.append(version)
+        return FakeModel(version)
+    return ModelCache(max_bytes, loader=loader, sizer=lambda version: sizes[version])
+
+
+# --- Tests ---
+def test_cache_loads_lazily_and_evicts_least_recently_used_over_budget():
+    loaded = []
+    cache = _cache(250, {'a': 100, 'b': 100, 'c': 100}, loaded)
+    assert cache.get('a').version == 'a' and cache.get('b').version == 'b'
+    cache.get('a') # 'b' is now least recently used
+    cache.get('c') # 300 bytes > 250: evicts 'b'
+    assert loaded == ['a', 'b', 'c']
+    cache.get('a')
+    cache.get('b') # Reloaded, evicting 'c'
+    assert loaded == ['a', 'b', 'c', 'b']
+    assert cache.stats() == {'models': 2, 'bytes': 200, 'max_bytes': 250, 'hits': 2, 'misses': 4, 'evictions': 2}
+
+
+def test_router_falls_back_to_global_model_without_a_loadable_segment_model():
+    global_model = FakeModel('global')
+    router = ModelRouter(_cache(1000, {'v-cdk': 10}, []), partition_by='crm_source', refresh_interval=60,
+                         segment_versions=lambda: {'CDK': 'v-cdk', 'DealerSocket': 'v-missing'},
+                         global_model=lambda: (global_model, 'v-global'))
+    model, version = router.route({'crm_source': 'CDK'})
+    assert (model.version, version) == ('v-cdk', 'v-cdk')
+    assert router.route({'crm_source': 'VinSolutions'}) == (global_model, 'v-global') # No segment model
+    assert router.route({'crm_source': 'DealerSocket'}) == (global_model, 'v-global') # Load failed
+
+    groups = router.group([{'crm_source': 'CDK'}, {'crm_source': 'Other'}, {'crm_source': 'CDK'}])
+    assert sorted((version, positions) for _, version, positions in groups) == [('v-cdk', [0, 2]), ('v-global', [1])]
+    assert router.stats()['failed_versions'] == ['v-missing']
@@ -0,0 +1,101 @@
+import asyncio
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.storage.models import Base, WritebackOutbox, WritebackStatus
+from src.crm_writeback import outbox_worker
+from src.crm_writeback.dispatcher import CrmLane
+from src.crm_writeback.outbox_worker import enqueue_writebacks, claim_batch
+from src.crm_writeback.writeback_manager import ScoreDeltaFilter
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # File-backed SQLite so separate sessions (workers) see each other's commits
+    engine = create_engine(f"sqlite:///{tmp_path}/outbox.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def delta_filter(monkeypatch):
+    delta_filter = ScoreDeltaFilter() # Fresh last-written cache per test
+    monkeypatch.setattr(outbox_worker, '_delta_filter', delta_filter)
+    return delta_filter
+
+
+def _enqueue(session_factory, n, crm_source='CDK', score=0.5):
+    db = session_factory()
+    enqueue_writebacks(db, [(crm_source, f"L{i}", score, None) for i in range(n)])
+    db.commit()
+    db.close()
+
+
+def _run_lane(session_factory, crm_source, send):
+    """One claim/send/record iteration of the production dispatcher lane; returns its counters."""
+    lane = CrmLane(crm_source, session_factory, send=send)
+    try:
+        asyncio.run(lane.process_once())
+    finally:
+        lane.shutdown()
+    return {key: lane.counts[key] for key in ('sent', 'suppressed', 'retried', 'failed')}
+
+
+# --- Tests ---
+def test_concurrent_claims_never_overlap(session_factory):
+    _enqueue(session_factory, 25)
+    worker_a, worker_b = session_factory(), session_factory()
+    _, rows_a = claim_batch(worker_a, batch_size=10)
+    _, rows_b = claim_batch(worker_b, batch_size=10)
+    _, rows_c = claim_batch(worker_a, batch_size=10)
+    ids = [row.id for row in rows_a + rows_b + rows_c]
+    assert len(ids) == 25 and len(set(ids)) == 25
+    assert claim_batch(worker_b, batch_size=10)[1] == [] # Everything is leased
+
+def test_failed_send_is_retried_with_backoff_then_completed(session_factory):
+    _enqueue(session_factory, 2, crm_source='CDK')
+    _enqueue(session_factory, 1, crm_source='Reynolds')
+
+    def flaky_send(crm_source, scores, timeout):
+        if crm_source == 'Reynolds':
+            raise ConnectionError("CRM timeout")
+
+    assert _run_lane(session_factory, 'CDK', flaky_send) == {'sent': 2, 'suppressed': 0, 'retried': 0, 'failed': 0}
+    assert _run_lane(session_factory, 'Reynolds', flaky_send) == {'sent': 0, 'suppressed': 0, 'retried': 1, 'failed': 0}
+    db = session_factory()
+    retry = db.query(WritebackOutbox).filter_by(crm_source='Reynolds').one()
+    assert retry.status == WritebackStatus.PENDING and retry.attempts == 1 and retry.lease_token is None
+
+    # Make the retry due now; with a working CRM it completes
+    retry.next_attempt_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    db.commit()
+    assert _run_lane(session_factory, 'Reynolds', lambda *args, **kwargs: None)['sent'] == 1
+    assert db.query(WritebackOutbox).filter_by(status=WritebackStatus.DONE).count() == 3
+
+def test_bulk_send_suppresses_superseded_and_small_changes(session_factory, delta_filter):
+    db = session_factory()
+    enqueue_writebacks(db, [('CDK', 'A', 0.40, None), ('CDK', 'A', 0.60, None), # Superseded by the newer row
+                            ('CDK', 'B', 0.30, None), ('CDK', 'C', 0.30, None)])
+    db.commit()
+    delta_filter.threshold, delta_filter.bands = 0.05, [0.5]
+    delta_filter.prime({('CDK', 'B'): 0.31, ('CDK', 'C'): 0.45}) # B: tiny change; C: same band but 0.15 away
+    calls = []
+    counts = _run_lane(session_factory, 'CDK', lambda crm_source, scores, timeout: calls.append((crm_source, scores)))
+    assert calls == [('CDK', [('A', 0.60), ('C', 0.30)])]
+    assert counts == {'sent': 2, 'suppressed': 2, 'retried': 0, 'failed': 0}
+    assert delta_filter.should_write(('CDK', 'A'), 0.49) # Crosses the 0.5 band
+    assert not delta_filter.should_write(('CDK', 'A'), 0.62)
+
+def test_gives_up_after_max_attempts(session_factory):
+    _enqueue(session_factory, 1)
+    db = session_factory()
+    db.query(WritebackOutbox).update({'attempts': outbox_worker.MAX_ATTEMPTS - 1}) # Last attempt left
+    db.commit()
+
+    def down(*args, **kwargs):
+        raise ConnectionError("CRM down")
+
+    assert _run_lane(session_factory, 'CDK', down)['failed'] == 1
+    assert db.query(WritebackOutbox).one().status == WritebackStatus.FAILED
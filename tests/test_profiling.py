@@ -0,0 +1,56 @@
+import os
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.monitoring import profiling
+from src.monitoring.profiling import ProfilingMiddleware, profile_stage, profiled, request_profiling
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+# --- Tests ---
+def test_profiles_are_written_only_when_requested_and_rotated(tmp_path):
+    with profiled('job', profile_dir=str(tmp_path)) as off:
+        _busy(0.01)
+    assert off.path is None and not os.listdir(tmp_path)
+
+    token = request_profiling('sampling')
+    try:
+        with profiled('job', profile_dir=str(tmp_path)) as run:
+            with profiled('nested', profile_dir=str(tmp_path)) as nested: # Joins the outer profile
+                _busy(0.2)
+    finally:
+        profiling._requested.reset(token)
+    assert nested.path is None
+    stacks = open(run.path + ".collapsed").read()
+    assert "_busy (test_profiling.py" in stacks
+
+    for i in range(4):
+        with profiled(f'job{i}', mode='cprofile', profile_dir=str(tmp_path)):
+            _busy(0.001)
+    profiling.rotate(str(tmp_path), max_files=2)
+    assert len({os.path.splitext(name)[0] for name in os.listdir(tmp_path)}) == 2
+
+
+def test_query_flag_profiles_the_request_handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/work")
+    @profile_stage('work')
+    def work(n: int = 10):
+        _busy(0.005)
+        return {"n": n}
+
+    client = TestClient(app)
+    assert client.get("/work").json() == {"n": 10} and not os.listdir(tmp_path)
+    assert client.get("/work?n=3&profile=true").json() == {"n": 3}
+    assert client.get("/work", headers={"X-Profile": "sampling"}).status_code == 200
+    files = sorted(os.listdir(tmp_path))
+    assert [name.rsplit('.', 1)[1] for name in files] == ['prof', 'txt', 'collapsed']
+    assert 'cumulative' in open(os.path.join(tmp_path, files[1])).read()
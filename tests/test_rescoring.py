@@ -0,0 +1,41 @@
+import datetime
+import numpy as np
+import pytest
+from src.storage.models import Lead, LeadStatus, LeadChangeEvent
+from src.prediction.rescoring import emit_lead_changes, claim_changed_leads, rescore_changed
+
+
+class ConstantModel:
+    def __init__(self):
+        self.rows_scored = 0
+
+    def predict_proba(self, X):
+        self.rows_scored += len(X)
+        return np.tile([0.4, 0.6], (len(X), 1))
+
+
+@pytest.fixture
+def db(db_session, add_leads):
+    add_leads([{'id': i + 1, 'current_status': status}
+               for i, status in enumerate([LeadStatus.NEW, LeadStatus.CONTACTED, LeadStatus.WON])])
+    return db_session
+
+
+# --- Tests ---
+def test_bursts_are_debounced_and_each_changed_lead_is_scored_once(db):
+    t0 = datetime.datetime(2026, 10, 19, 12, 0, 0)
+    emit_lead_changes(db, [(1, 'created'), (3, 'status')])
+    db.query(LeadChangeEvent).update({LeadChangeEvent.created_at: t0})
+    emit_lead_changes(db, [(1, 'updated'), (1, 'updated'), (2, 'status')])
+    db.query(LeadChangeEvent).filter(LeadChangeEvent.lead_id.in_([1, 2])).update({LeadChangeEvent.created_at: t0 + datetime.timedelta(seconds=4)})
+    db.commit()
+
+    assert set(claim_changed_leads(db, debounce_seconds=5, now=t0 + datetime.timedelta(seconds=6))) == {3} # 1 and 2 still busy
+    claimed = claim_changed_leads(db, debounce_seconds=5, now=t0 + datetime.timedelta(seconds=10))
+    assert set(claimed) == {1, 2, 3}
+
+    model = ConstantModel()
+    assert rescore_changed(db, model, claimed, writeback=False) == 2 # Lead 3 is closed: dropped, not scored
+    assert model.rows_scored == 2 and db.query(LeadChangeEvent).count() == 0
+    scores = dict(db.query(Lead.id, Lead.predicted_likelihood))
+    assert scores[1] == pytest.approx(0.6) and scores[2] == pytest.approx(0.6) and scores[3] is None
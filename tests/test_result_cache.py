@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from src.prediction.result_cache import ResultCache, ENTRY_BYTES
+
+
+class CountingModel:
+    """predict_proba stand-in that records how many rows reached it."""
+    def __init__(self):
+        self.rows_scored = 0
+
+    def predict_proba(self, X):
+        self.rows_scored += len(X)
+        p = (X['vehicle_price'].to_numpy() / 100000.0)
+        return np.column_stack([1 - p, p])
+
+
+def _frame(lead_age_hours, price=20000.0):
+    return pd.DataFrame({'vehicle_price': [price] * len(lead_age_hours), 'vehicle_make': ['Toyota'] * len(lead_age_hours),
+                         'lead_age_hours': lead_age_hours})
+
+
+# --- Tests ---
+def test_repeat_inputs_within_lead_age_bucket_hit_the_cache():
+    cache, model = ResultCache(lead_age_bucket_hours=1.0), CountingModel()
+    first = cache.score(model, _frame([5.1, 7.0]), 'v1')
+    again = cache.score(model, _frame([5.9, 7.4]), 'v1') # Same hour buckets
+    np.testing.assert_allclose(first, again)
+    assert model.rows_scored == 2 and cache.stats()['hits'] == 2
+
+    cache.score(model, _frame([6.2]), 'v1') # New bucket
+    cache.score(model, _frame([5.1]), 'v2') # New model version
+    cache.score(model, _frame([5.1], price=25000.0), 'v1') # Changed input
+    assert model.rows_scored == 5
+
+def test_lru_eviction_respects_memory_cap():
+    cache, model = ResultCache(max_mb=3 * ENTRY_BYTES / (1024 * 1024)), CountingModel()
+    assert cache.max_entries == 3
+    cache.score(model, _frame([1, 2, 3]), 'v1')
+    cache.score(model, _frame([1]), 'v1') # Refresh bucket 1
+    cache.score(model, _frame([4]), 'v1') # Evicts bucket 2, the least recently used
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['evictions'] == 1
+    rows_before = model.rows_scored
+    cache.score(model, _frame([1, 3, 4]), 'v1')
+    assert model.rows_scored == rows_before
+    cache.clear()
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,61 @@
+from unittest import mock
+from src.prediction import score_sink
+from src.prediction.score_sink import ScoreSink
+
+
+# --- Tests ---
+def test_batch_is_one_transaction_with_deduplicated_scores(monkeypatch):
+    calls = []
+
+    def fake_persist_scores(db, scored, writebacks=None, known_lead_ids=None):
+        calls.append((sorted(scored), sorted(writebacks)))
+        return {(source, lead_id): i for i, (source, lead_id, _) in enumerate(scored) if lead_id != 'C'}
+
+    monkeypatch.setattr(score_sink, 'persist_scores', fake_persist_scores)
+    sink = ScoreSink(session_factory=mock.MagicMock, flush_interval_ms=50)
+    sink.start()
+    sink.submit('CDK', 'A', 0.1)
+    sink.submit('VinSolutions', 'B', 0.2)
+    sink.submit('CDK', 'A', 0.3) # Latest score for a lead wins
+    sink.submit('CDK', 'C', 0.4, writeback=False)
+    sink.stop()
+
+    assert calls == [(
+        [('CDK', 'A', 0.3), ('CDK', 'C', 0.4), ('VinSolutions', 'B', 0.2)],
+        [('CDK', 'A', 0.3), ('VinSolutions', 'B', 0.2)],
+    )]
+    stats = sink.stats()
+    assert stats['queue_depth'] == 0 and stats['last_batch_size'] == 4
+    assert stats['persisted'] == 2 and stats['not_found'] == 1 and stats['writebacks_queued'] == 2
+
+
+def test_failed_batch_is_retried_and_overflow_is_dropped_with_lead_ids(monkeypatch, capsys):
+    attempts = []
+
+    def flaky_persist_scores(db, scored, writebacks=None, known_lead_ids=None):
+        attempts.append(len(scored))
+        if len(attempts) < 3:
+            raise RuntimeError("database unavailable")
+        return {(source, lead_id): 1 for source, lead_id, _ in scored}
+
+    monkeypatch.setattr(score_sink, 'persist_scores', flaky_persist_scores)
+    sink = ScoreSink(session_factory=mock.MagicMock, flush_interval_ms=20, max_queue_size=2, retry_backoff_ms=1)
+    sink.submit('CDK', 'A', 0.1)
+    sink.submit('CDK', 'B', 0.2)
+    sink.submit('CDK', 'C', 0.3) # Queue full: dropped and logged, not blocking the caller
+    sink.start()
+    sink.stop()
+
+    assert attempts == [2, 2, 2] # Two failures, then the same batch succeeds
+    stats = sink.stats()
+    assert stats['persisted'] == 2 and stats['errors'] == 2 and stats['retries'] == 2 and stats['dropped'] == 1
+    assert "CDK/C" in capsys.readouterr().out
+
+    # A batch that keeps failing is dropped after its retries, with the lead IDs logged
+    sink = ScoreSink(session_factory=mock.MagicMock, flush_interval_ms=20, max_retries=1, retry_backoff_ms=1)
+    monkeypatch.setattr(score_sink, 'persist_scores', mock.Mock(side_effect=RuntimeError("constraint violation")))
+    sink.start()
+    sink.submit('CDK', 'D', 0.4)
+    sink.stop()
+    assert sink.stats()['dropped'] == 1 and sink.stats()['retries'] == 1
+    assert "CDK/D" in capsys.readouterr().out
@@ -0,0 +1,42 @@
+import datetime
+import numpy as np
+from src.training.pipeline import build_model_pipeline
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data
+from src.prediction.compiled_model import compile_model_pipeline
+from src.monitoring.metrics import STAGE_SECONDS
+from src.prediction.scoring import prepare_features, records_to_frame, set_feature_defaults
+
+
+def _record(**overrides):
+    record = {'crm_source': 'CDK', 'crm_lead_id': 'L1', 'vehicle_id': 1, 'vehicle_price': 18000.0,
+              'vehicle_mileage': 40000.0, 'vehicle_make': 'Ford', 'days_on_lot': 20,
+              'created_at': datetime.datetime(2026, 10, 1, 12), 'time_of_prediction': datetime.datetime(2026, 10, 2, 12)}
+    record.update(overrides)
+    return record
+
+
+# --- Tests ---
+def test_missing_message_length_is_imputed_with_the_training_median():
+    _, X, y = featurize_training_data(synthetic_leads_dataframe(600, seed=5))
+    pipeline = set_feature_defaults(build_model_pipeline(n_estimators=10, max_depth=3).fit(X, y), X)
+    median = X['initial_message_length'].median()
+    assert pipeline.feature_defaults_ == {'initial_message_length': median} and median > 0
+
+    records = [_record(), _record(initial_message="Is this still available?"), _record(initial_message=None)]
+    for model in (pipeline, compile_model_pipeline(pipeline)): # Defaults travel with the compiled artifact
+        lengths = prepare_features(records_to_frame(records), model)['initial_message_length'].tolist()
+        assert lengths == [median, len("Is this still available?"), median]
+
+    legacy = build_model_pipeline(n_estimators=10, max_depth=3).fit(X, y) # Trained before defaults were stored
+    assert np.isnan(prepare_features(records_to_frame([_record()]), legacy)['initial_message_length']).all()
+
+
+def test_feature_timer_records_scoring_calls_only():
+    _, X, y = featurize_training_data(synthetic_leads_dataframe(300, seed=6))
+    calls = lambda: STAGE_SECONDS.snapshot().get('score.features', (None, 0.0, 0))[2]
+    before = calls()
+    pipeline = set_feature_defaults(build_model_pipeline(n_estimators=5, max_depth=2).fit(X, y), X) # Training: not timed
+    assert calls() == before
+    prepare_features(records_to_frame([_record()]), pipeline)
+    assert calls() == before + 1
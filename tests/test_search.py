@@ -0,0 +1,41 @@
+import math
+import pandas as pd
+import pytest
+from src.training import search
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    prepared = featurize_training_data(synthetic_leads_dataframe(400, seed=3))
+    monkeypatch.setattr(search, 'prepare_training_data', lambda db: prepared)
+    saved = {'fit_rows': [], 'n_train': len(prepared[1]) - math.ceil(len(prepared[1]) * 0.2)}
+    monkeypatch.setattr(search, 'save_model_pipeline',
+                        lambda pipeline, metadata=None, drift_reference=None: saved.update(pipeline=pipeline, metadata=metadata))
+
+    build_classifier = search.build_classifier
+    def recording_build_classifier(**kwargs): # Records the refit in this process (trials run in the pool)
+        classifier = build_classifier(**kwargs)
+        fit = classifier.fit
+        classifier.fit = lambda X, y, **fit_kwargs: saved['fit_rows'].append(len(y)) or fit(X, y, **fit_kwargs)
+        return classifier
+    monkeypatch.setattr(search, 'build_classifier', recording_build_classifier)
+    return saved
+
+
+# --- Tests ---
+@pytest.mark.parametrize('strategy', ['random', 'halving'])
+def test_search_writes_the_leaderboard_and_refits_the_winner(saved, strategy, tmp_path):
+    path = str(tmp_path / "leaderboard.csv")
+    search.search_model(None, n_trials=3, strategy=strategy, max_estimators=60, early_stopping_rounds=5,
+                        n_jobs=1, leaderboard_path=path)
+
+    leaderboard = pd.read_csv(path)
+    assert len(leaderboard) == (3 if strategy == 'random' else 4) # Halving: 3 trials at 50 trees, the best at 60
+    best = leaderboard.iloc[0]
+    classifier_params = saved['pipeline'].named_steps['classifier'].get_params()
+    assert classifier_params['n_estimators'] == best['best_iteration'] + 1
+    for name in search.SEARCH_SPACE:
+        assert classifier_params[name] == pytest.approx(best[name])
+    assert saved['fit_rows'] == [saved['n_train']] # One refit, on fit + validation
@@ -0,0 +1,30 @@
+from src.training import segments
+from src.training.pipeline import build_model_pipeline
+from src.training.synthetic_data import synthetic_leads_dataframe
+from src.training.trainer import featurize_training_data, split_training_data
+
+
+# --- Tests ---
+def test_segment_and_global_models_are_compared_on_rows_neither_trained_on(monkeypatch):
+    df, X, y = featurize_training_data(synthetic_leads_dataframe(3000, seed=9))
+    X_train, X_test, y_train, _ = split_training_data(X, y) # What train_model fitted the global model on
+    global_model = build_model_pipeline(n_estimators=10, max_depth=3).fit(X_train, y_train)
+    monkeypatch.setattr(segments, 'prepare_training_data', lambda db: (df, X, y))
+    monkeypatch.setattr(segments, '_load_global_model', lambda: global_model)
+    monkeypatch.setattr(segments.model_registry, 'publish_model', lambda model, **kwargs: 'v1')
+    monkeypatch.setattr(segments.model_registry, 'set_current_version', lambda version, segment=None: None)
+
+    fitted, scored = [], []
+    monkeypatch.setattr(segments, 'build_model_pipeline', lambda: build_model_pipeline(n_estimators=10, max_depth=3))
+    set_feature_defaults = segments.set_feature_defaults # Called with each segment's training rows
+    monkeypatch.setattr(segments, 'set_feature_defaults',
+                        lambda pipeline, X_fit: fitted.append(X_fit.index) or set_feature_defaults(pipeline, X_fit))
+    auc = segments._auc
+    monkeypatch.setattr(segments, '_auc', lambda model, X_eval, y_eval: scored.append(X_eval.index) or auc(model, X_eval, y_eval))
+
+    results = segments.train_segment_models(None, min_samples=200)
+    trained = [r for r in results.values() if r['status'] != 'skipped']
+    assert trained and len(fitted) == len(scored) == len(trained)
+    for train_index, test_index in zip(fitted, scored):
+        assert train_index.isin(X_train.index).all() and test_index.isin(X_test.index).all()
+
@@ -0,0 +1,50 @@
+import random
+from conftest import PriceModel
+from src.prediction.shadow import ShadowScorer, shadow_log_glob, shadow_log_path, summarize_shadow_log
+
+
+def _record(i):
+    return {'crm_lead_id': f"L{i}", 'crm_source': "CDK", 'created_at': "2026-10-01T00:00:00Z", 'vehicle_id': 1,
+            'vehicle_price': 1000.0 * (i + 1), 'vehicle_mileage': 30000.0, 'vehicle_make': "Toyota", 'days_on_lot': 10}
+
+
+# --- Tests ---
+def test_sampled_requests_are_logged_with_paired_scores(tmp_path):
+    log_path = str(tmp_path / "shadow.csv")
+    scorer = ShadowScorer("challenger", log_path, challenger=PriceModel(), sample_rate=0.5,
+                          flush_interval_ms=10, rng=random.Random(7))
+    scorer.start()
+    for i in range(200):
+        scorer.offer(_record(i), 0.5, "champion")
+    scorer.stop()
+
+    stats = scorer.stats()
+    assert 60 < stats['sampled'] < 140 and stats['logged'] == stats['sampled'] and stats['errors'] == 0
+    lines = open(log_path).read().splitlines()
+    assert lines[0] == "ts,crm_source,crm_lead_id,champion_version,champion,challenger"
+    _, source, lead_id, version, champion, challenger = lines[1].split(",")
+    assert (source, version, champion) == ("CDK", "champion", "0.500000")
+    assert float(challenger) == (int(lead_id[1:]) + 1) / 100.0
+    summary = summarize_shadow_log(log_path)
+    assert summary['rows'] == stats['logged'] and summary['mean_champion'] == 0.5
+
+def test_full_queue_drops_samples_instead_of_blocking(tmp_path):
+    scorer = ShadowScorer("challenger", str(tmp_path / "shadow.csv"), challenger=PriceModel(), sample_rate=1.0, queue_size=5)
+    for i in range(8): # Not started: nothing drains the queue
+        scorer.offer(_record(i), 0.5, "champion")
+    assert scorer.stats()['sampled'] == 5 and scorer.stats()['dropped'] == 3
+
+
+def test_each_worker_logs_to_its_own_file_and_the_summary_reads_them_all(tmp_path):
+    scorers = [ShadowScorer("challenger", shadow_log_path("challenger", str(tmp_path), pid=pid), challenger=PriceModel(),
+                            sample_rate=1.0, flush_interval_ms=10) for pid in (101, 102)] # Two API workers
+    for scorer in scorers:
+        scorer.start()
+    for i in range(10):
+        scorers[i % 2].offer(_record(i), 0.5, "champion")
+    for scorer in scorers:
+        scorer.stop()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["shadow_challenger-101.csv", "shadow_challenger-102.csv"]
+    summary = summarize_shadow_log(shadow_log_glob("challenger", str(tmp_path)))
+    assert summary['files'] == 2 and summary['rows'] == 10 and summary['leads'] == 10
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+from fastapi.testclient import TestClient
+from conftest import PriceModel
+from src.prediction import streaming
+from src.prediction.streaming import iter_scored, ResultWriter, score_file
+
+
+def _lead(i, **overrides):
+    lead = {'crm_lead_id': f"P{i}", 'crm_source': "CDK", 'created_at': "2026-10-01T00:00:00Z", 'vehicle_id': 1,
+            'vehicle_price': 20000.0, 'vehicle_mileage': 30000.0, 'vehicle_make': "Toyota", 'days_on_lot': 10}
+    lead.update(overrides)
+    return lead
+
+
+# --- Tests ---
+def test_ndjson_is_scored_in_fixed_chunks_with_per_row_errors():
+    lines = [json.dumps(_lead(i)) + "\n" for i in range(5)] + ["{broken\n", "\n", json.dumps(_lead(9, vehicle_price=None)) + "\n"]
+    model = PriceModel()
+    chunks = list(iter_scored(iter(lines), model, "ndjson", chunk_size=3))
+    results = [result for chunk in chunks for result in chunk]
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1] and model.chunk_sizes == [3, 2]
+    assert [result['row'] for result in results] == [1, 2, 3, 4, 5, 6, 7]
+    assert results[0]['likelihood_score'] == 0.2 and results[0]['crm_lead_id'] == "P0"
+    assert results[5]['error'].startswith("Unparseable line") and results[6]['error'] == "Invalid input fields: vehicle_price"
+
+def test_csv_file_round_trip(tmp_path):
+    source = tmp_path / "leads.csv"
+    header = list(_lead(0))
+    rows = [",".join(str(_lead(i, vehicle_price=10000.0 * (i + 1))[col]) for col in header) for i in range(4)]
+    source.write_text(",".join(header) + "\n" + "\n".join(rows) + "\n")
+    counts = score_file(str(source), str(tmp_path / "scores.csv"), chunk_size=2, model_pipeline=PriceModel())
+    assert counts == {'rows': 4, 'scored': 4, 'failed': 0}
+    lines = (tmp_path / "scores.csv").read_text().splitlines()
+    assert lines[0] == "row,crm_source,crm_lead_id,likelihood_score,error" and len(lines) == 5 # One header
+    assert lines[4] == "4,CDK,P3,0.4,"
+    assert ResultWriter("ndjson").format([{'row': 1}]) == '{"row": 1}\n'
+
+
+def test_stream_endpoint_negotiates_formats_and_reports_rows_that_fail(monkeypatch):
+    from src.prediction import api
+    monkeypatch.setattr(api, 'get_model_pipeline', PriceModel)
+    spools = []
+    spool_upload = streaming.spool_upload
+    async def small_spool(byte_chunks): # Spill to disk after 64 bytes
+        upload = await spool_upload(byte_chunks, max_memory_bytes=64)
+        spools.append(upload.buffer)
+        return upload
+    monkeypatch.setattr(streaming, 'spool_upload', small_spool)
+    written = []
+    format_results = streaming.ResultWriter.format
+    monkeypatch.setattr(streaming.ResultWriter, 'format', lambda self, results: written.append(len(results)) or format_results(self, results))
+    client = TestClient(api.app)
+
+    body = "".join(json.dumps(_lead(i, vehicle_price=10000.0 * (i + 1))) + "\n" for i in range(3)) + "{broken\n"
+    response = client.post("/predict/stream?chunk_size=2", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200 and response.headers['content-type'].startswith('application/x-ndjson')
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [r['likelihood_score'] for r in results[:3]] == [0.1, 0.2, 0.3]
+    assert results[3]['row'] == 4 and results[3]['error'].startswith("Unparseable line")
+    assert written == [2, 2] # One response chunk per scored chunk
+    assert spools[0]._rolled # The upload went to disk, not memory
+
+    header = list(_lead(0))
+    rows = [",".join(str(lead[col]) for col in header) for lead in (_lead(0), _lead(1), _lead(9, created_at="not-a-date"))]
+    response = client.post("/predict/stream", content="\n".join([",".join(header)] + rows) + "\n",
+                           headers={"Content-Type": "text/csv", "Accept": "text/csv"})
+    assert response.headers['content-type'].startswith('text/csv')
+    results = list(csv.DictReader(io.StringIO(response.text)))
+    assert [r['likelihood_score'] for r in results[:2]] == ["0.2", "0.2"] and not results[0]['error']
+    assert results[2]['crm_lead_id'] == "P9" and results[2]['error'] == "Invalid input fields: created_at"
+
+    assert client.post("/predict/stream?input_format=xml", content=body).status_code == 400
+    assert client.post("/predict/stream?output_format=parquet", content=body).status_code == 400